@@ -0,0 +1,269 @@
+"""
+Bake the staff answer's expected output into a grader image.
+
+The staff answer of a grader never changes between image builds, yet every
+grade runs it again just to learn the expected output.  Run this module while
+building the grader image:
+
+    python -m grader_support.bake --seeds 0-15 /graders/ps01/Problem1/grade_Problem1.py ...
+
+For every grader, language and seed it runs the staff answer exactly as the
+entrypoint would (``python -m grader_support.entrypoint --expected GRADER
+SEED``) and writes the outputs to ``GRADER.expected.json`` next to the
+grader.  At grading time the entrypoint replaces the submission's seed with
+one of the baked seeds and skips the staff run (see :func:`lookup`).
+
+Each index records a fingerprint of every file under the grader's directory
+(helpers, sub-packages, data files, ``conf/locale`` translations), of
+``grader_support`` and of the Python version, and the entrypoint settings
+that change how the tests run (see :data:`OUTPUT_SETTINGS`).  An index whose
+fingerprint or settings don't match is ignored, so a stale index costs time
+but never gives wrong grades.
+
+Hashing happens at bake time only.  At grading time the index is checked
+against a manifest of file sizes and modification times, which only needs a
+``stat`` per file: the image the index was baked into doesn't change.  Grader
+directories mounted into the container (the docker backend bind-mounts them
+from the host) can change under an image, so those are hashed again.  Bake with the same settings the graders run
+with.  Graders whose staff output depends on anything else -- the clock, the
+network, files outside their directory -- must not be baked.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+
+INDEX_VERSION = 3
+DEFAULT_SEEDS = "0-15"
+
+# Entrypoint variables that can change the staff output.  GRADER_TEST_WORKERS
+# overrides the grader's own test_workers, which the fingerprint covers, so
+# together they fix how many processes share the tests.
+OUTPUT_SETTINGS = ("GRADER_TEST_WORKERS",)
+
+_INDEX_SUFFIX = ".expected.json"
+_CHUNK_SIZE = 1024 * 1024
+
+_GRADER_SUPPORT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def index_path(grader_path):
+    """Return where the baked index of the grader at `grader_path` lives."""
+    return os.path.splitext(grader_path)[0] + _INDEX_SUFFIX
+
+
+def output_settings():
+    """Return the current values of :data:`OUTPUT_SETTINGS` ('' when unset)."""
+    return {name: os.environ.get(name, "") for name in OUTPUT_SETTINGS}
+
+
+def _files(directory):
+    """
+    Yield ``(relative path, path)`` for every file under `directory`, in a
+    fixed order, leaving out bytecode caches and baked indexes.
+    """
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if name != "__pycache__")
+        for name in sorted(names):
+            if name.endswith((".pyc", _INDEX_SUFFIX)):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, directory), path
+
+
+def _directories(grader_path):
+    return (os.path.dirname(os.path.abspath(grader_path)), _GRADER_SUPPORT_DIR)
+
+
+def _python_version():
+    return "{0}.{1}".format(*sys.version_info[:2])
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def fingerprint(grader_path):
+    """
+    Hash everything the staff output is assumed to depend on: every file
+    under the grader's directory (the grader, answer.py, helpers, data and
+    translations), the grader_support package and the Python version.
+    """
+    digest = hashlib.sha256()
+    digest.update(_python_version().encode())
+    for directory in _directories(grader_path):
+        digest.update(b"\1")
+        for relative, path in _files(directory):
+            digest.update(relative.encode() + b"\0")
+            digest.update(_file_digest(path))
+    return digest.hexdigest()
+
+
+def manifest(grader_path):
+    """
+    Return the files :func:`fingerprint` covers as ``[tree, relative path,
+    size, mtime_ns]`` lists, plus the Python version, without reading them.
+    """
+    files = []
+    for tree, directory in enumerate(_directories(grader_path)):
+        for relative, path in _files(directory):
+            st = os.stat(path)
+            files.append([tree, relative, st.st_size, st.st_mtime_ns])
+    return {"python": _python_version(), "files": files}
+
+
+def _mount_point(path):
+    """Return the mount point `path` lives under, per /proc/self/mountinfo."""
+    path = os.path.realpath(path)
+    best = "/"
+    try:
+        with open("/proc/self/mountinfo") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return best
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 5:
+            continue
+        # Spaces and the like are octal-escaped, e.g. ``\040``.
+        point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[4])
+        inside = path == point or path.startswith(point.rstrip("/") + "/")
+        if inside and len(point) > len(best):
+            best = point
+    return best
+
+
+def _mounted(grader_path):
+    """True if any fingerprinted directory is mounted rather than in the image."""
+    return any(_mount_point(directory) != "/" for directory in _directories(grader_path))
+
+
+def lookup(grader_path, seed, lang):
+    """
+    Return ``(baked_seed, expected_output)`` for grading with `seed` in `lang`,
+    or None if there is no valid baked index for the current settings.
+
+    `seed` itself is used if it was baked, otherwise it picks one of the
+    baked seeds, so submissions still get a spread of seeds.
+    """
+    try:
+        with open(index_path(grader_path)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("settings") != output_settings():
+        return None
+    try:
+        if index.get("manifest") != manifest(grader_path):
+            return None
+    except OSError:
+        return None
+    if _mounted(grader_path) and index.get("fingerprint") != fingerprint(grader_path):
+        return None
+    outputs = index.get("expected", {}).get(lang)
+    if not outputs:
+        return None
+    if str(seed) not in outputs:
+        seeds = sorted(outputs, key=int)
+        seed = int(seeds[seed % len(seeds)])
+    return seed, outputs[str(seed)]
+
+
+def _parse_seeds(spec):
+    seeds = []
+    for part in spec.split(","):
+        first, __, last = part.partition("-")
+        seeds.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(seeds))
+
+
+def expected_output(grader_path, seed, lang):
+    """Run the staff answer through the entrypoint and return its output."""
+    env = dict(os.environ, GRADER_LANGUAGE=lang)
+    env.pop("GRADER_BAKED", None)
+    proc = subprocess.run(
+        [sys.executable, "-m", "grader_support.entrypoint", "--expected", grader_path, str(seed)],
+        env=env,
+        capture_output=True,
+        check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            "Staff run of {0} (seed {1}) failed: {2}".format(
+                grader_path, seed, proc.stderr.decode("utf-8", "replace")[-2000:]
+            )
+        )
+    return json.loads(proc.stdout.decode("utf-8").strip().splitlines()[-1])
+
+
+def bake(grader_path, seeds, languages):
+    """Write the baked index of the grader at `grader_path`; return its path."""
+    expected = {}
+    for lang in languages:
+        expected[lang] = {}
+        for seed in seeds:
+            output = expected_output(grader_path, seed, lang)
+            ok = (
+                not output["exceptions"]
+                and output["grader"]["status"] == "ok"
+                and output["submission"]["status"] == "ok"
+            )
+            if not ok:
+                raise RuntimeError(
+                    "The staff answer of {0} fails with seed {1}: {2}".format(
+                        grader_path, seed,
+                        output["submission"].get("exception") or output["grader"].get("exception"),
+                    )
+                )
+            expected[lang][str(seed)] = output
+    path = index_path(grader_path)
+    with open(path, "w") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "fingerprint": fingerprint(grader_path),
+            "manifest": manifest(grader_path),
+            "settings": output_settings(),
+            "expected": expected,
+        }, f)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bake the staff answers' expected outputs into grader images."
+    )
+    parser.add_argument("graders", nargs="+", metavar="GRADER_FILE")
+    parser.add_argument(
+        "--seeds", default=DEFAULT_SEEDS,
+        help="seeds to bake, e.g. '0-15' or '1,5,9' (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--languages", default="en",
+        help="comma-separated GRADER_LANGUAGE values to bake (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    seeds = _parse_seeds(args.seeds)
+    languages = args.languages.split(",")
+    status = 0
+    for grader_path in args.graders:
+        try:
+            path = bake(grader_path, seeds, languages)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            status = 1
+        else:
+            print("{0}: {1} seeds x {2} languages".format(path, len(seeds), len(languages)))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
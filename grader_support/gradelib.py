@@ -1,14 +1,26 @@
-import contextlib
+import ast
+import collections
+import functools
 import inspect
+import mmap
+import os
 import random
 import re
 import sys
 from tokenize import tokenize, COMMENT, STRING
 from io import BytesIO, StringIO
 
+from . import graderutil
+
 # the run library should overwrite this with a particular random seed for the test.
 rand = random.Random(1)
 
+FIXTURE_SCOPES = ("grader", "run")
+
+# Values of grader-scoped fixtures, by name.  Kept here rather than on the Grader
+# so that they outlive the grader module, which may be imported again for each run.
+_grader_fixtures = {}
+
 
 class EndTest(Exception):
     """
@@ -18,6 +30,14 @@ class EndTest(Exception):
         Exception.__init__(self, message)
 
 
+class TestTimedOut(BaseException):
+    """
+    Raised in a test that has used up its time or CPU budget.
+
+    A BaseException, so that `except Exception` in student code doesn't swallow it.
+    """
+
+
 class Test:
     """
     A simple class to wrap a test function and its descriptions.
@@ -28,15 +48,24 @@ class Test:
     from the test function to decide if the answer is right.
 
     """
-    def __init__(self, test_fn, short_description, detailed_description='', compare=None):
+    def __init__(self, test_fn, short_description, detailed_description='', compare=None,
+                 timeout=None, cpu_time=None):
         """
         test_fn: function that takes a submission module and prints something to stdout.
         short_description: short description of the test.
         detailed_description: (optional) longer description.
+        timeout: (optional) seconds of wall-clock time the test may take.
+        cpu_time: (optional) seconds of CPU time the test may use.
+
+        A test that exceeds its budget is stopped and fails with a "timed out"
+        output; the remaining tests still run.  Without a budget, the grader's
+        default applies (see Grader.set_test_budget).
         """
         self._test_fn = test_fn
         self.short_description = short_description
         self.detailed_description = detailed_description
+        self.timeout = timeout
+        self.cpu_time = cpu_time
         if compare:
             self.compare_results = compare
 
@@ -77,6 +106,28 @@ class Grader:
         # didn't catch them.
         self._end_tests = 0
 
+        # how many forked processes run.run() shares the tests between; see
+        # run_tests_in_parallel().
+        self.test_workers = 1
+
+        # default per-test budgets, in seconds; see set_test_budget().
+        self.test_timeout = None
+        self.test_cpu_time = None
+
+        # how much of each test's output is kept; see set_output_limit().
+        self.output_limit = graderutil.DEFAULT_OUTPUT_LIMIT
+        self.output_tail = 0
+        self.stop_on_output_limit = False
+
+        # whether the container entrypoint stops at the first failing test; see
+        # set_fail_fast().
+        self.fail_fast = False
+
+        # fixture name -> (factory, scope), and the values of run-scoped ones;
+        # see add_fixture().
+        self._fixtures = {}
+        self._run_fixtures = {}
+
     ### Grader interface #############################################################
     def input_errors(self, submission_str):
         """
@@ -86,6 +137,8 @@ class Grader:
 
         MUST NOT RUN the submission.  Only allowed to do safe checks, like substr, etc.
         """
+        # The built-in checks share one analysis of the submission (see analyze()).
+        analyze(submission_str)
         return [_f for _f in [check(submission_str) for check in self._input_checks] if _f]
 
     def preprocess(self, submission_str):
@@ -124,6 +177,98 @@ class Grader:
 
     ### Grader setup ###############################################################
 
+    def run_tests_in_parallel(self, workers=None):
+        """
+        Share the tests between up to `workers` forked processes (default: one
+        per CPU the container may use, see graderutil.available_cpus()) instead
+        of running them one after another.
+
+        Only for graders whose tests are independent: each process starts from
+        the freshly imported submission and sees only the side effects of the
+        tests in its own share.  Results are reported in the usual order.
+        """
+        self.test_workers = workers or graderutil.available_cpus()
+
+    def set_test_budget(self, timeout=None, cpu_time=None):
+        """
+        Set the wall-clock `timeout` and `cpu_time` budget, in seconds, of tests
+        that don't set their own.
+
+        A test over budget fails with a "timed out" output and the remaining
+        tests still run, so a single infinite loop costs one test rather than
+        the whole grade.  Keep the total well below the grading timeout.
+        """
+        self.test_timeout = timeout
+        self.test_cpu_time = cpu_time
+
+    def set_output_limit(self, limit=graderutil.DEFAULT_OUTPUT_LIMIT, tail=0, stop=False):
+        """
+        Keep at most `limit` bytes (UTF-8 encoded) of each test's output: the
+        beginning and, if `tail` is set, the last `tail` bytes.  The output in
+        between is dropped while the test runs and replaced by a note of how
+        much there was.  Output captured with capture_stdout() in the test is
+        held to the same limits.
+
+        With `stop` true, a test is stopped as soon as it prints more than `limit`
+        bytes, and fails with an "output limit exceeded" output.
+        """
+        self.output_limit = limit
+        self.output_tail = tail
+        self.stop_on_output_limit = stop
+
+    def set_fail_fast(self, fail_fast=True):
+        """
+        Stop running a submission's tests at the first one that fails.
+
+        The tests after it are not run and count as failed, so the score is the
+        share of tests that passed before the first failure; a submission
+        passing every test is graded as before.  Tests run in parallel (see
+        run_tests_in_parallel) all run regardless.
+        """
+        self.fail_fast = fail_fast
+
+    def add_fixture(self, name, factory, scope="run"):
+        """
+        Add a fixture: a value that tests get with fixture(name), made by calling
+        factory() the first time it is needed.
+
+        A "run"-scoped fixture is made once per grading run and shared by that
+        run's tests.  A "grader"-scoped one is made once per grading process and
+        shared by the staff and student runs alike, so it must not be changed by
+        tests; use it for large reference data, e.g. a mapped_file() baked into
+        the grader image.  Grader-scoped factories don't disturb the random
+        number generators.
+        """
+        if scope not in FIXTURE_SCOPES:
+            raise ValueError("Unknown fixture scope {0!r}".format(scope))
+        self._fixtures[name] = (factory, scope)
+
+    def fixture(self, name):
+        """
+        Return the value of the fixture `name`, making it if needed.
+        """
+        factory, scope = self._fixtures[name]
+        if scope == "run":
+            if name not in self._run_fixtures:
+                self._run_fixtures[name] = factory()
+            return self._run_fixtures[name]
+        if name not in _grader_fixtures:
+            states = rand.getstate(), random.getstate()
+            try:
+                _grader_fixtures[name] = factory()
+            finally:
+                rand.setstate(states[0])
+                random.setstate(states[1])
+        return _grader_fixtures[name]
+
+    def prepare_fixtures(self):
+        """
+        Make the grader-scoped fixtures now, e.g. before forking the grading runs.
+        """
+        for name, (__, scope) in self._fixtures.items():
+            if scope == "grader":
+                self.fixture(name)
+
     def add_preprocessor(self, fn):
         """
         Append preprocessor function to the preprocessors list.  It runs after
@@ -241,22 +386,117 @@ def _tokens(code):
     toks = tokenize(BytesIO(code.encode('utf-8')).readline)
     return toks
 
+
+class SubmissionAnalysis:
+    """
+    What the input checks need to know about a submission, worked out lazily and at
+    most once: tokenizing and parsing happen on first use, and only if some check
+    needs them.  Use analyze(code) to get the shared instance for a submission.
+    """
+    def __init__(self, code):
+        self.code = code
+
+    @functools.cached_property
+    def _code_tokens(self):
+        """
+        (tokens, error): the tokens outside of comments and strings, up to the
+        tokenize error, if there was one.
+        """
+        tokens = []
+        try:
+            for tok in _tokens(self.code):
+                if tok.type not in (COMMENT, STRING):
+                    tokens.append(tok)
+        except Exception as exc:  # pylint: disable=broad-except
+            return tokens, exc
+        return tokens, None
+
+    @functools.cached_property
+    def token_counts(self):
+        """
+        Counter of the token strings outside of comments and strings.
+        """
+        return collections.Counter(tok.string for tok in self._code_tokens[0])
+
+    @functools.cached_property
+    def non_comment_lines(self):
+        """
+        Set of the line numbers holding code: not blank, and not only comments or strings.
+
+        Line 0, from the tokenizer's ENCODING token, is always included; graders
+        written against count_non_comment_lines() expect it.
+        """
+        tokens, error = self._code_tokens
+        if error is not None:
+            raise error
+        return {tok.start[0] for tok in tokens if tok.string.strip()}
+
+    @functools.cached_property
+    def _definitions(self):
+        """
+        (functions, classes, methods) defined anywhere in the code, from its AST, or
+        None if it doesn't parse.  methods maps class names to their method names.
+
+        Deeply nested code can exhaust the parser's recursion limit or memory;
+        it counts as not parsing, so the checks fall back to searching the text.
+        """
+        try:
+            tree = ast.parse(self.code)
+        except (SyntaxError, ValueError, RecursionError, MemoryError):
+            return None
+        functions, classes, methods = set(), set(), collections.defaultdict(set)
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                functions.add(node.name)
+            elif isinstance(node, ast.ClassDef):
+                classes.add(node.name)
+                methods[node.name].update(
+                    item.name for item in node.body
+                    if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+                )
+        return functions, classes, methods
+
+    @property
+    def parses(self):
+        return self._definitions is not None
+
+    @property
+    def functions(self):
+        """Names of all functions and methods defined, or None if the code doesn't parse."""
+        return self._definitions and self._definitions[0]
+
+    @property
+    def classes(self):
+        """Names of all classes defined, or None if the code doesn't parse."""
+        return self._definitions and self._definitions[1]
+
+    def methods(self, class_name):
+        """Names of the methods of `class_name`, or None if the code doesn't parse."""
+        return self._definitions and self._definitions[2].get(class_name, set())
+
+    def token_count(self, string):
+        return self.token_counts[string]
+
+
+_last_analysis = None
+
+def analyze(code):
+    """
+    Return the SubmissionAnalysis of `code`.  The last one is kept, so that all the
+    input checks of a grader share it.
+    """
+    global _last_analysis
+    if _last_analysis is None or _last_analysis.code != code:
+        _last_analysis = SubmissionAnalysis(code)
+    return _last_analysis
+
 def _count_tokens(code, string):
     """
     Return a count of how many times `string` appears as a keyword in `code`.
     """
-    count = 0
-
-    try:
-        for ttyp, ttok, __, __, __ in _tokens(code):
-            if ttyp in (COMMENT, STRING):
-                continue
-            if ttok == string:
-                count += 1
-    except:
-        # The input code was bad in some way. It will fail later on.
-        pass
-    return count
+    # If the input code was bad in some way, this counts the tokens up to the
+    # problem. It will fail later on.
+    return analyze(code).token_count(string)
 
 def prohibited_keyword(string, error_msg=None):
     def check(code):
@@ -347,18 +587,9 @@ def count_non_comment_lines(at_least=None, at_most=None, exactly=None, error_msg
     non-blank source lines conforms to the rules in the arguments.
     """
     def check(code):
-        linenums = set()
-        for ttyp, ttok, (srow, __), __, __ in _tokens(code):
-            if ttyp in (COMMENT, STRING):
-                # Comments and strings don't count toward line count. If a string
-                # is the only thing on a line, then it's probably a docstring, so
-                # don't count it.
-                continue
-            if not ttok.strip():
-                # Tokens that are only whitespace don't count.
-                continue
-            linenums.add(srow)
-        num = len(linenums)
+        # Comments and strings don't count toward line count. If a string is the
+        # only thing on a line, then it's probably a docstring, so don't count it.
+        num = len(analyze(code).non_comment_lines)
         return _check_occurs(None, num, at_least, at_most, exactly, error_msg)
     return check
 
@@ -374,13 +605,20 @@ def _check_occurs(text, occurs, at_least=None, at_most=None, exactly=None, error
             return error_msg or _("Your code has {0!r} {1} times, can't be more than {2}.").format(text, occurs, at_most)
     return None
 
+def _defines_function(code, fn_name):
+    analysis = analyze(code)
+    if analysis.parses:
+        return fn_name in analysis.functions
+    # Code that doesn't parse will fail later on; look for the definition in the text.
+    return re.search(r"\bdef\s+%s\b" % fn_name, code) is not None
+
 def must_define_function(fn_name, error_msg=None):
     """
     Returns a function that checks if a function named `fn_name` is defined. If not,
     returns `error_msg`, or a default message.
     """
     def check(code):
-        if not re.search(r"\bdef\s+%s\b" % fn_name, code):
+        if not _defines_function(code, fn_name):
             return error_msg or _("Your code must define a function named '{0}'.").format(fn_name)
         return None
 
@@ -392,7 +630,7 @@ def prohibited_function_definition(fn_name, error_msg=None):
     returns `error_msg`, or a default message.
     """
     def check(code):
-        if re.search(r"\bdef\s+%s\b" % fn_name, code):
+        if _defines_function(code, fn_name):
             return error_msg or _("Your code should NOT define a function named '{0}'.").format(fn_name)
         return None
 
@@ -404,8 +642,12 @@ def must_define_class(class_name, error_msg=None):
     returns `error_msg`, or a default message.
     """
     def check(code):
-#        if not re.search(r"\bclass\s+%s\b" % class_name, code):
-        if 'class ' + class_name not in code:
+        analysis = analyze(code)
+        if analysis.parses:
+            defined = class_name in analysis.classes
+        else:
+            defined = 'class ' + class_name in code
+        if not defined:
             return error_msg or _("Your code must define a class named '{0}'. Be sure you only have one space between the keyword 'class' and the class name.").format(class_name)
         return None
 
@@ -417,6 +659,11 @@ def prohibited_class_method(class_name, method_name, error_msg=None):
     titled `method_name`. If so, returns `error_msg`, or a default message.
     """
     def check(code):
+        analysis = analyze(code)
+        if analysis.parses:
+            if method_name in analysis.methods(class_name):
+                return error_msg or _("The class named '{0}' should not define a method named {1}.").format(class_name, method_name)
+            return None
         in_class = False
         lines = code.split('\n')
         # Remove comments from lines
@@ -440,6 +687,11 @@ def required_class_method(class_name, method_name, error_msg=None):
     titled `method_name`. If not, returns `error_msg`, or a default message.
     """
     def check(code):
+        analysis = analyze(code)
+        if analysis.parses:
+            if method_name in analysis.methods(class_name):
+                return None
+            return error_msg or _("The class named '{0}' should define a method named {1}.").format(class_name, method_name)
         in_class = False
         lines = code.split('\n')
         # Remove comments from lines
@@ -457,14 +709,46 @@ def required_class_method(class_name, method_name, error_msg=None):
     return check
 
 
+## Fixtures ###############################################################
+
+def mapped_file(path):
+    """
+    Map the file at `path` into memory read-only, and return the mmap object.
+
+    Pages are loaded on demand and shared between all processes mapping the file,
+    so a large data file baked into the grader image costs no copying, even across
+    forked grading runs.  Relative paths are relative to the current directory; use
+    os.path.dirname(__file__) in the grader to find files next to it.
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
 ## test functions #################################
 
-@contextlib.contextmanager
 def capture_stdout():
-    old_stdout = sys.stdout
-    sys.stdout = stdout = StringIO()
-    yield stdout
-    sys.stdout = old_stdout
+    """
+    Capture stdout like graderutil.captured_stdout(), within the output limits
+    of the test being run (see Grader.set_output_limit()).
+    """
+    current = sys.stdout
+    if isinstance(current, graderutil.BoundedOutput):
+        return graderutil.captured_stdout(current.limit, current.tail, current.stop)
+    return graderutil.captured_stdout()
+
+@functools.lru_cache(maxsize=8)
+def _compile_wrapped(code):
+    # "<string>" is the filename exec() gives source strings, so tracebacks
+    # don't change.
+    return compile(code, "<string>", "exec")
+
+def compiled_submission_code(submission_module):
+    """
+    Return the code object for the source that wrap_in_string() stored in
+    `submission_module`.  It is compiled once and reused by every test that
+    execs it, instead of being compiled again for each exec().
+    """
+    return _compile_wrapped(submission_module.submission_code)
 
 def exec_wrapped_code(environment=None, post_process=None):
     """
@@ -477,7 +761,7 @@ def exec_wrapped_code(environment=None, post_process=None):
         environment = {}
     def test_fn(submission_module):
         with capture_stdout() as stdout:
-            exec(submission_module.submission_code, environment)
+            exec(compiled_submission_code(submission_module), environment)
         stdout_text = stdout.getvalue()
         if post_process:
             stdout_text = post_process(stdout_text)
@@ -499,7 +783,7 @@ def exec_code_and_inspect_values(environment=None, vars_to_inspect=None, post_pr
         environment = {}
     def test_fn(submission_module):
         with capture_stdout() as stdout:
-            exec(submission_module.submission_code, environment)
+            exec(compiled_submission_code(submission_module), environment)
 
         for var in vars_to_inspect:
             print(var)
@@ -536,11 +820,12 @@ class InvokeStudentFunctionTest(Test):
     """
     A Test that invokes a student function.
     """
-    def __init__(self, fn_name, args, environment=None, output_writer=None, short_desc=None, detailed_desc=None, compare=None):
+    def __init__(self, fn_name, args, environment=None, output_writer=None, short_desc=None, detailed_desc=None, compare=None,
+                 timeout=None, cpu_time=None):
         test_fn = invoke_student_function(fn_name, args, environment, output_writer)
         if short_desc is None:
             short_desc = "Test: {}({})".format(fn_name, ", ".join(repr(a) for a in args))
-        Test.__init__(self, test_fn, short_desc, detailed_desc, compare)
+        Test.__init__(self, test_fn, short_desc, detailed_desc, compare, timeout, cpu_time)
 
 class ExecWrappedStudentCodeTest(Test):
     """
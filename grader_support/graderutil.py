@@ -2,7 +2,11 @@
 Utilities to help manage code execution and testing.
 """
 
+import collections
 import contextlib
+import importlib.abc
+import importlib.util
+import math
 import os, os.path
 import shutil
 import sys
@@ -17,19 +21,130 @@ import io
 # Put your translations in the file `graders/conf/locale/LANGUAGE/LC_MESSAGES/graders.mo`
 LANGUAGE = 'en'
 
+# How many bytes of output captured_stdout() keeps by default.
+DEFAULT_OUTPUT_LIMIT = 256 * 1024
+
+
+def available_cpus():
+    """
+    Return how many CPUs this process can keep busy: its CPU affinity, capped by
+    the cgroup CPU quota (rounded up) if there is one.  In a container,
+    os.cpu_count() is the node's count instead.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quotas = (
+        ("/sys/fs/cgroup/cpu.max",),  # cgroup v2: "QUOTA PERIOD" or "max PERIOD"
+        ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"),
+    )
+    for paths in quotas:
+        try:
+            fields = []
+            for path in paths:
+                with open(path) as f:
+                    fields.extend(f.read().split())
+            quota, period = fields[0], int(fields[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if quota not in ("max", "-1") and period > 0:
+            count = min(count, max(1, math.ceil(int(quota) / period)))
+        break
+    return count
+
+
+class OutputLimitExceeded(BaseException):
+    """
+    Raised on writes to a BoundedOutput with `stop` set, once it is over its limit.
+
+    A BaseException, so that `except Exception` in student code doesn't swallow it.
+    """
+
+
+class BoundedOutput(io.TextIOBase):
+    """
+    A text stream that keeps at most `limit` bytes of what is written to it,
+    counted UTF-8 encoded: the first `limit - tail` bytes and the last `tail`
+    ones.  The rest is dropped as it arrives and only counted in `discarded`, so
+    memory stays flat however much is written.  A character cut at either end
+    of the dropped part is left out.
+
+    With `stop` true, every write once over the limit raises OutputLimitExceeded.
+    """
+    def __init__(self, limit=DEFAULT_OUTPUT_LIMIT, tail=0, stop=False):
+        super().__init__()
+        self.limit = limit
+        self.tail = min(tail, limit)
+        self.stop = stop
+        self.discarded = 0
+        self._head = bytearray()
+        self._head_room = limit - self.tail
+        self._tail = collections.deque()
+        self._tail_size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if not isinstance(s, str):
+            raise TypeError("string argument expected, got '{0}'".format(type(s).__name__))
+        data = s.encode("utf-8", "backslashreplace")
+        if self._head_room > 0:
+            kept = data[:self._head_room]
+            self._head += kept
+            self._head_room -= len(kept)
+            data = data[len(kept):]
+        if data:
+            if self.tail:
+                self._keep_tail(data)
+            else:
+                self.discarded += len(data)
+            if self.stop:
+                raise OutputLimitExceeded(
+                    "Output limit exceeded: the test printed more than {0} bytes.".format(self.limit)
+                )
+        return len(s)
+
+    def _keep_tail(self, data):
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size - len(self._tail[0]) >= self.tail:
+            self._tail_size -= len(self._tail[0])
+            self.discarded += len(self._tail.popleft())
+        excess = self._tail_size - self.tail
+        if excess > 0:
+            self._tail[0] = self._tail[0][excess:]
+            self._tail_size -= excess
+            self.discarded += excess
+
+    @property
+    def exceeded(self):
+        return self.discarded > 0
+
+    def getvalue(self):
+        """
+        What was kept of the output, with a marker where output was discarded.
+        """
+        value = self._head.decode("utf-8", "ignore")
+        if self.discarded:
+            value += "\n...[{0} bytes of output discarded]...\n".format(self.discarded)
+        return value + b"".join(self._tail).decode("utf-8", "ignore")
+
 
 @contextlib.contextmanager
-def captured_stdout():
+def captured_stdout(limit=DEFAULT_OUTPUT_LIMIT, tail=0, stop=False):
     """
-    A context manager to capture stdout into a StringIO.
+    A context manager to capture stdout into a BoundedOutput.
 
         with captured_stdout() as stdout:
             # .. print stuff ..
         stdout.getvalue() # this is a string with what got printed.
 
+    At most `limit` bytes are kept (see BoundedOutput for `tail` and `stop`).
     """
     old_stdout = sys.stdout
-    sys.stdout = stdout = io.StringIO()
+    sys.stdout = stdout = BoundedOutput(limit, tail, stop)
 
     try:
         yield stdout
@@ -104,6 +219,39 @@ class ModuleIsolation:
             del sys.modules[m]
 
 
+class SourceModules(importlib.abc.MetaPathFinder, importlib.abc.SourceLoader):
+    """
+    Serve top-level modules from source strings held in memory.
+
+    `sources` maps module names to their source code.  Each module gets
+    `directory`/NAME.py as its `__file__`, although nothing is read from or
+    written to that path, and tracebacks show its lines through get_source().
+    Put it first on sys.meta_path, so that it shadows files with the same names.
+    A name mapped to None is shadowed but can't be imported until its source
+    is set.
+    """
+    def __init__(self, sources, directory):
+        self.sources = dict(sources)
+        self.directory = os.path.normpath(directory)
+
+    def find_spec(self, fullname, path=None, target=None):
+        if path is not None or fullname not in self.sources:
+            return None
+        if self.sources[fullname] is None:
+            raise ImportError("{0} can't be imported yet".format(fullname), name=fullname)
+        filename = os.path.join(self.directory, fullname + ".py")
+        return importlib.util.spec_from_file_location(fullname, filename, loader=self)
+
+    def get_filename(self, fullname):
+        return os.path.join(self.directory, fullname + ".py")
+
+    def get_data(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if os.path.dirname(path) != self.directory or name not in self.sources:
+            raise OSError("No in-memory module at {0}".format(path))
+        return self.sources[name].encode("utf-8")
+
+
 @contextlib.contextmanager
 def module_isolation():
     mi = ModuleIsolation()
@@ -9,16 +9,37 @@ various sample inputs, and does not have answers, bad student code can only hurt
 itself.
 """
 
+import contextlib
 import gettext
 import json
+import math
+import os
 import random
+import resource
+import selectors
+import signal
 import sys
+import threading
+import time
 
 from . import gradelib  # to set the random seed
 from . import graderutil
 
 usage = "Usage: run.py GRADER SUBMISSION seed"  # pylint: disable=invalid-name
 
+# Once a test is over budget, it is interrupted again this often (seconds)
+# in case the code under test swallows the first TestTimedOut.
+_BUDGET_RETRY_INTERVAL = 0.1
+
+# Code that swallows every interruption (``while True: try: ... except: pass``)
+# is killed outright this long (seconds) after its budget ran out.
+_BUDGET_BACKSTOP_GRACE = 5
+
+# How long (seconds) to keep reading a test process's pipe once the process has
+# exited: longer means a process it left running holds the pipe open.
+_PIPE_GRACE = 1.0
+_PIPE_POLL_INTERVAL = 0.1
+
 # Install gettext for translation support. This gettext install works within the sandbox,
 # so the path to graders/conf/locale can be relative.
 # LANGUAGE is set in graderutil.py
@@ -32,11 +53,16 @@ _ = trans.gettext
 trans.install(names=None)
 
 
-def run(grader_name, submission_name, seed=1):
+def run(grader_name, submission_name, seed=1, workers=None, keep_going=None):
     """
     `grader_name`: importable module name of the grader
     `submission_name`: importable module name of the submission
     `seed`: A value to seed randomness with.
+    `workers`: how many forked processes to run the tests in, overriding the
+        grader's own `test_workers`.  1 runs them one after another.
+    `keep_going`: optional function (index, test, test output) -> bool, called
+        after each test run one after another; once it returns False, the
+        remaining tests are skipped.
 
     Returns a data structure:
 
@@ -56,10 +82,34 @@ def run(grader_name, submission_name, seed=1):
         ...
         ],
     'exceptions': 0,    # or however many were caught.
+    'skipped': 0,       # tests not run because keep_going returned False.
     }
 
     """
+    seed_random(seed)
+    grader_mod, results = import_captured(grader_name, our_code=True)
+    return run_imported(grader_mod, results, submission_name, workers, keep_going)
+
+
+def seed_random(seed):
+    """
+    Seed the random number generators for one run, before the grader is imported.
+    """
+    # Use a private random number generator, so student code won't accidentally
+    # mess it up.  (if they mess it up deliberately, we don't care--it only
+    # hurts them).
+    gradelib.rand = random.Random(seed)
+    # Also seed the random singleton in case the exercise uses random numbers.
+    random.seed(seed + 1)
+
+
+def run_imported(grader_mod, grader_results, submission_name, workers=None, keep_going=None):
+    """
+    Run the tests of an already imported grader module on `submission_name`.
 
+    `grader_mod` and `grader_results` are what `import_captured` returned for
+    the grader.  Returns the same data structure as `run`.
+    """
     output = {
         'grader': {
             'status': 'notrun',
@@ -69,16 +119,10 @@ def run(grader_name, submission_name, seed=1):
         },
         'results': [],
         'exceptions': 0,
+        'skipped': 0,
     }
 
-    # Use a private random number generator, so student code won't accidentally
-    # mess it up.  (if they mess it up deliberately, we don't care--it only
-    # hurts them).
-    gradelib.rand = random.Random(seed)
-    # Also seed the random singleton in case the exercise uses random numbers.
-    random.seed(seed + 1)
-
-    grader_mod, results = import_captured(grader_name, our_code=True)
+    results = dict(grader_results)
     if grader_mod:
         try:
             grader = grader_mod.grader
@@ -97,31 +141,23 @@ def run(grader_name, submission_name, seed=1):
         if submission and output['submission']['status'] == 'ok':
             # results is a list of ("short description", "detailed desc", "output") tuples.
             try:
-                for test in grader.tests():
-                    with graderutil.captured_stdout() as test_stdout:
-                        try:
-                            exception_output = ""
-                            test(submission)
-                        except gradelib.EndTest:
-                            grader.caught_end_test()
-                        except:  # pylint: disable=bare-except
-                            # The error could be either the grader code or the submission code,
-                            # so hide information.
-                            exception_output = graderutil.format_exception(
-                                main_file=submission_name,
-                                hide_file=True
-                            )
-                            output['exceptions'] += 1
-                        else:
-                            exception_output = ""
-                        # Get the output, including anything printed, and any exception.
-                        test_output = test_stdout.getvalue()
-                        if test_output and test_output[-1] != '\n':
-                            test_output += '\n'
-                        test_output += exception_output
+                tests = list(grader.tests())
+                if workers is None:
+                    workers = getattr(grader, 'test_workers', 1)
+                if workers > 1 and len(tests) > 1:
+                    # The tests all run at once, so there is nothing to skip.
+                    keep_going = None
+                    test_results = run_tests_forked(grader, tests, submission, submission_name, workers)
+                else:
+                    test_results = (run_test(grader, test, submission, submission_name) for test in tests)
+                for index, (test, (test_output, exceptions)) in enumerate(zip(tests, test_results)):
+                    output['exceptions'] += exceptions
                     output['results'].append(
                         (test.short_description, test.detailed_description, test_output)
                     )
+                    if keep_going is not None and not keep_going(index, test, test_output):
+                        output['skipped'] = len(tests) - index - 1
+                        break
             except:  # pylint: disable=bare-except
                 output['grader']['status'] = 'error'
                 output['grader']['exception'] = graderutil.format_exception()
@@ -138,6 +174,251 @@ def run(grader_name, submission_name, seed=1):
     return output
 
 
+def run_test(grader, test, submission, submission_name):
+    """
+    Run one test on the submission, capturing what it prints.
+
+    Returns the test output (including any exception trace) and the number of
+    exceptions it raised (0 or 1).
+    """
+    exceptions = 0
+    timeout = getattr(test, 'timeout', None) or getattr(grader, 'test_timeout', None)
+    cpu_time = getattr(test, 'cpu_time', None) or getattr(grader, 'test_cpu_time', None)
+    capture = graderutil.captured_stdout(
+        getattr(grader, 'output_limit', graderutil.DEFAULT_OUTPUT_LIMIT),
+        getattr(grader, 'output_tail', 0),
+        getattr(grader, 'stop_on_output_limit', False),
+    )
+    with capture as test_stdout:
+        exception_output = ""
+        try:
+            with time_budget(timeout, cpu_time):
+                test(submission)
+        except gradelib.EndTest:
+            grader.caught_end_test()
+        except (gradelib.TestTimedOut, graderutil.OutputLimitExceeded) as exc:
+            exception_output = "*** {0} ***\n".format(exc)
+            exceptions += 1
+        except:  # pylint: disable=bare-except
+            # The error could be either the grader code or the submission code,
+            # so hide information.
+            exception_output = graderutil.format_exception(
+                main_file=submission_name,
+                hide_file=True
+            )
+            exceptions += 1
+        # Get the output, including anything printed, and any exception.
+        test_output = test_stdout.getvalue()
+        if test_output and test_output[-1] != '\n':
+            test_output += '\n'
+        test_output += exception_output
+    return test_output, exceptions
+
+
+@contextlib.contextmanager
+def time_budget(timeout=None, cpu_time=None):
+    """
+    Raise gradelib.TestTimedOut in the block once it has taken `timeout`
+    seconds of wall-clock time or `cpu_time` seconds of CPU time.
+
+    Uses interval timers and signals, so budgets are only enforced in the main
+    thread; elsewhere the block runs unbounded.  Should the block keep
+    swallowing the interruptions, the whole process is killed
+    :data:`_BUDGET_BACKSTOP_GRACE` seconds later: by a watchdog thread for
+    `timeout`, by an RLIMIT_CPU soft limit (SIGXCPU) for `cpu_time`.
+    """
+    timers = []
+    if timeout:
+        timers.append((signal.ITIMER_REAL, signal.SIGALRM, timeout,
+                       _("Timed out: this test took more than {0} seconds.").format(timeout)))
+    if cpu_time:
+        timers.append((signal.ITIMER_PROF, signal.SIGPROF, cpu_time,
+                       _("Timed out: this test used more than {0} seconds of CPU time.").format(cpu_time)))
+    if not timers or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    active = [True]
+    previous = {}
+
+    def make_handler(message):
+        def expired(signum, frame):
+            if active[0]:
+                raise gradelib.TestTimedOut(message)
+        return expired
+
+    for which, signum, seconds, message in timers:
+        previous[signum] = signal.signal(signum, make_handler(message))
+        signal.setitimer(which, seconds, _BUDGET_RETRY_INTERVAL)
+    watchdog = _start_watchdog(timeout)
+    cpu_limit = _limit_cpu(cpu_time)
+    try:
+        yield
+    finally:
+        # A signal landing in here raises out of the cleanup; start over until
+        # both timers are disarmed and the handlers restored.
+        while True:
+            try:
+                for which, _signum, _seconds, _message in timers:
+                    signal.setitimer(which, 0)
+                for _which, signum, _seconds, _message in timers:
+                    signal.signal(signum, previous[signum])
+                active[0] = False
+                break
+            except gradelib.TestTimedOut:
+                continue
+        if watchdog is not None:
+            watchdog.cancel()
+        if cpu_limit is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, cpu_limit)
+
+
+def _start_watchdog(timeout):
+    """Kill this process once `timeout` plus the backstop grace has passed."""
+    if not timeout:
+        return None
+
+    def kill():
+        os.write(2, b"Test ignored its time budget; killing the process.\n")
+        os.kill(os.getpid(), signal.SIGKILL)
+
+    watchdog = threading.Timer(timeout + _BUDGET_BACKSTOP_GRACE, kill)
+    watchdog.daemon = True
+    watchdog.start()
+    return watchdog
+
+
+def _limit_cpu(cpu_time):
+    """
+    Lower the RLIMIT_CPU soft limit to the CPU used so far plus `cpu_time` and
+    the backstop grace.  Returns the limits to restore, or None if unchanged.
+    """
+    if not cpu_time:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    seconds = math.ceil(usage.ru_utime + usage.ru_stime + cpu_time + _BUDGET_BACKSTOP_GRACE)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        seconds = min(seconds, hard)
+    if soft != resource.RLIM_INFINITY and soft <= seconds:
+        return None
+    resource.setrlimit(resource.RLIMIT_CPU, (seconds, hard))
+    return soft, hard
+
+
+def run_tests_forked(grader, tests, submission, submission_name, workers):
+    """
+    Run `tests` sharded round-robin across up to `workers` forked processes.
+
+    Each process starts from the state after the submission was imported and
+    runs its shard in order, writing each test's result to its pipe as one
+    JSON line as soon as the test finishes, so a process that dies only costs
+    the tests it had not reported.  Returns a list of `run_test` results in
+    the order of `tests`, whatever order the shards finish in.  EndTest
+    bookkeeping done in the processes is applied to `grader`.
+
+    The pipes are read together, and a pipe is given up on :data:`_PIPE_GRACE`
+    seconds after its process exited, so a background process a test started
+    can't keep the grade waiting.
+    """
+    shards = [list(range(k, len(tests), workers)) for k in range(min(workers, len(tests)))]
+    children = []
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for shard in shards:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover - runs in the forked child
+            status = 1
+            try:
+                _close_inherited_pipes(keep=write_fd)
+                with os.fdopen(write_fd, 'w', encoding='utf-8') as pipe:
+                    for index in shard:
+                        before = grader.uncaught_end_tests()
+                        test_output, exceptions = run_test(grader, tests[index], submission, submission_name)
+                        pipe.write(json.dumps(
+                            [index, test_output, exceptions, grader.uncaught_end_tests() - before]
+                        ) + "\n")
+                        pipe.flush()
+                status = 0
+            except BaseException:  # pylint: disable=broad-except
+                sys.stderr.write(graderutil.format_exception())
+            finally:
+                os._exit(status)
+        os.close(write_fd)
+        children.append((pid, read_fd, shard))
+
+    results = [None] * len(tests)
+    for output in _read_children(children):
+        for line in output.decode('utf-8', 'replace').splitlines():
+            try:
+                index, test_output, exceptions, end_tests = json.loads(line)
+            except ValueError:
+                # Cut short by the process dying mid-write.
+                continue
+            results[index] = (test_output, exceptions)
+            # Raised-but-not-caught EndTests, as the sequential run counts them.
+            grader._end_tests += end_tests  # pylint: disable=protected-access
+    crashed = _("*** The test stopped the grading process. ***\n")
+    return [result if result is not None else (crashed, 1) for result in results]
+
+
+def _close_inherited_pipes(keep):
+    """
+    Close every pipe this process inherited other than `keep` and stdio: the
+    other test processes' pipes and the entrypoint's.  Files and sockets the
+    grader opened stay open.
+    """
+    for name in os.listdir('/proc/self/fd'):
+        fd = int(name)
+        if fd <= 2 or fd == keep:
+            continue
+        try:
+            if os.readlink('/proc/self/fd/' + name).startswith('pipe:'):
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def _read_children(children):
+    """
+    Read the pipes of the forked `children` (pid, read fd, shard) until each
+    one ends, or its process has been gone for :data:`_PIPE_GRACE` seconds.
+    Reaps the processes and returns what each one wrote, in order.
+    """
+    outputs = [bytearray() for _child in children]
+    exited = [None] * len(children)
+    selector = selectors.DefaultSelector()
+    for n, (_pid, read_fd, _shard) in enumerate(children):
+        selector.register(read_fd, selectors.EVENT_READ, n)
+    try:
+        while selector.get_map():
+            for key, _events in selector.select(_PIPE_POLL_INTERVAL):
+                data = os.read(key.fd, 65536)
+                if data:
+                    outputs[key.data] += data
+                else:
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                n = key.data
+                if exited[n] is None:
+                    if os.waitpid(children[n][0], os.WNOHANG)[0]:
+                        exited[n] = now
+                elif now - exited[n] >= _PIPE_GRACE:
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+    finally:
+        for key in list(selector.get_map().values()):
+            os.close(key.fd)
+        selector.close()
+        for n, (pid, _read_fd, _shard) in enumerate(children):
+            if exited[n] is None:
+                os.waitpid(pid, 0)
+    return [bytes(output) for output in outputs]
+
+
 def import_captured(name, our_code=False):
     """
     Import the module `name`, capturing stdout, and any exceptions that happen.
@@ -0,0 +1,171 @@
+"""
+Unit tests for the adaptive container-launch admission limiter.
+"""
+
+import threading
+from unittest import mock
+
+import pytest
+
+from xqueue_watcher import admission
+from xqueue_watcher.admission import AdaptiveLimiter, AdmissionRejected
+from xqueue_watcher.lifecycle import GradingTimeout
+
+
+def make_limiter(**kwargs):
+    defaults = dict(name="test", max_limit=10, initial_limit=2, latency_target=1.0, max_queue=2)
+    defaults.update(kwargs)
+    return AdaptiveLimiter(**defaults)
+
+
+class TestAdaptiveLimiter:
+    def test_acquire_within_limit(self):
+        limiter = make_limiter()
+        limiter.acquire(timeout=0)
+        limiter.acquire(timeout=0)
+        assert limiter.in_flight == 2
+
+    def test_acquire_over_limit_times_out(self):
+        limiter = make_limiter(initial_limit=1)
+        limiter.acquire(timeout=0)
+        with pytest.raises(AdmissionRejected, match="Timed out"):
+            limiter.acquire(timeout=0.01)
+        assert limiter.queue_depth == 0
+
+    def test_full_queue_rejects_immediately(self):
+        limiter = make_limiter(initial_limit=1, max_queue=0)
+        limiter.acquire(timeout=0)
+        with pytest.raises(AdmissionRejected, match="full"):
+            limiter.acquire(timeout=10)
+
+    def test_waiter_admitted_on_release(self):
+        limiter = make_limiter(initial_limit=1)
+        limiter.acquire(timeout=0)
+        admitted = threading.Event()
+
+        def waiter():
+            limiter.acquire(timeout=5)
+            admitted.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        assert not admitted.wait(0.05)
+        limiter.release(launch_latency=0.1)
+        assert admitted.wait(5)
+        thread.join()
+
+    def test_fast_launch_increases_limit(self):
+        limiter = make_limiter(initial_limit=2)
+        for _ in range(4):
+            limiter.acquire(timeout=0)
+            limiter.release(launch_latency=0.1)
+        assert limiter.limit == 3
+
+    def test_slow_launch_decreases_limit(self):
+        limiter = make_limiter(initial_limit=8)
+        limiter.acquire(timeout=0)
+        limiter.release(launch_latency=5.0)
+        assert limiter.limit == 5
+
+    def test_failed_launch_decreases_limit(self):
+        limiter = make_limiter(initial_limit=8)
+        limiter.acquire(timeout=0)
+        limiter.release(launch_latency=None)
+        assert limiter.limit == 5
+
+    def test_one_decrease_per_window(self):
+        limiter = make_limiter(initial_limit=8, latency_target=1.0)
+        with mock.patch.object(admission.time, "monotonic", return_value=100.0) as clock:
+            for _ in range(5):
+                limiter.acquire(timeout=0)
+                limiter.release(launch_latency=None)
+            assert limiter.limit == 5
+            clock.return_value = 101.0
+            limiter.acquire(timeout=0)
+            limiter.release(launch_latency=0.5, error=True)
+        assert limiter.limit == 3
+
+    def test_limit_bounded(self):
+        limiter = make_limiter(initial_limit=1, max_limit=2, min_limit=1, latency_target=0.0)
+        for _ in range(20):
+            limiter.acquire(timeout=0)
+            limiter.release(launch_latency=None)
+        assert limiter.limit == 1
+        for _ in range(20):
+            limiter.acquire(timeout=0)
+            limiter.release(launch_latency=0.0)
+        assert limiter.limit == 2
+
+    def test_invalid_bounds(self):
+        with pytest.raises(ValueError):
+            AdaptiveLimiter("bad", max_limit=1, min_limit=2)
+
+
+class TestGetLimiter:
+    def test_shared_per_key(self):
+        key = ("kubernetes", None, None, "test-shared-per-key")
+        a = admission.get_limiter(key, max_limit=4)
+        b = admission.get_limiter(key, max_limit=99)
+        assert a is b
+        assert a.max_limit == 4
+        assert a.name == "kubernetes/test-shared-per-key"
+
+
+class TestContainerGraderAdmission:
+    def test_disabled_by_default(self):
+        from xqueue_watcher.containergrader import ContainerGrader
+
+        grader = ContainerGrader(grader_root="/graders", image="img:v1", backend="docker")
+        assert grader._admission_limiter() is None
+
+    def test_run_acquires_and_reports_latency(self):
+        from xqueue_watcher.containergrader import ContainerGrader
+
+        grader = ContainerGrader(
+            grader_root="/graders", image="img:v1", backend="docker", max_concurrency=4
+        )
+        limiter = mock.MagicMock()
+
+        def fake_run_docker(grader_path, code, seed, grader_config, launch=None):
+            launch.mark_running()
+            return b"{}"
+
+        with mock.patch.object(grader, "_admission_limiter", return_value=limiter), \
+             mock.patch.object(grader, "_run_docker", side_effect=fake_run_docker):
+            assert grader._run("/graders/grade.py", "code", 1) == b"{}"
+        limiter.acquire.assert_called_once_with(timeout=grader.timeout)
+        latency = limiter.release.call_args.args[0]
+        assert latency is not None and latency >= 0
+        assert limiter.release.call_args.kwargs == {"error": False}
+
+    def test_run_reports_failed_launch(self):
+        from xqueue_watcher.containergrader import ContainerGrader
+
+        grader = ContainerGrader(
+            grader_root="/graders", image="img:v1", backend="docker", max_concurrency=4
+        )
+        limiter = mock.MagicMock()
+        with mock.patch.object(grader, "_admission_limiter", return_value=limiter), \
+             mock.patch.object(grader, "_run_docker", side_effect=RuntimeError("quota")):
+            with pytest.raises(RuntimeError):
+                grader._run("/graders/grade.py", "code", 1)
+        limiter.release.assert_called_once_with(None, error=True)
+
+    def test_run_failure_after_running_not_an_error(self):
+        from xqueue_watcher.containergrader import ContainerGrader
+
+        grader = ContainerGrader(
+            grader_root="/graders", image="img:v1", backend="docker", max_concurrency=4
+        )
+        limiter = mock.MagicMock()
+
+        def failing_run_docker(grader_path, code, seed, grader_config, launch=None):
+            launch.mark_running()
+            raise GradingTimeout("exited 137")
+
+        with mock.patch.object(grader, "_admission_limiter", return_value=limiter), \
+             mock.patch.object(grader, "_run_docker", side_effect=failing_run_docker):
+            with pytest.raises(GradingTimeout):
+                grader._run("/graders/grade.py", "code", 1)
+        # The submission's failure, not congestion: the launch itself went fine.
+        assert limiter.release.call_args.kwargs == {"error": False}
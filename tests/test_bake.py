@@ -0,0 +1,178 @@
+"""
+Tests for grader_support.bake, which bakes staff outputs into grader images.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from grader_support import bake
+
+ROOT = Path(__file__).parent.parent
+
+GRADER = '''
+import os
+
+from grader_support import gradelib
+
+with open(os.path.join(os.environ["GRADER_WORK_DIR"], "runs.log"), "a") as log:
+    log.write("import\\n")
+
+grader = gradelib.Grader()
+
+
+def draw(submission):
+    print(submission.pick(gradelib.rand))
+
+
+grader.add_test(gradelib.Test(draw, "draw"))
+'''
+
+ANSWER = "def pick(rand):\n    return rand.randint(0, 10**6)\n"
+
+
+@pytest.fixture
+def grader_path(tmp_path, monkeypatch):
+    grader_dir = tmp_path / "graders"
+    grader_dir.mkdir()
+    (grader_dir / "grade_draw.py").write_text(GRADER)
+    (grader_dir / "answer.py").write_text(ANSWER)
+    monkeypatch.setenv("GRADER_WORK_DIR", str(tmp_path))
+    monkeypatch.chdir(ROOT)
+    return str(grader_dir / "grade_draw.py")
+
+
+def grade(grader_path, seed, code, **env):
+    proc = subprocess.run(
+        [sys.executable, "-m", "grader_support.entrypoint", grader_path, str(seed)],
+        cwd=ROOT,
+        env=dict(os.environ, SUBMISSION_CODE=code, **env),
+        capture_output=True,
+        timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr.decode()
+    return json.loads(proc.stdout.decode().strip().splitlines()[-1])
+
+
+def imports():
+    log = Path(os.environ["GRADER_WORK_DIR"]) / "runs.log"
+    count = log.read_text().count("import") if log.exists() else 0
+    log.unlink(missing_ok=True)
+    return count
+
+
+class TestBake:
+    def test_parse_seeds(self):
+        assert bake._parse_seeds("3,0-2,2") == [0, 1, 2, 3]
+
+    def test_bake_and_lookup(self, grader_path):
+        assert bake.main(["--seeds", "1-3", "--languages", "en,fr", grader_path]) == 0
+        with open(bake.index_path(grader_path)) as f:
+            index = json.load(f)
+        assert sorted(index["expected"]) == ["en", "fr"]
+        assert sorted(index["expected"]["en"], key=int) == ["1", "2", "3"]
+
+        seed, expected = bake.lookup(grader_path, 2, "en")
+        assert seed == 2
+        assert expected["results"][0][0] == "draw"
+        # Other seeds map onto the baked ones.
+        assert bake.lookup(grader_path, 7, "en")[0] in (1, 2, 3)
+        assert bake.lookup(grader_path, 1, "de") is None
+
+    def test_stale_index_ignored(self, grader_path):
+        bake.main(["--seeds", "1", grader_path])
+        assert bake.lookup(grader_path, 1, "en") is not None
+        with open(os.path.join(os.path.dirname(grader_path), "answer.py"), "a") as f:
+            f.write("# changed\n")
+        assert bake.lookup(grader_path, 1, "en") is None
+
+    @pytest.mark.parametrize("changed", ["data/table.csv", "helpers/util.py", "conf/locale/fr/LC_MESSAGES/graders.mo"])
+    def test_any_file_in_grader_dir_fingerprinted(self, grader_path, changed):
+        path = Path(grader_path).parent / changed
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"1")
+        bake.main(["--seeds", "1", grader_path])
+        assert bake.lookup(grader_path, 1, "en") is not None
+        path.write_bytes(b"2")
+        assert bake.lookup(grader_path, 1, "en") is None
+
+    def test_other_indexes_and_caches_not_fingerprinted(self, grader_path):
+        bake.main(["--seeds", "1", grader_path])
+        grader_dir = Path(grader_path).parent
+        (grader_dir / "grade_other.expected.json").write_text("{}")
+        (grader_dir / "__pycache__").mkdir()
+        (grader_dir / "__pycache__" / "answer.cpython-311.pyc").write_bytes(b"x")
+        assert bake.lookup(grader_path, 1, "en") is not None
+
+    def test_grade_time_check_reads_no_files(self, grader_path, monkeypatch):
+        bake.main(["--seeds", "1", grader_path])
+        answer = Path(grader_path).parent / "answer.py"
+        st = answer.stat()
+        answer.write_text(ANSWER.replace("10**6", "10**5"))
+        os.utime(answer, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # Same size and mtime: only stat'ed, so trusted as baked into the image.
+        monkeypatch.setattr(bake, "_file_digest", None)
+        assert bake.lookup(grader_path, 1, "en") is not None
+
+    def test_mounted_grader_dir_rehashed(self, grader_path, monkeypatch):
+        bake.main(["--seeds", "1", grader_path])
+        monkeypatch.setattr(bake, "_mounted", lambda path: True)
+        assert bake.lookup(grader_path, 1, "en") is not None
+        answer = Path(grader_path).parent / "answer.py"
+        st = answer.stat()
+        answer.write_text(ANSWER.replace("10**6", "10**5"))
+        os.utime(answer, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert bake.lookup(grader_path, 1, "en") is None
+
+    def test_mount_point(self, tmp_path, monkeypatch):
+        mountinfo = tmp_path / "mountinfo"
+        mountinfo.write_text(
+            "1 0 0:1 / / rw - overlay overlay rw\n"
+            "2 1 8:1 /srv/graders /graders ro - ext4 /dev/sda1 ro\n"
+            "3 1 8:1 /x /my\\040dir rw - ext4 /dev/sda1 rw\n"
+        )
+        real_open = open
+        monkeypatch.setattr(
+            "builtins.open",
+            lambda path, *a, **kw: real_open(mountinfo if path == "/proc/self/mountinfo" else path, *a, **kw),
+        )
+        assert bake._mount_point("/graders/ps01/grade.py") == "/graders"
+        assert bake._mount_point("/graders2/grade.py") == "/"
+        assert bake._mount_point("/my dir/grade.py") == "/my dir"
+        assert bake._mount_point("/grader/grader_support") == "/"
+
+    def test_index_only_serves_same_test_workers(self, grader_path, monkeypatch):
+        bake.main(["--seeds", "1", grader_path])
+        monkeypatch.setenv("GRADER_TEST_WORKERS", "4")
+        assert bake.lookup(grader_path, 1, "en") is None
+        bake.main(["--seeds", "1", grader_path])
+        assert bake.lookup(grader_path, 1, "en") is not None
+        monkeypatch.delenv("GRADER_TEST_WORKERS")
+        assert bake.lookup(grader_path, 1, "en") is None
+
+    def test_failing_answer_not_baked(self, grader_path):
+        with open(os.path.join(os.path.dirname(grader_path), "answer.py"), "w") as f:
+            f.write("def pick(rand):\n    raise ValueError\n")
+        assert bake.main(["--seeds", "1", grader_path]) == 1
+        assert not os.path.exists(bake.index_path(grader_path))
+
+    @pytest.mark.parametrize("isolation", ["import", "fork", "fork-parallel"])
+    def test_entrypoint_skips_staff_run(self, grader_path, isolation):
+        bake.main(["--seeds", "5", grader_path])
+        imports()
+        unbaked = grade(grader_path, 5, ANSWER, GRADER_BAKED="0", GRADER_ISOLATION=isolation)
+        assert imports() == (3 if isolation == "import" else 1)
+
+        # Any seed is graded with the baked one, without a staff run.
+        result = grade(grader_path, 1234, ANSWER, GRADER_ISOLATION=isolation)
+        assert imports() == (2 if isolation == "import" else 1)
+        assert result["correct"] is True
+        assert result["tests"] == unbaked["tests"]
+        assert "staff" not in result["diagnostics"]
+
+        wrong = grade(grader_path, 1234, "def pick(rand):\n    return -1\n", GRADER_ISOLATION=isolation)
+        assert wrong["correct"] is False
@@ -0,0 +1,152 @@
+"""
+Unit tests for micro-batching of submissions into multi-submission Jobs.
+"""
+
+import json
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from xqueue_watcher.batching import BatchItem, MicroBatcher
+from xqueue_watcher.containergrader import ContainerGrader
+
+
+def _submit_concurrently(batcher, items):
+    results = [None] * len(items)
+
+    def worker(i):
+        try:
+            results[i] = batcher.submit(items[i])
+        except Exception as exc:  # pylint: disable=broad-except
+            results[i] = exc
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(items))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+class TestMicroBatcher:
+    def test_single_submission_runs_after_window(self):
+        run_batch = mock.Mock(side_effect=lambda items: [b"ok"] * len(items))
+        batcher = MicroBatcher(run_batch, window=0.01, max_size=10, max_bytes=1000)
+        assert batcher.submit(BatchItem("g.py", "x", "1")) == b"ok"
+        run_batch.assert_called_once()
+
+    def test_full_batch_runs_together(self):
+        calls = []
+
+        def run_batch(items):
+            calls.append([i.code for i in items])
+            return [i.code.encode() for i in items]
+
+        batcher = MicroBatcher(run_batch, window=5, max_size=3, max_bytes=1000)
+        items = [BatchItem("g.py", str(i), "1") for i in range(3)]
+        results = _submit_concurrently(batcher, items)
+        assert results == [b"0", b"1", b"2"]
+        assert len(calls) == 1 and sorted(calls[0]) == ["0", "1", "2"]
+
+    def test_byte_cap_starts_new_batch(self):
+        sizes = []
+
+        def run_batch(items):
+            sizes.append(len(items))
+            return [b"ok"] * len(items)
+
+        batcher = MicroBatcher(run_batch, window=0.2, max_size=10, max_bytes=5)
+        items = [BatchItem("g.py", "abcd", "1") for _ in range(2)]
+        _submit_concurrently(batcher, items)
+        assert sizes == [1, 1]
+
+    def test_per_item_exception_raised_in_submitter(self):
+        batcher = MicroBatcher(
+            lambda items: [RuntimeError("bad")], window=0, max_size=1, max_bytes=1000
+        )
+        with pytest.raises(RuntimeError, match="bad"):
+            batcher.submit(BatchItem("g.py", "x", "1"))
+
+    def test_runner_failure_fails_every_item(self):
+        def run_batch(items):
+            raise RuntimeError("api down")
+
+        batcher = MicroBatcher(run_batch, window=5, max_size=2, max_bytes=1000)
+        results = _submit_concurrently(batcher, [BatchItem("g.py", "x", "1")] * 2)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    def test_follower_wait_bounded(self):
+        def run_batch(items):
+            time.sleep(1)
+            return [b"late"] * len(items)
+
+        # The batch fills at once, so the follower waits only window + timeout.
+        batcher = MicroBatcher(run_batch, window=0.2, max_size=2, max_bytes=1000, timeout=0.1)
+        results = _submit_concurrently(batcher, [BatchItem("g.py", "x", "1")] * 2)
+        # The leader gets its result; the follower gives up on the stuck batch.
+        assert sorted(map(type, results), key=lambda t: t.__name__) == [RuntimeError, bytes]
+        assert "did not finish" in str(next(r for r in results if isinstance(r, RuntimeError)))
+
+
+class TestContainerGraderBatching:
+    def _grader(self, **kwargs):
+        defaults = dict(
+            grader_root="/graders", image="img:v1", backend="kubernetes",
+            batch_window=0.1, timeout=10,
+        )
+        defaults.update(kwargs)
+        return ContainerGrader(**defaults)
+
+    def test_batching_requires_kubernetes(self):
+        with pytest.raises(ValueError, match="kubernetes"):
+            self._grader(backend="docker")
+
+    def test_batch_job_manifest(self):
+        grader = self._grader(batch_parallelism=2, cpu_limit="500m", memory_limit="256Mi")
+        items = [
+            BatchItem("/graders/a.py", "x = 1", "7", {"lang": "fr"}),
+            BatchItem("/graders/b.py", "y = 2", "8", {"hide_output": True}),
+        ]
+        job = grader._build_k8s_batch_job("job", items, 40)
+        container = job.spec.template.spec.containers[0]
+        assert container.args == ["--batch"]
+        env = {e.name: e.value for e in container.env}
+        batch = json.loads(env["SUBMISSION_BATCH"])
+        assert [b["grader"] for b in batch] == ["/graders/a.py", "/graders/b.py"]
+        assert batch[0]["lang"] == "fr" and batch[1]["hide_output"] is True
+        assert env["BATCH_PARALLELISM"] == "2"
+        assert env["BATCH_ITEM_TIMEOUT"] == "10"
+        assert container.resources.limits == {"cpu": "1000m", "memory": str(512 * 1024**2)}
+        assert job.spec.active_deadline_seconds == 40
+
+    def test_batch_results_demultiplexed(self):
+        grader = self._grader()
+        output = json.dumps({"batch": [
+            {"id": 1, "error": "timed out after 10s"},
+            {"id": 0, "result": {"correct": True, "score": 1}},
+        ]}).encode()
+        items = [BatchItem("/graders/a.py", "x", "1"), BatchItem("/graders/a.py", "y", "2")]
+        with mock.patch.object(grader, "_run_k8s_job", return_value=output) as run_job:
+            results = grader._run_kubernetes_batch(items)
+        assert json.loads(results[0]) == {"correct": True, "score": 1}
+        assert isinstance(results[1], RuntimeError)
+        # Two sequential rounds plus start-up.
+        assert run_job.call_args.args[2] == 30
+
+    def test_batcher_timeout_covers_full_batch(self):
+        grader = self._grader(batch_parallelism=2, batch_max_size=4)
+        with mock.patch("xqueue_watcher.containergrader.get_batcher") as get_batcher:
+            grader._get_batcher()
+        # Admission wait plus two rounds and start-up.
+        assert get_batcher.call_args.kwargs["timeout"] == 10 + 30
+
+    def test_run_goes_through_batcher(self):
+        grader = self._grader()
+        batcher = mock.MagicMock()
+        batcher.submit.return_value = b"{}"
+        with mock.patch.object(grader, "_get_batcher", return_value=batcher):
+            assert grader._run("/graders/a.py", "code", "3", {"lang": "es"}) == b"{}"
+        item = batcher.submit.call_args.args[0]
+        assert item.code == "code" and item.grader_config == {"lang": "es"}
@@ -6,13 +6,17 @@ execution paths without requiring a live Docker daemon or cluster.
 """
 
 import json
+import time
 from pathlib import Path
 from unittest import mock
 from unittest.mock import patch
 
+import docker
 import pytest
 
+from xqueue_watcher.admission import AdmissionRejected
 from xqueue_watcher.containergrader import ContainerGrader, _parse_cpu_millis, _parse_memory_bytes
+from xqueue_watcher.lifecycle import GradingOutOfMemory, GradingTimeout
 
 
 # ---------------------------------------------------------------------------
@@ -247,14 +251,191 @@ class TestBuildK8sJob:
         assert job.spec.active_deadline_seconds == 30
 
 
+class TestSubmissionTransport:
+    def test_compressed_round_trip(self):
+        import base64
+        import gzip
+
+        grader = make_grader(backend="kubernetes", submission_transport="compressed")
+        code = "print('hi')\n" * 1000
+        env = grader._k8s_job_fields("/graders/grade.py", code, 1)["env"]
+        assert "SUBMISSION_CODE" not in env
+        assert gzip.decompress(base64.b64decode(env["SUBMISSION_CODE_GZ"])).decode() == code
+        assert len(env["SUBMISSION_CODE_GZ"]) < len(code) / 10
+
+    def test_compressed_limit_applies_to_encoded_size(self):
+        grader = make_grader(backend="kubernetes", submission_transport="compressed")
+        code = "x = 1\n" * 400_000  # ~2.4 MB, compresses to a few KB
+        with mock.patch.object(grader, "_launch", return_value=b"{}") as launch:
+            grader._run("/graders/grade.py", code, 1)
+        launch.assert_called_once()
+
+    def test_compressed_raw_size_still_capped(self):
+        grader = make_grader(backend="kubernetes", submission_transport="compressed")
+        code = "x = 1\n" * 2_000_000  # ~12 MB, above the raw cap however well it compresses
+        with mock.patch.object(grader, "_launch") as launch:
+            with pytest.raises(ValueError, match="too large"):
+                grader._run("/graders/grade.py", code, 1)
+        launch.assert_not_called()
+
+    def test_env_limit_applies_to_raw_size(self):
+        grader = make_grader(backend="kubernetes")
+        with pytest.raises(ValueError, match="too large"):
+            grader._run("/graders/grade.py", "x = 1\n" * 400_000, 1)
+
+    def test_stdin_rejected_for_kubernetes(self):
+        with pytest.raises(ValueError, match="stdin"):
+            make_grader(backend="kubernetes", submission_transport="stdin")
+
+    def test_grader_isolation_passed_to_entrypoint(self):
+        grader = make_grader(backend="kubernetes", grader_isolation="fork")
+        env = grader._k8s_job_fields("/graders/grade.py", "code", 1)["env"]
+        assert env["GRADER_ISOLATION"] == "fork"
+        assert "GRADER_ISOLATION" not in make_grader()._entrypoint_env("code", {})
+
+    def test_fail_fast_payload_passed_to_entrypoint(self):
+        grader = make_grader()
+        assert grader._entrypoint_env("code", {"fail_fast": True})["GRADER_FAIL_FAST"] == "1"
+        assert grader._entrypoint_env("code", {"fail_fast": False})["GRADER_FAIL_FAST"] == "0"
+        assert "GRADER_FAIL_FAST" not in grader._entrypoint_env("code", {})
+
+    def test_unknown_grader_isolation_rejected(self):
+        with pytest.raises(ValueError, match="grader_isolation"):
+            make_grader(grader_isolation="vm")
+
+    def test_unknown_transport_rejected(self):
+        with pytest.raises(ValueError, match="submission_transport"):
+            make_grader(submission_transport="carrier-pigeon")
+
+
+class TestRenderK8sJob:
+    def setup_method(self):
+        self.grader = make_grader(backend="kubernetes", timeout=30)
+
+    def _fields(self, code="code", seed=42, grader_config=None):
+        return self.grader._k8s_job_fields("/graders/grade.py", code, seed, grader_config)
+
+    def test_matches_serialized_job_object(self):
+        from kubernetes import client as k8s_client
+
+        rendered = self.grader._render_k8s_job("job-a", **self._fields(grader_config={"lang": "fr"}))
+        built = self.grader._build_k8s_job("job-a", "/graders/grade.py", "code", 42, {"lang": "fr"})
+        assert rendered == k8s_client.ApiClient().sanitize_for_serialization(built)
+
+    def test_template_built_once_per_configuration(self):
+        with mock.patch.object(
+            self.grader, "_k8s_job_manifest", wraps=self.grader._k8s_job_manifest
+        ) as manifest:
+            self.grader._render_k8s_job("job-a", **self._fields(code="a"))
+            self.grader._render_k8s_job("job-b", **self._fields(code="b"))
+        assert manifest.call_count == 1
+
+    def test_renders_do_not_share_patched_fields(self):
+        first = self.grader._render_k8s_job("job-a", **self._fields(code="a", seed=1))
+        second = self.grader._render_k8s_job("job-b", **self._fields(code="b", seed=2))
+        assert first["metadata"]["name"] == "job-a"
+        assert first["metadata"]["labels"]["xqueue-watcher/job-name"] == "job-a"
+        first_container = first["spec"]["template"]["spec"]["containers"][0]
+        assert first_container["args"] == ["/graders/grade.py", "1"]
+        assert {"name": "SUBMISSION_CODE", "value": "a"} in first_container["env"]
+        assert second["spec"]["template"]["spec"]["containers"][0]["args"][1] == "2"
+
+    def test_image_follows_effective_image(self):
+        self.grader._render_k8s_job("job-a", **self._fields())
+        with mock.patch.object(self.grader, "_effective_image", return_value="repo@sha256:abc"):
+            job = self.grader._render_k8s_job("job-b", **self._fields())
+        assert job["spec"]["template"]["spec"]["containers"][0]["image"] == "repo@sha256:abc"
+
+
+class TestGraderProfiles:
+    def _grader(self, mode, tmp_path):
+        grader = make_grader(
+            backend="kubernetes", timeout=30, cpu_limit="1000m", memory_limit="512Mi",
+            profile_mode=mode, profile_store=str(tmp_path / "profiles.json"),
+            profile_min_samples=3,
+        )
+        diagnostics = {"student": {"wall_seconds": 2.0, "cpu_seconds": 1.0,
+                                   "peak_rss_bytes": 100 * 1024**2}}
+        for _ in range(3):
+            grader._profiles.record("/graders/grade.py", 4.0, diagnostics)
+        return grader
+
+    def _job(self, grader):
+        fields = grader._k8s_job_fields("/graders/grade.py", "code", 1, None)
+        return grader._render_k8s_job("job", **fields)
+
+    def test_apply_mode_uses_learned_settings(self, tmp_path):
+        job = self._job(self._grader("apply", tmp_path))
+        container = job["spec"]["template"]["spec"]["containers"][0]
+        assert job["spec"]["activeDeadlineSeconds"] == 6
+        assert container["resources"]["requests"] == {"cpu": "500m", "memory": str(100 * 1024**2)}
+        assert container["resources"]["limits"] == {"cpu": "750m", "memory": str(150 * 1024**2)}
+
+    def test_report_mode_keeps_configured_settings(self, tmp_path):
+        job = self._job(self._grader("report", tmp_path))
+        container = job["spec"]["template"]["spec"]["containers"][0]
+        assert job["spec"]["activeDeadlineSeconds"] == 30
+        assert container["resources"]["limits"] == {"cpu": "1000m", "memory": "512Mi"}
+
+    def test_apply_requires_kubernetes(self):
+        with pytest.raises(ValueError, match="kubernetes"):
+            make_grader(profile_mode="apply")
+
+    def _grade(self, grader, **run_kubernetes):
+        with mock.patch.object(grader, "_run_kubernetes", **run_kubernetes):
+            return grader.grade(Path("/graders/grade.py"), {}, "x = 1")
+
+    def test_grade_records_run(self, tmp_path):
+        grader = self._grader("report", tmp_path)
+        output = json.dumps({"correct": True, "score": 1, "errors": [], "tests": []}).encode()
+        self._grade(grader, return_value=output)
+        assert len(grader._profiles.samples("/graders/grade.py")["wall"]) == 4
+
+    def test_admission_wait_not_counted(self, tmp_path):
+        grader = self._grader("report", tmp_path)
+        output = json.dumps({"correct": True, "score": 1, "errors": [], "tests": []}).encode()
+        limiter = mock.Mock()
+        limiter.acquire.side_effect = lambda timeout: time.sleep(0.5)
+        with mock.patch.object(grader, "_admission_limiter", return_value=limiter):
+            self._grade(grader, return_value=output)
+        assert grader._profiles.samples("/graders/grade.py")["wall"][-1] < 0.5
+
+    def test_admission_rejection_not_recorded(self, tmp_path):
+        grader = self._grader("report", tmp_path)
+        limiter = mock.Mock()
+        limiter.acquire.side_effect = AdmissionRejected("queue full")
+        with mock.patch.object(grader, "_admission_limiter", return_value=limiter):
+            self._grade(grader)
+        assert len(grader._profiles.samples("/graders/grade.py")["wall"]) == 3
+
+    def test_timeout_recorded_at_deadline(self, tmp_path):
+        grader = self._grader("apply", tmp_path)
+        self._grade(grader, side_effect=GradingTimeout("too slow"))
+        # The learned deadline the run hit, not how long the watcher waited.
+        assert grader._profiles.samples("/graders/grade.py")["wall"][-1] == 6
+
+    def test_out_of_memory_recorded_at_limit(self, tmp_path):
+        grader = self._grader("report", tmp_path)
+        self._grade(grader, side_effect=GradingOutOfMemory("killed"))
+        samples = grader._profiles.samples("/graders/grade.py")
+        assert samples["rss"][-1] == 512 * 1024**2
+        assert len(samples["wall"]) == 4
+
+
 # ---------------------------------------------------------------------------
 # _run_docker
 # ---------------------------------------------------------------------------
 
 def _make_mock_client(exit_code=0, stdout_data=b'{"correct": true}', stderr_data=b""):
-    """Return a (client, container) pair pre-configured with given outputs."""
+    """Return a (client, container) pair pre-configured with given outputs.
+
+    The container's exit status is what the mocked events stream reports
+    (see ``TestRunDocker._run``).
+    """
     container = mock.MagicMock()
-    container.wait.return_value = {"StatusCode": exit_code}
+    container.id = "c0ffee"
+    container.exit_info = {"StatusCode": exit_code, "OOMKilled": False}
+    container.attrs = {}
 
     def logs_side_effect(stdout=True, stderr=False):
         if stderr and not stdout:
@@ -263,7 +444,7 @@ def _make_mock_client(exit_code=0, stdout_data=b'{"correct": true}', stderr_data
 
     container.logs.side_effect = logs_side_effect
     client = mock.MagicMock()
-    client.containers.run.return_value = container
+    client.containers.create.return_value = container
     return client, container
 
 
@@ -272,7 +453,19 @@ class TestRunDocker:
         self.grader = make_grader(backend="docker", timeout=10)
 
     def _run(self, client, code="print('hi')", seed=42, grader_config=None):
-        with mock.patch("docker.from_env", return_value=client):
+        container = client.containers.create.return_value
+        self.events = mock.MagicMock()
+
+        def wait(container_id, timeout):
+            if isinstance(container.exit_info, Exception):
+                raise container.exit_info
+            return container.exit_info
+
+        self.events.wait.side_effect = wait
+        with mock.patch.object(self.grader, "_get_docker_client", return_value=client), \
+             mock.patch(
+                 "xqueue_watcher.containergrader.get_container_events", return_value=self.events
+             ):
             return self.grader._run_docker(
                 "/graders/ps07/grade.py", code, seed, grader_config or {}
             )
@@ -305,15 +498,83 @@ class TestRunDocker:
 
     def test_timeout_raises_runtime_error(self):
         client, container = _make_mock_client()
-        container.wait.side_effect = Exception("ReadTimeout")
+        container.exit_info = TimeoutError("did not exit")
         with pytest.raises(RuntimeError, match="timed out"):
             self._run(client)
+        container.remove.assert_called_once_with(force=True)
+
+    def test_missing_image_pulled_and_create_retried(self):
+        client, container = _make_mock_client()
+        client.containers.create.side_effect = [docker.errors.ImageNotFound("no such image"), container]
+        assert self._run(client) == b'{"correct": true}'
+        client.images.pull.assert_called_once_with("course-grader:v1")
+        assert client.containers.create.call_count == 2
+
+    def test_container_labelled_and_registered_before_start(self):
+        client, container = _make_mock_client()
+        started_after_expect = []
+        container.start.side_effect = lambda: started_after_expect.append(
+            self.events.expect.called
+        )
+        self._run(client)
+        labels = client.containers.create.call_args.kwargs["labels"]
+        assert labels == {"xqueue-watcher.managed": "true"}
+        self.events.expect.assert_called_once_with("c0ffee")
+        self.events.discard.assert_called_once_with("c0ffee")
+        assert started_after_expect == [True]
+
+    def test_single_logs_call_per_grade(self):
+        client, container = _make_mock_client()
+        self._run(client)
+        container.logs.assert_called_once_with(stdout=True, stderr=False)
+        container.wait.assert_not_called()
+
+    def test_lifecycle_phases_recorded(self):
+        client, container = _make_mock_client()
+        container.attrs = {
+            "Created": "2026-01-01T12:00:00Z",
+            "State": {"StartedAt": "2026-01-01T12:00:01Z", "FinishedAt": "2026-01-01T12:00:03Z"},
+        }
+        with mock.patch("xqueue_watcher.lifecycle._metrics.container_phase_histogram") as hist:
+            self._run(client)
+        phases = {call.args[1]["phase"] for call in hist.record.call_args_list}
+        assert phases == {"api_create", "start", "run", "collect", "cleanup"}
+        assert hist.record.call_args.args[1]["backend"] == "docker"
+
+    def test_oom_kill_reported(self):
+        client, container = _make_mock_client(exit_code=137)
+        container.exit_info["OOMKilled"] = True
+        with pytest.raises(RuntimeError, match="out of memory"):
+            self._run(client)
 
     def test_missing_docker_sdk_raises(self):
         with mock.patch.dict("sys.modules", {"docker": None}):
             with pytest.raises(RuntimeError, match="'docker' package"):
                 self.grader._run_docker("/graders/grade.py", "code", 1, {})
 
+    def test_stdin_transport_streams_code(self):
+        self.grader = make_grader(backend="docker", timeout=10, submission_transport="stdin")
+        client, container = _make_mock_client()
+        sock = client.api.attach_socket.return_value
+        order = []
+        client.api.attach_socket.side_effect = lambda *a, **kw: order.append("attach") or sock
+        container.start.side_effect = lambda: order.append("start")
+        self._run(client, code="x = 1")
+        kwargs = client.containers.create.call_args.kwargs
+        assert "SUBMISSION_CODE" not in kwargs["environment"]
+        assert kwargs["stdin_open"] is True
+        assert order == ["attach", "start"]
+        sock._sock.sendall.assert_called_once_with(b"x = 1")
+        sock._sock.close.assert_called_once()
+
+    def test_env_transport_by_default(self):
+        client, _ = _make_mock_client()
+        self._run(client, code="x = 1")
+        kwargs = client.containers.create.call_args.kwargs
+        assert kwargs["environment"]["SUBMISSION_CODE"] == "x = 1"
+        assert kwargs["stdin_open"] is False
+        client.api.attach_socket.assert_not_called()
+
     def test_string_result_converted_to_bytes(self):
         client, container = _make_mock_client()
         container.logs.side_effect = None
@@ -325,7 +586,7 @@ class TestRunDocker:
         """Container command should be [grader_path, seed] — not 3 args."""
         client, _ = _make_mock_client()
         self._run(client, seed=99)
-        call_kwargs = client.containers.run.call_args
+        call_kwargs = client.containers.create.call_args
         command = call_kwargs.kwargs.get("command") or call_kwargs[1].get("command")
         assert len(command) == 2
         assert command[1] == "99"
@@ -333,7 +594,7 @@ class TestRunDocker:
     def test_grader_language_passed_as_env(self):
         client, _ = _make_mock_client()
         self._run(client, grader_config={"lang": "es"})
-        call_kwargs = client.containers.run.call_args
+        call_kwargs = client.containers.create.call_args
         env = call_kwargs.kwargs.get("environment") or call_kwargs[1].get("environment")
         assert env.get("GRADER_LANGUAGE") == "es"
 
@@ -367,6 +628,21 @@ class TestGrade:
         assert result["correct"] is True
         assert result["score"] == 1.0
 
+    def test_diagnostics_stripped_and_exported(self):
+        output = json.dumps({
+            "correct": True, "score": 1, "errors": [], "tests": [],
+            "diagnostics": {"student": {"wall_seconds": 0.5, "cpu_seconds": 0.25,
+                                        "peak_rss_bytes": 1024}},
+        }).encode()
+        with mock.patch.object(self.grader, "_run", return_value=output), \
+             mock.patch("xqueue_watcher.containergrader._metrics") as metrics:
+            result = self._grade()
+        assert "diagnostics" not in result
+        metrics.grader_cpu_time_histogram.record.assert_called_once_with(
+            0.25, {"grader": "/graders/ps07/grade.py", "run": "student", "backend": "docker"}
+        )
+        metrics.grader_peak_rss_histogram.record.assert_called_once()
+
     def test_container_failure_returns_error_dict(self):
         with mock.patch.object(self.grader, "_run", side_effect=RuntimeError("container died")):
             result = self._grade()
@@ -384,3 +660,278 @@ class TestGrade:
             with caplog.at_level(logging.WARNING):
                 self._grade(submission=large_code)
         assert any("large" in r.message.lower() for r in caplog.records)
+
+
+# ---------------------------------------------------------------------------
+# JobReaper
+# ---------------------------------------------------------------------------
+
+class TestJobReaper:
+    def _reaper(self, **kwargs):
+        from xqueue_watcher.containergrader import JobReaper
+
+        batch_v1 = mock.MagicMock()
+        with mock.patch("threading.Thread"):
+            reaper = JobReaper(batch_v1, "test-ns", max_calls_per_second=0, **kwargs)
+        return reaper, batch_v1
+
+    def test_submit_does_not_call_api(self):
+        reaper, batch_v1 = self._reaper()
+        reaper.submit("xqueue-grader-a")
+        assert reaper.pending == 1
+        batch_v1.delete_collection_namespaced_job.assert_not_called()
+
+    def test_reap_once_deletes_batch_by_label_selector(self):
+        reaper, batch_v1 = self._reaper()
+        reaper.submit("xqueue-grader-a")
+        reaper.submit("xqueue-grader-b")
+        assert reaper.reap_once() is True
+        call = batch_v1.delete_collection_namespaced_job.call_args
+        assert call.kwargs["namespace"] == "test-ns"
+        assert call.kwargs["label_selector"] == (
+            "xqueue-watcher/job-name in (xqueue-grader-a,xqueue-grader-b)"
+        )
+        assert call.kwargs["body"].propagation_policy == "Background"
+        assert reaper.pending == 0
+
+    def test_reap_once_respects_batch_size(self):
+        reaper, batch_v1 = self._reaper(batch_size=2)
+        for name in ("a", "b", "c"):
+            reaper.submit(name)
+        reaper.reap_once()
+        assert reaper.pending == 1
+
+    def test_reap_once_with_nothing_pending(self):
+        reaper, batch_v1 = self._reaper()
+        assert reaper.reap_once() is False
+        batch_v1.delete_collection_namespaced_job.assert_not_called()
+
+    def test_api_failure_is_swallowed(self):
+        reaper, batch_v1 = self._reaper()
+        batch_v1.delete_collection_namespaced_job.side_effect = RuntimeError("boom")
+        reaper.submit("a")
+        assert reaper.reap_once() is True
+
+    def test_job_carries_name_label(self):
+        grader = make_grader(backend="kubernetes")
+        job = grader._build_k8s_job("xqueue-grader-abc", "/graders/grade.py", "code", 1)
+        assert job.metadata.labels["xqueue-watcher/job-name"] == "xqueue-grader-abc"
+
+    def test_run_kubernetes_hands_job_to_reaper(self):
+        grader = make_grader(backend="kubernetes")
+        batch_v1, core_v1 = mock.MagicMock(), mock.MagicMock()
+        reaper = mock.MagicMock()
+        with mock.patch.object(grader, "_get_k8s_clients", return_value=(batch_v1, core_v1)), \
+             mock.patch.object(grader, "_wait_and_collect_k8s", return_value=b"{}"), \
+             mock.patch("xqueue_watcher.containergrader._get_job_reaper", return_value=reaper):
+            assert grader._run_kubernetes("/graders/grade.py", "code", 1, {}) == b"{}"
+        batch_v1.delete_namespaced_job.assert_not_called()
+        reaper.submit.assert_called_once()
+
+
+class TestHedgedLaunch:
+    def setup_method(self):
+        from xqueue_watcher import hedging
+        hedging._policies.clear()
+        self.grader = make_grader(
+            backend="kubernetes", namespace="ns", timeout=30,
+            hedge_percentile=95, hedge_min_delay=0, hedge_min_samples=1,
+        )
+        # One known start-up time makes the hedge delay 0s.
+        self.grader._hedge_policy().record_startup(0.0)
+
+    def teardown_method(self):
+        from xqueue_watcher import hedging
+        hedging._policies.clear()
+
+    @staticmethod
+    def _status(ready=0, succeeded=0, failed=0):
+        return mock.MagicMock(status=mock.MagicMock(ready=ready, succeeded=succeeded, failed=failed))
+
+    def _run(self, statuses):
+        batch_v1, core_v1 = mock.MagicMock(), mock.MagicMock()
+        batch_v1.read_namespaced_job.side_effect = lambda name, namespace: statuses[name].pop(0)
+        pod = mock.MagicMock()
+        pod.metadata.name = "pod"
+        core_v1.list_namespaced_pod.return_value.items = [pod]
+        core_v1.read_namespaced_pod_log.return_value.data = b'{"correct": true}\n'
+        reaper = mock.MagicMock()
+        manifest = self.grader._render_k8s_job(
+            "job", **self.grader._k8s_job_fields("/graders/grade.py", "code", 1)
+        )
+        with mock.patch.object(self.grader, "_get_k8s_clients", return_value=(batch_v1, core_v1)), \
+             mock.patch("xqueue_watcher.containergrader._get_job_reaper", return_value=reaper), \
+             mock.patch("xqueue_watcher.containergrader.record_k8s_phases"), \
+             mock.patch("xqueue_watcher.containergrader.time.sleep"):
+            output = self.grader._run_k8s_job("job", manifest, 30)
+        return output, batch_v1, core_v1, reaper
+
+    def test_stuck_job_hedged_and_hedge_wins(self):
+        output, batch_v1, core_v1, reaper = self._run({
+            "job": [self._status()] * 3,
+            "job-h": [self._status(), self._status(succeeded=1)],
+        })
+        assert output == b'{"correct": true}'
+        hedge = batch_v1.create_namespaced_job.call_args_list[1].kwargs["body"]
+        assert hedge["metadata"]["name"] == "job-h"
+        assert hedge["metadata"]["labels"]["xqueue-watcher/hedge-of"] == "job"
+        anti_affinity = hedge["spec"]["template"]["spec"]["affinity"]["podAntiAffinity"]
+        # Preferred only, so single-node clusters can still schedule the hedge.
+        assert list(anti_affinity) == ["preferredDuringSchedulingIgnoredDuringExecution"]
+        term = anti_affinity["preferredDuringSchedulingIgnoredDuringExecution"][0]
+        assert term["weight"] == 100
+        assert term["podAffinityTerm"]["labelSelector"] == {"matchLabels": {"job-name": "job"}}
+        core_v1.list_namespaced_pod.assert_called_once_with(namespace="ns", label_selector="job-name=job-h")
+        assert [c.args[0] for c in reaper.submit.call_args_list] == ["job", "job-h"]
+
+    def test_failed_job_reports_out_of_memory(self):
+        oom = mock.MagicMock()
+        oom.name = "grader"
+        oom.state.terminated.reason = "OOMKilled"
+        self.grader._hedge_policy().budget._balance = 0
+        batch_v1, core_v1 = mock.MagicMock(), mock.MagicMock()
+        batch_v1.read_namespaced_job.return_value = mock.MagicMock(
+            status=mock.MagicMock(ready=0, succeeded=0, failed=1, conditions=[])
+        )
+        core_v1.list_namespaced_pod.return_value.items = [
+            mock.MagicMock(status=mock.MagicMock(container_statuses=[oom]))
+        ]
+        with pytest.raises(GradingOutOfMemory, match="out of memory"):
+            self.grader._wait_and_collect_k8s(batch_v1, core_v1, "job", timeout=30)
+
+    def test_started_job_not_hedged(self):
+        output, batch_v1, _, reaper = self._run({
+            "job": [self._status(ready=1), self._status(succeeded=1)],
+        })
+        assert output == b'{"correct": true}'
+        batch_v1.create_namespaced_job.assert_called_once()
+        reaper.submit.assert_called_once_with("job")
+
+    def test_no_hedge_when_budget_exhausted(self):
+        self.grader._hedge_policy().budget._balance = 0
+        _, batch_v1, _, _ = self._run({
+            "job": [self._status(), self._status(succeeded=1)],
+        })
+        batch_v1.create_namespaced_job.assert_called_once()
+
+    def test_original_failure_falls_back_to_hedge(self):
+        output, _, _, _ = self._run({
+            "job": [self._status(), self._status(failed=1)],
+            "job-h": [self._status(succeeded=1)],
+        })
+        assert output == b'{"correct": true}'
+
+    def test_requires_sync_kubernetes_backend(self):
+        with pytest.raises(ValueError, match="hedge_percentile"):
+            make_grader(hedge_percentile=95)
+        with pytest.raises(ValueError, match="hedge_percentile"):
+            make_grader(backend="kubernetes", k8s_async=True, hedge_percentile=95)
+
+
+# ---------------------------------------------------------------------------
+# Shared backend clients
+# ---------------------------------------------------------------------------
+
+class TestBackendClients:
+    def setup_method(self):
+        from xqueue_watcher import backend_clients
+        backend_clients._reset()
+
+    teardown_method = setup_method
+
+    def test_docker_client_shared_across_graders(self):
+        fake = mock.MagicMock()
+        with mock.patch("docker.from_env", return_value=fake) as from_env:
+            a = make_grader(backend="docker", api_pool_size=8)._get_docker_client()
+            b = make_grader(backend="docker", api_pool_size=8)._get_docker_client()
+        assert a is b is fake
+        from_env.assert_called_once_with(max_pool_size=8)
+
+    def test_docker_client_keyed_by_host(self):
+        with mock.patch("docker.from_env", return_value=mock.MagicMock()), \
+             mock.patch("docker.DockerClient", return_value=mock.MagicMock()) as ctor:
+            local = make_grader(backend="docker")._get_docker_client()
+            remote = make_grader(backend="docker", docker_host="tcp://10.0.0.1:2375")._get_docker_client()
+        assert local is not remote
+        ctor.assert_called_once_with(base_url="tcp://10.0.0.1:2375", max_pool_size=32)
+
+    def test_k8s_clients_shared_with_sized_pool(self):
+        from kubernetes import config as k8s_config
+
+        with mock.patch.object(k8s_config, "load_incluster_config"):
+            first = make_grader(backend="kubernetes", api_pool_size=40)._get_k8s_clients()
+            second = make_grader(backend="kubernetes")._get_k8s_clients()
+        assert first is second
+        batch_v1, core_v1 = first
+        assert batch_v1.api_client is core_v1.api_client
+        assert batch_v1.api_client.configuration.connection_pool_maxsize == 40
+
+    def test_k8s_clients_keyed_by_context(self):
+        from kubernetes import config as k8s_config
+
+        with mock.patch.object(k8s_config, "load_kube_config"):
+            a = make_grader(backend="kubernetes", kube_context="a")._get_k8s_clients()
+            b = make_grader(backend="kubernetes", kube_context="b")._get_k8s_clients()
+        assert a is not b
+
+
+# ---------------------------------------------------------------------------
+# Shared ImageDigestPoller registry
+# ---------------------------------------------------------------------------
+
+class TestDigestPollerRegistry:
+    def setup_method(self):
+        from xqueue_watcher import containergrader
+        containergrader._digest_pollers.clear()
+
+    teardown_method = setup_method
+
+    def _poller(self, image="registry:5000/course/img:latest", **kwargs):
+        from xqueue_watcher.containergrader import ImageDigestPoller
+
+        with mock.patch("threading.Thread"):
+            return ImageDigestPoller(image, **kwargs)
+
+    def test_one_poller_per_image_across_graders(self):
+        with mock.patch("xqueue_watcher.containergrader.ImageDigestPoller") as poller_cls:
+            poller_cls.return_value.poll_interval = 300
+            for _ in range(5):
+                make_grader(backend="kubernetes", image="img:latest", poll_image_digest=True)
+            make_grader(backend="kubernetes", image="other:latest", poll_image_digest=True)
+        assert poller_cls.call_count == 2
+
+    def test_shortest_interval_wins(self):
+        from xqueue_watcher.containergrader import get_digest_poller
+
+        with mock.patch("threading.Thread"):
+            first = get_digest_poller("img:latest", poll_interval=300)
+            second = get_digest_poller("img:latest", poll_interval=60)
+        assert first is second
+        assert first.poll_interval == 60
+
+    def test_refresh_resolves_and_notifies_listeners_once(self):
+        changes = []
+        poller = self._poller(on_change=changes.append)
+        client = mock.MagicMock()
+        client.api.inspect_distribution.return_value = {"Descriptor": {"digest": "sha256:abc"}}
+        with mock.patch("xqueue_watcher.containergrader.get_docker_client", return_value=client):
+            poller._refresh()
+            poller._refresh()
+        assert poller.resolved_image == "registry:5000/course/img@sha256:abc"
+        assert changes == ["registry:5000/course/img@sha256:abc"]
+
+    def test_late_listener_called_with_known_digest(self):
+        poller = self._poller()
+        client = mock.MagicMock()
+        client.api.inspect_distribution.return_value = {"Descriptor": {"digest": "sha256:abc"}}
+        with mock.patch("xqueue_watcher.containergrader.get_docker_client", return_value=client):
+            poller._refresh()
+        late = []
+        poller.add_listener(late.append)
+        assert late == ["registry:5000/course/img@sha256:abc"]
+
+    def test_failed_refresh_keeps_tag(self):
+        poller = self._poller()
+        with mock.patch("xqueue_watcher.containergrader.get_docker_client", side_effect=RuntimeError):
+            poller._refresh()
+        assert poller.resolved_image == "registry:5000/course/img:latest"
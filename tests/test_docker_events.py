@@ -0,0 +1,152 @@
+"""Tests for xqueue_watcher.docker_events."""
+
+import threading
+from unittest import mock
+
+import pytest
+
+from xqueue_watcher import docker_events
+from xqueue_watcher.docker_events import ContainerEvents
+
+
+class _FakeStream:
+    """An events stream fed by the test; iteration blocks until closed."""
+
+    def __init__(self):
+        self._events = []
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def push(self, event):
+        with self._cond:
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                while not self._events and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                event = self._events.pop(0)
+            yield event
+
+
+def _die(container_id, exit_code, time_nano=1_700_000_000_000_000_000):
+    return {
+        "Type": "container",
+        "Action": "die",
+        "Actor": {"ID": container_id, "Attributes": {"exitCode": str(exit_code)}},
+        "timeNano": time_nano,
+    }
+
+
+class TestContainerEvents:
+    def setup_method(self):
+        self.stream = _FakeStream()
+        self.client = mock.MagicMock()
+        self.client.info.return_value = {"SystemTime": "2023-11-14T22:13:20.5+00:00"}
+        self.client.api.events.return_value = self.stream
+        self.events = ContainerEvents("test", self.client)
+
+    def teardown_method(self):
+        self.events.close()
+
+    def test_stream_filtered_to_managed_containers(self):
+        self.events.expect("abc")
+        self.stream.push(_die("abc", 0))
+        self.events.wait("abc", timeout=5)
+        filters = self.client.api.events.call_args.kwargs["filters"]
+        assert filters["label"] == ["xqueue-watcher.managed=true"]
+        assert set(filters["event"]) == {"die", "oom"}
+
+    def test_die_event_dispatched_to_waiter(self):
+        self.events.expect("abc")
+        self.events.expect("def")
+        self.stream.push(_die("def", 3))
+        self.stream.push(_die("abc", 0))
+        assert self.events.wait("abc", timeout=5) == {"StatusCode": 0, "OOMKilled": False}
+        assert self.events.wait("def", timeout=5)["StatusCode"] == 3
+
+    def test_oom_event_marks_exit(self):
+        self.events.expect("abc")
+        self.stream.push({"Action": "oom", "Actor": {"ID": "abc"}})
+        self.stream.push(_die("abc", 137))
+        assert self.events.wait("abc", timeout=5) == {"StatusCode": 137, "OOMKilled": True}
+
+    def test_unexpected_containers_ignored(self):
+        self.stream.push(_die("other", 0))
+        self.events.expect("abc")
+        with pytest.raises(TimeoutError):
+            self.events.wait("abc", timeout=0.1)
+
+    def test_wait_requires_expect(self):
+        with pytest.raises(KeyError):
+            self.events.wait("abc", timeout=0.1)
+
+    def test_first_stream_starts_at_daemon_time(self):
+        self.events.expect("abc")
+        self.stream.push(_die("abc", 0))
+        self.events.wait("abc", timeout=5)
+        assert self.client.api.events.call_args_list[0].kwargs["since"] == pytest.approx(1_700_000_000.5)
+
+    @pytest.mark.parametrize("system_time, expected", [
+        ("2023-11-14T22:13:20.123456789Z", 1_700_000_000.123456789),
+        ("2023-11-14T23:13:20+01:00", 1_700_000_000.0),
+        ("not a time", None),
+    ])
+    def test_daemon_time(self, system_time, expected):
+        client = mock.MagicMock()
+        client.info.return_value = {"SystemTime": system_time}
+        assert docker_events._daemon_time(client) == pytest.approx(expected)
+
+    def test_without_daemon_time_stream_starts_when_opened(self):
+        client = mock.MagicMock()
+        client.info.side_effect = ConnectionError("daemon down")
+        client.api.events.return_value = _FakeStream()
+        events = ContainerEvents("no-info", client)
+        try:
+            for _ in range(100):
+                if client.api.events.called:
+                    break
+                threading.Event().wait(0.01)
+            assert client.api.events.call_args.kwargs["since"] is None
+        finally:
+            events.close()
+            client.api.events.return_value.close()
+
+    def test_reconnects_from_last_event_time(self):
+        self.events.expect("abc")
+        self.stream.push(_die("abc", 0, time_nano=1_700_000_005_000_000_000))
+        self.events.wait("abc", timeout=5)
+
+        second = _FakeStream()
+        self.client.api.events.return_value = second
+        self.events.expect("def")
+        self.stream.close()
+        second.push(_die("def", 0))
+        self.events.wait("def", timeout=5)
+        assert self.client.api.events.call_args.kwargs["since"] == pytest.approx(1_700_000_005.0)
+
+
+class TestRegistry:
+    def setup_method(self):
+        docker_events._watchers.clear()
+
+    def teardown_method(self):
+        for watcher in docker_events._watchers.values():
+            watcher.close()
+        docker_events._watchers.clear()
+
+    def test_one_stream_per_daemon(self):
+        client = mock.MagicMock()
+        client.api.events.return_value = _FakeStream()
+        first = docker_events.get_container_events(None, client)
+        assert docker_events.get_container_events(None, client) is first
+        assert docker_events.get_container_events("tcp://other:2375", client) is not first
@@ -0,0 +1,443 @@
+"""
+Tests for the in-container grading entrypoint (grader_support.entrypoint).
+
+The entrypoint is run as a subprocess, exactly as the grader image runs it,
+against the fixture grader in tests/fixtures.
+"""
+
+import base64
+import gzip
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+FIXTURES = Path(__file__).parent / "fixtures"
+ROOT = Path(__file__).parent.parent
+GRADER = str(FIXTURES / "fake_grader.py")
+
+CORRECT = 'def foo():\n    return "hi"\n'
+INCORRECT = 'def foo():\n    return "bye"\n'
+
+
+def run_entrypoint(args, tmp_path, stdin=None, **env):
+    full_env = dict(os.environ, GRADER_WORK_DIR=str(tmp_path), **env)
+    proc = subprocess.run(
+        [sys.executable, "-m", "grader_support.entrypoint", *args],
+        cwd=ROOT,
+        env=full_env,
+        input=stdin,
+        capture_output=True,
+        timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr.decode()
+    return json.loads(proc.stdout.decode().strip().splitlines()[-1])
+
+
+class TestEntrypoint:
+    def test_correct_submission(self, tmp_path):
+        result = run_entrypoint([GRADER, "1"], tmp_path, SUBMISSION_CODE=CORRECT)
+        assert result["correct"] is True
+        assert result["score"] == 1.0
+
+    def test_incorrect_submission(self, tmp_path):
+        result = run_entrypoint([GRADER, "1"], tmp_path, SUBMISSION_CODE=INCORRECT)
+        assert result["correct"] is False
+        assert result["score"] == 0
+
+    def test_compressed_submission(self, tmp_path):
+        encoded = base64.b64encode(gzip.compress(CORRECT.encode())).decode()
+        result = run_entrypoint([GRADER, "1"], tmp_path, SUBMISSION_CODE_GZ=encoded)
+        assert result["correct"] is True
+
+    def test_submission_on_stdin(self, tmp_path):
+        result = run_entrypoint([GRADER, "1"], tmp_path, stdin=CORRECT.encode())
+        assert result["correct"] is True
+
+    def test_submission_loaded_from_memory(self, tmp_path):
+        code = CORRECT + "\nraise ValueError('at import')\n"
+        result = run_entrypoint([GRADER, "1"], tmp_path, SUBMISSION_CODE=code)
+        assert result["correct"] is False
+        assert "ValueError: at import" in result["errors"][0]
+        assert "raise ValueError('at import')" in result["errors"][0]
+        # Nothing is written to the work directory.
+        assert list(tmp_path.iterdir()) == []
+
+    def test_source_files_written_on_request(self, tmp_path):
+        grader_dir = tmp_path / "grader"
+        grader_dir.mkdir()
+        (grader_dir / "grade_source.py").write_text(SOURCE_GRADER)
+        (grader_dir / "answer.py").write_text("x = 1\n")
+        work_dir = tmp_path / "work"
+        work_dir.mkdir()
+        grader = str(grader_dir / "grade_source.py")
+        result = run_entrypoint([grader, "1"], work_dir, SUBMISSION_CODE="x = 1\n")
+        assert result["tests"][0][3] == "False\n"
+        result = run_entrypoint(
+            [grader, "1"], work_dir, SUBMISSION_CODE="x = 1\n", GRADER_SOURCE_FILES="1"
+        )
+        assert result["tests"][0][3] == "True\n"
+        assert (work_dir / "submission.py").read_text().endswith("x = 1\n")
+
+    def test_diagnostics_for_staff_and_student_runs(self, tmp_path):
+        result = run_entrypoint([GRADER, "1"], tmp_path, SUBMISSION_CODE=CORRECT)
+        diagnostics = result["diagnostics"]
+        assert set(diagnostics) == {"staff", "student"}
+        for usage in diagnostics.values():
+            assert usage["wall_seconds"] >= 0
+            assert usage["cpu_seconds"] >= 0
+            assert usage["peak_rss_bytes"] > 0
+
+    def test_batch_mode(self, tmp_path):
+        batch = [
+            {"id": 0, "grader": GRADER, "seed": "1", "code": CORRECT},
+            {"id": 1, "grader": GRADER, "seed": "2", "code": INCORRECT},
+        ]
+        result = run_entrypoint(
+            ["--batch"], tmp_path,
+            SUBMISSION_BATCH=json.dumps(batch), BATCH_PARALLELISM="2",
+        )
+        by_id = {entry["id"]: entry for entry in result["batch"]}
+        assert by_id[0]["result"]["correct"] is True
+        assert by_id[1]["result"]["correct"] is False
+        # Each child's work directory is removed afterwards.
+        assert not [p for p in tmp_path.iterdir() if p.name.startswith("grade-")]
+
+    def test_batch_items_isolated(self, tmp_path):
+        strays = tmp_path.parent / f"{tmp_path.name}-strays"
+        batch = [
+            {"id": 0, "grader": GRADER, "seed": "1", "code": SNOOPING},
+            {"id": 1, "grader": GRADER, "seed": "2", "code": "SECRET = 1\n" + CORRECT},
+        ]
+        result = run_entrypoint(
+            ["--batch"], tmp_path,
+            SUBMISSION_BATCH=json.dumps(batch), BATCH_ITEM_TIMEOUT="30", STRAY_LOG=str(strays),
+        )
+        by_id = {entry["id"]: entry for entry in result["batch"]}
+        # The other submission's code was out of reach.
+        assert by_id[0]["result"]["correct"] is True
+        assert by_id[1]["result"]["correct"] is True
+        # Processes that escaped the child's group were killed, and files
+        # left in the shared work directory removed.
+        pids = [int(pid) for pid in strays.read_text().split()]
+        assert pids
+        for pid in pids:
+            assert not os.path.exists(f"/proc/{pid}")
+        assert list(tmp_path.iterdir()) == []
+
+    def test_batch_item_timeout(self, tmp_path):
+        batch = [
+            {"id": 0, "grader": GRADER, "seed": "1", "code": "import time\ntime.sleep(60)\n"},
+            {"id": 1, "grader": GRADER, "seed": "2", "code": CORRECT},
+        ]
+        result = run_entrypoint(
+            ["--batch"], tmp_path,
+            SUBMISSION_BATCH=json.dumps(batch), BATCH_PARALLELISM="2", BATCH_ITEM_TIMEOUT="2",
+        )
+        by_id = {entry["id"]: entry for entry in result["batch"]}
+        assert by_id[0]["error"] == "timed out after 2.0s"
+        assert by_id[1]["result"]["correct"] is True
+        assert list(tmp_path.iterdir()) == []
+
+    def test_batch_child_group_killed_once_before_reaping(self, tmp_path, monkeypatch):
+        from grader_support import entrypoint
+
+        monkeypatch.setattr(entrypoint, "_WORK_DIR", str(tmp_path))
+        monkeypatch.setattr(entrypoint, "_child_pids", lambda: [])
+        children = entrypoint._BatchChildren()
+        work_dir = children.make_work_dir()
+        proc = children.start(["sleep", "60"], dict(os.environ))
+        killed = []
+
+        def killpg(pgid, signum):
+            # The group leader is not reaped yet, so its pid is still the group's.
+            assert proc.returncode is None
+            killed.append(pgid)
+            os.kill(pgid, signum)
+
+        monkeypatch.setattr(os, "killpg", killpg)
+        children.finish(proc, work_dir)
+        children.finish(proc, work_dir)
+        assert killed == [proc.pid]
+        assert proc.returncode == -9
+        assert not os.path.exists(work_dir)
+
+
+# Reads the batch parent's environment, starts a process that escapes its
+# process group and leaves a file in the shared work directory.
+SNOOPING = CORRECT + '''
+import os, subprocess
+
+try:
+    with open(f"/proc/{os.getppid()}/environ", "rb") as f:
+        leaked = f.read()
+except OSError:
+    leaked = b""
+if b"SECRET" in leaked:
+    def foo():
+        return "leaked"
+
+stray = subprocess.Popen(
+    ["sleep", "60"], start_new_session=True,
+    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+)
+with open(os.environ["STRAY_LOG"], "a") as f:
+    f.write(f"{stray.pid}\\n")
+with open(os.path.join(os.path.dirname(os.environ["GRADER_WORK_DIR"]), "left-over"), "w") as f:
+    f.write("x")
+'''
+
+
+# Reads the submission back from disk and from memory.
+SOURCE_GRADER = '''
+import inspect
+import os
+
+from grader_support import gradelib
+
+
+def source(submission):
+    assert "x = 1" in inspect.getsource(submission)
+    print(os.path.exists(submission.__file__))
+
+
+grader = gradelib.Grader()
+grader.add_test(gradelib.Test(source, "source"))
+'''
+
+
+COUNTING_GRADER = '''
+import os
+
+from grader_support import gradelib
+from grader_support.gradelib import *
+
+with open(os.path.join(os.environ["GRADER_WORK_DIR"], "imports.log"), "a") as log:
+    log.write("import\\n")
+
+# Module-level state a run could leak into the next one.
+calls = []
+drawn_at_import = rand.random()
+
+
+def record(submission):
+    calls.append(1)
+    print(len(calls), drawn_at_import, rand.random(), gradelib.rand.random())
+
+
+grader = gradelib.Grader()
+grader.add_test(gradelib.Test(record, "record"))
+'''
+
+
+FIXTURE_GRADER = '''
+import os
+
+from grader_support import gradelib
+
+
+def load_table():
+    with open(os.path.join(os.environ["GRADER_WORK_DIR"], "fixtures.log"), "a") as log:
+        log.write("table\\n")
+    return {"answer": 42}
+
+
+def new_list():
+    with open(os.path.join(os.environ["GRADER_WORK_DIR"], "fixtures.log"), "a") as log:
+        log.write("list\\n")
+    return []
+
+
+grader = gradelib.Grader()
+grader.add_fixture("table", load_table, scope="grader")
+grader.add_fixture("seen", new_list)
+
+
+def check(submission):
+    grader.fixture("seen").append(1)
+    print(submission.x + grader.fixture("table")["answer"], len(grader.fixture("seen")))
+
+
+grader.add_test(gradelib.Test(check, "first"))
+grader.add_test(gradelib.Test(check, "second"))
+'''
+
+
+class TestFixtures:
+    def test_grader_fixture_made_once_per_grade(self, tmp_path):
+        grader_dir = tmp_path / "grader"
+        grader_dir.mkdir()
+        (grader_dir / "grade_fixtures.py").write_text(FIXTURE_GRADER)
+        (grader_dir / "answer.py").write_text("x = 1\n")
+        for isolation in ("import", "fork", "fork-parallel"):
+            work_dir = tmp_path / isolation
+            work_dir.mkdir()
+            result = run_entrypoint(
+                [str(grader_dir / "grade_fixtures.py"), "1"], work_dir,
+                SUBMISSION_CODE="x = 1\n", GRADER_ISOLATION=isolation,
+            )
+            assert result["correct"] is True
+            assert [test[4] for test in result["tests"]] == ["43 1\n", "43 2\n"]
+            made = (work_dir / "fixtures.log").read_text().split()
+            # One table per grade, one list per run.
+            assert sorted(made) == ["list", "list", "table"]
+
+
+class TestIsolationModes:
+    def _grade(self, tmp_path, isolation):
+        grader_dir = tmp_path / "grader"
+        grader_dir.mkdir(exist_ok=True)
+        (grader_dir / "grade_counting.py").write_text(COUNTING_GRADER)
+        (grader_dir / "answer.py").write_text("x = 1\n")
+        work_dir = tmp_path / isolation
+        work_dir.mkdir()
+        result = run_entrypoint(
+            [str(grader_dir / "grade_counting.py"), "7"], work_dir,
+            SUBMISSION_CODE="x = 1\n", GRADER_ISOLATION=isolation,
+        )
+        imports = (work_dir / "imports.log").read_text().count("import")
+        return result, imports
+
+    def test_import_mode_executes_grader_three_times(self, tmp_path):
+        result, imports = self._grade(tmp_path, "import")
+        assert result["correct"] is True
+        assert imports == 3
+
+    def test_fork_modes_execute_grader_once(self, tmp_path):
+        for isolation in ("fork", "fork-parallel"):
+            result, imports = self._grade(tmp_path, isolation)
+            assert result["correct"] is True
+            assert imports == 1
+            assert set(result["diagnostics"]) == {"staff", "student"}
+
+    def test_fork_mode_matches_import_mode_output(self, tmp_path):
+        # Same module state and random sequences in every run, whichever mode.
+        expected, _ = self._grade(tmp_path, "import")
+        for isolation in ("fork", "fork-parallel"):
+            result, _ = self._grade(tmp_path, isolation)
+            assert result["tests"] == expected["tests"]
+            assert result["tests"][0][3].startswith("1 ")
+
+
+# Validation and preprocessing leave traces in the grader's module state.
+STATEFUL_GRADER = '''
+from grader_support import gradelib
+
+seen = []
+
+
+def remember(code):
+    seen.append(code)
+    return code
+
+
+def check(submission):
+    print(len(seen))
+
+
+grader = gradelib.Grader()
+grader.add_preprocessor(remember)
+grader.add_input_check(lambda code: seen.append(code))
+grader.add_test(gradelib.Test(check, "seen"))
+'''
+
+
+class TestForkedRunState:
+    def _grader_dir(self, tmp_path, source):
+        grader_dir = tmp_path / "grader"
+        grader_dir.mkdir(exist_ok=True)
+        (grader_dir / "grade_state.py").write_text(source)
+        (grader_dir / "answer.py").write_text("x = 1\n")
+        return grader_dir
+
+    def test_preprocessing_does_not_leak_into_runs(self, tmp_path):
+        grader_dir = self._grader_dir(tmp_path, STATEFUL_GRADER)
+        for isolation in ("import", "fork", "fork-parallel"):
+            work_dir = tmp_path / isolation
+            work_dir.mkdir()
+            result = run_entrypoint(
+                [str(grader_dir / "grade_state.py"), "1"], work_dir,
+                SUBMISSION_CODE="x = 1\n", GRADER_ISOLATION=isolation,
+            )
+            assert result["tests"][0][3] == "0\n", isolation
+
+    def test_raw_answer_not_imported_with_grader(self, tmp_path):
+        grader_dir = self._grader_dir(tmp_path, "import answer\n" + STATEFUL_GRADER)
+        proc = subprocess.run(
+            [sys.executable, "-m", "grader_support.entrypoint", str(grader_dir / "grade_state.py"), "1"],
+            cwd=ROOT,
+            env=dict(os.environ, GRADER_WORK_DIR=str(tmp_path), SUBMISSION_CODE="x = 1\n",
+                     GRADER_ISOLATION="fork"),
+            capture_output=True,
+            timeout=60,
+        )
+        assert proc.returncode != 0
+        assert b"answer can't be imported yet" in proc.stderr
+
+
+FAIL_FAST_GRADER = '''
+import os
+
+from grader_support import gradelib
+
+grader = gradelib.Grader()
+grader.set_fail_fast({fail_fast})
+
+
+def check(n):
+    def test(submission):
+        with open(os.path.join(os.environ["GRADER_WORK_DIR"], "tests.log"), "a") as log:
+            log.write("%d\\n" % n)
+        print(submission.answers[n])
+    return test
+
+
+for n in range(4):
+    grader.add_test(gradelib.Test(check(n), "test %d" % n))
+'''
+
+
+class TestFailFast:
+    def _grade(self, tmp_path, name, code, fail_fast=True, **env):
+        grader_dir = tmp_path / "grader"
+        grader_dir.mkdir(exist_ok=True)
+        (grader_dir / "grade_fail_fast.py").write_text(FAIL_FAST_GRADER.format(fail_fast=fail_fast))
+        (grader_dir / "answer.py").write_text("answers = [0, 1, 2, 3]\n")
+        work_dir = tmp_path / name
+        work_dir.mkdir()
+        result = run_entrypoint(
+            [str(grader_dir / "grade_fail_fast.py"), "1"], work_dir, SUBMISSION_CODE=code, **env
+        )
+        # Staff tests, then the student tests that ran.
+        ran = (work_dir / "tests.log").read_text().split()
+        return result, len(ran) - 4
+
+    def test_stops_at_first_failure(self, tmp_path):
+        for isolation in ("import", "fork", "fork-parallel"):
+            result, student_tests = self._grade(
+                tmp_path, isolation, "answers = [0, 9, 2, 3]\n", GRADER_ISOLATION=isolation
+            )
+            assert student_tests == 2
+            assert result["correct"] is False
+            assert result["score"] == 0.25
+            assert [test[2] for test in result["tests"]] == [True, False, False, False]
+            assert "Not run" in result["tests"][3][4]
+
+    def test_passing_submission_graded_as_usual(self, tmp_path):
+        result, student_tests = self._grade(tmp_path, "pass", "answers = [0, 1, 2, 3]\n")
+        assert student_tests == 4
+        assert result["correct"] is True
+        assert result["score"] == 1.0
+
+    def test_environment_overrides_grader(self, tmp_path):
+        result, student_tests = self._grade(
+            tmp_path, "off", "answers = [9, 1, 2, 3]\n", GRADER_FAIL_FAST="0"
+        )
+        assert student_tests == 4
+        assert result["score"] == 0.75
+        result, student_tests = self._grade(
+            tmp_path, "on", "answers = [9, 1, 2, 3]\n", fail_fast=False, GRADER_FAIL_FAST="1"
+        )
+        assert student_tests == 1
+        assert result["score"] == 0
@@ -155,6 +155,16 @@ class TestGetContainerGraderDefaults(unittest.TestCase):
             d = get_container_grader_defaults()
         self.assertEqual(d["memory_limit"], "1Gi")
 
+    def test_api_pool_size_default(self):
+        with patch.dict("os.environ", {}, clear=True):
+            d = get_container_grader_defaults()
+        self.assertEqual(d["api_pool_size"], 32)
+
+    def test_api_pool_size_from_env(self):
+        with patch.dict("os.environ", {"XQWATCHER_GRADER_API_POOL_SIZE": "64"}):
+            d = get_container_grader_defaults()
+        self.assertEqual(d["api_pool_size"], 64)
+
     def test_timeout_from_env(self):
         with patch.dict("os.environ", {"XQWATCHER_GRADER_TIMEOUT": "60"}):
             d = get_container_grader_defaults()
@@ -0,0 +1,186 @@
+"""
+Tests for the input checks in grader_support.gradelib.
+"""
+
+import builtins
+import sys
+from unittest import mock
+
+import pytest
+
+from grader_support import gradelib
+
+SUBMISSION = '''
+# while loops are not allowed here
+import math
+
+class Shape:
+    """A shape; uses no for loop."""
+    def area(self):
+        return 0
+
+    async def draw(self):
+        pass
+
+
+class Circle(Shape):
+    def area(self):
+        for _ in range(1):
+            return math.pi
+
+
+def helper(x):
+    return x + x
+'''
+
+
+@pytest.fixture(autouse=True)
+def gettext_builtin(monkeypatch):
+    # grader_support.run installs gettext's _() before graders are loaded.
+    monkeypatch.setattr(builtins, "_", lambda message: message, raising=False)
+
+
+class TestSubmissionAnalysis:
+    def test_token_counts_skip_comments_and_strings(self):
+        analysis = gradelib.SubmissionAnalysis(SUBMISSION)
+        assert analysis.token_count("for") == 1
+        assert analysis.token_count("while") == 0
+        assert analysis.token_count("x") == 3
+
+    def test_non_comment_lines(self):
+        analysis = gradelib.SubmissionAnalysis("# comment\nx = 1\n\n'''doc'''\ny = 2\n")
+        assert analysis.non_comment_lines == {0, 2, 5}
+
+    def test_definitions(self):
+        analysis = gradelib.SubmissionAnalysis(SUBMISSION)
+        assert analysis.parses
+        assert analysis.classes == {"Shape", "Circle"}
+        assert analysis.functions == {"area", "draw", "helper"}
+        assert analysis.methods("Shape") == {"area", "draw"}
+        assert analysis.methods("Missing") == set()
+
+    def test_unparseable_code(self):
+        analysis = gradelib.SubmissionAnalysis("def f(:\n    for x in y\n")
+        assert not analysis.parses
+        assert analysis.functions is None
+        assert analysis.token_count("for") == 1
+
+    def test_code_too_deep_to_parse(self):
+        for code in ("-" * 100_000 + "1\n", "x = 1" + " + 1" * 200_000 + "\n"):
+            assert not gradelib.SubmissionAnalysis(code).parses
+        code = "def helper():\n    return " + "-" * 100_000 + "1\n"
+        assert gradelib.must_define_function("helper")(code) is None
+
+    def test_analyze_reuses_last_analysis(self):
+        code = "x = 1\n"
+        assert gradelib.analyze(code) is gradelib.analyze("x = " + "1\n")
+        assert gradelib.analyze("y = 2\n") is not gradelib.analyze(code)
+
+
+class TestInputChecks:
+    def test_input_errors_tokenizes_once(self):
+        grader = gradelib.Grader()
+        grader.add_input_check(gradelib.prohibited_keyword("while"))
+        grader.add_input_check(gradelib.required_keyword("for"))
+        grader.add_input_check(gradelib.token_occurs("return", at_least=2))
+        grader.add_input_check(gradelib.one_of_required_keywords(["if", "math"]))
+        grader.add_input_check(gradelib.count_non_comment_lines(at_most=100))
+        with mock.patch.object(gradelib, "_tokens", wraps=gradelib._tokens) as tokens:
+            assert grader.input_errors(SUBMISSION + "\n") == []
+        assert tokens.call_count == 1
+
+    def test_keyword_checks(self):
+        assert gradelib.prohibited_keyword("for")(SUBMISSION)
+        assert gradelib.prohibited_keyword("while")(SUBMISSION) is None
+        assert gradelib.required_keyword("while")(SUBMISSION)
+        assert gradelib.token_occurs("return", exactly=3)(SUBMISSION) is None
+        assert gradelib.count_non_comment_lines(exactly=13)(SUBMISSION) is None
+
+    def test_definition_checks(self):
+        assert gradelib.must_define_function("helper")(SUBMISSION) is None
+        assert gradelib.must_define_function("while")(SUBMISSION)
+        assert gradelib.prohibited_function_definition("draw")(SUBMISSION)
+        assert gradelib.must_define_class("Circle")(SUBMISSION) is None
+        assert gradelib.must_define_class("Square")(SUBMISSION)
+        assert gradelib.required_class_method("Shape", "draw")(SUBMISSION) is None
+        assert gradelib.required_class_method("Circle", "draw")(SUBMISSION)
+        assert gradelib.prohibited_class_method("Circle", "area")(SUBMISSION)
+        assert gradelib.prohibited_class_method("Circle", "draw")(SUBMISSION) is None
+
+    def test_definition_checks_fall_back_to_text_for_bad_code(self):
+        code = "def helper(x:\n    return x\n"
+        assert gradelib.must_define_function("helper")(code) is None
+        assert gradelib.must_define_class("Shape")(code)
+
+
+class TestExecWrappedCode:
+    def _submission(self, code):
+        module = type(sys)("submission")
+        exec(gradelib.wrap_in_string(code), module.__dict__)
+        return module
+
+    def test_compiled_once_for_all_tests(self, capsys):
+        submission = self._submission("print(x * 2)\n")
+        with mock.patch.object(gradelib, "compile", create=True, wraps=compile) as compiled:
+            for x in (1, 2, 3):
+                gradelib.exec_wrapped_code({"x": x})(submission)
+        assert compiled.call_count == 1
+        assert capsys.readouterr().out == "2\n\n4\n\n6\n\n"
+
+    def test_errors_still_reported_from_string(self):
+        submission = self._submission("x = 1\ny = x / 0\n")
+        with pytest.raises(ZeroDivisionError) as excinfo:
+            gradelib.exec_wrapped_code()(submission)
+        assert excinfo.traceback[-1].frame.code.raw.co_filename == "<string>"
+        assert excinfo.traceback[-1].lineno == 1
+
+    def test_syntax_errors_raised_each_time(self):
+        submission = self._submission("x = (\n")
+        for _ in range(2):
+            with pytest.raises(SyntaxError):
+                gradelib.exec_code_and_inspect_values(vars_to_inspect=[])(submission)
+
+
+class TestFixtures:
+    @pytest.fixture(autouse=True)
+    def clean_grader_fixtures(self, monkeypatch):
+        monkeypatch.setattr(gradelib, "_grader_fixtures", {})
+
+    def test_run_fixture_made_once_per_grader(self):
+        factory = mock.Mock(side_effect=lambda: [1, 2, 3])
+        grader = gradelib.Grader()
+        grader.add_fixture("data", factory)
+        assert grader.fixture("data") is grader.fixture("data")
+        assert factory.call_count == 1
+        other = gradelib.Grader()
+        other.add_fixture("data", factory)
+        other.fixture("data")
+        assert factory.call_count == 2
+
+    def test_grader_fixture_shared_between_graders(self):
+        factory = mock.Mock(return_value=object())
+        graders = [gradelib.Grader(), gradelib.Grader()]
+        for grader in graders:
+            grader.add_fixture("table", factory, scope="grader")
+        graders[0].prepare_fixtures()
+        assert graders[1].fixture("table") is factory.return_value
+        assert factory.call_count == 1
+
+    def test_grader_fixture_keeps_random_state(self):
+        grader = gradelib.Grader()
+        grader.add_fixture("noise", lambda: gradelib.rand.random(), scope="grader")
+        state = gradelib.rand.getstate()
+        grader.fixture("noise")
+        assert gradelib.rand.getstate() == state
+
+    def test_unknown_scope(self):
+        with pytest.raises(ValueError, match="scope"):
+            gradelib.Grader().add_fixture("x", list, scope="session")
+
+    def test_mapped_file(self, tmp_path):
+        path = tmp_path / "table.bin"
+        path.write_bytes(b"\x00\x01\x02")
+        mapped = gradelib.mapped_file(str(path))
+        assert mapped[:] == b"\x00\x01\x02"
+        with pytest.raises(TypeError):
+            mapped[0] = 5
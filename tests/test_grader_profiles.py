@@ -0,0 +1,104 @@
+"""Tests for xqueue_watcher.grader_profiles."""
+
+import json
+
+from xqueue_watcher.grader_profiles import (
+    ProfileBounds,
+    ProfileStore,
+    main,
+    percentile,
+    recommend,
+)
+
+
+def _samples(wall, cpu=None, rss=None):
+    return {"wall": wall, "cpu": cpu or [], "rss": rss or []}
+
+
+class TestPercentile:
+    def test_empty(self):
+        assert percentile([], 95) is None
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+
+    def test_single_value(self):
+        assert percentile([7], 50) == 7
+
+
+class TestRecommend:
+    def test_too_few_samples(self):
+        assert recommend(_samples([1.0] * 4), ProfileBounds(), min_samples=5) is None
+
+    def test_derives_settings_from_percentiles(self):
+        learned = recommend(
+            _samples([10.0] * 20, cpu=[0.5] * 20, rss=[100 * 1024**2] * 20),
+            ProfileBounds(),
+        )
+        assert learned.timeout == 15
+        assert learned.cpu_request == "500m"
+        assert learned.cpu_limit == "750m"
+        assert learned.memory_request == str(100 * 1024**2)
+        assert learned.memory_limit == str(150 * 1024**2)
+        assert learned.samples == 20
+
+    def test_clamped_to_bounds(self):
+        bounds = ProfileBounds(max_timeout=12, max_cpu_millis=600, max_memory_bytes=120 * 1024**2)
+        learned = recommend(
+            _samples([10.0] * 20, cpu=[0.5] * 20, rss=[100 * 1024**2] * 20), bounds
+        )
+        assert learned.timeout == 12
+        assert learned.cpu_limit == "600m"
+        assert learned.memory_limit == str(120 * 1024**2)
+
+    def test_minimums_apply_without_diagnostics(self):
+        learned = recommend(_samples([0.1] * 20), ProfileBounds())
+        assert learned.timeout == 5
+        assert learned.cpu_request == "10m"
+        assert learned.memory_request == str(32 * 1024**2)
+
+
+class TestProfileStore:
+    def test_record_derives_cpu_and_rss(self):
+        store = ProfileStore()
+        store.record("g.py", 3.0, {
+            "staff": {"wall_seconds": 1.0, "cpu_seconds": 0.5, "peak_rss_bytes": 10},
+            "student": {"wall_seconds": 1.0, "cpu_seconds": 1.0, "peak_rss_bytes": 20},
+        })
+        assert store.samples("g.py") == {"wall": [3.0], "cpu": [0.75], "rss": [20]}
+
+    def test_wall_only_without_diagnostics(self):
+        store = ProfileStore()
+        store.record("g.py", 3.0)
+        assert store.samples("g.py") == {"wall": [3.0], "cpu": [], "rss": []}
+
+    def test_window_is_bounded(self):
+        store = ProfileStore(window=3)
+        for wall in range(5):
+            store.record("g.py", wall)
+        assert store.samples("g.py")["wall"] == [2.0, 3.0, 4.0]
+
+    def test_persists_round_trip(self, tmp_path):
+        path = str(tmp_path / "profiles.json")
+        store = ProfileStore(path)
+        store.record("g.py", 2.0)
+        store.save()
+        assert ProfileStore(path).samples("g.py")["wall"] == [2.0]
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "profiles.json"
+        path.write_text("not json")
+        assert ProfileStore(str(path)).graders() == []
+
+
+class TestMain:
+    def test_prints_profiles(self, tmp_path, capsys):
+        path = tmp_path / "profiles.json"
+        path.write_text(json.dumps({"g.py": {"wall": [1.0, 2.0], "cpu": [0.5], "rss": [2**20]}}))
+        assert main([str(path)]) == 0
+        out = capsys.readouterr().out
+        assert "g.py" in out
+        assert "2.00" in out
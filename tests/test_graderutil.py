@@ -0,0 +1,97 @@
+"""
+Tests for grader_support.graderutil.
+"""
+
+import sys
+
+import pytest
+
+from grader_support import graderutil
+
+
+class TestBoundedOutput:
+    def test_under_limit_is_kept_whole(self):
+        out = graderutil.BoundedOutput(limit=10)
+        print("hello", file=out)
+        assert out.getvalue() == "hello\n"
+        assert not out.exceeded
+
+    def test_head_only(self):
+        out = graderutil.BoundedOutput(limit=5)
+        assert out.write("abc") == 3
+        assert out.write("defgh") == 5
+        out.write("ijk")
+        assert out.discarded == 6
+        assert out.getvalue() == "abcde\n...[6 bytes of output discarded]...\n"
+
+    def test_head_and_tail(self):
+        out = graderutil.BoundedOutput(limit=6, tail=3)
+        for chunk in ["ab", "cd", "ef", "gh", "i", "jk"]:
+            out.write(chunk)
+        assert out.discarded == 5
+        assert out.getvalue() == "abc\n...[5 bytes of output discarded]...\nijk"
+
+    def test_tail_filled_without_discarding(self):
+        out = graderutil.BoundedOutput(limit=6, tail=3)
+        out.write("abcde")
+        assert out.getvalue() == "abcde"
+
+    def test_stop(self):
+        out = graderutil.BoundedOutput(limit=3, stop=True)
+        out.write("abc")
+        with pytest.raises(graderutil.OutputLimitExceeded):
+            out.write("d")
+        assert out.getvalue().startswith("abc\n")
+
+    def test_counts_encoded_bytes(self):
+        out = graderutil.BoundedOutput(limit=5, tail=2)
+        assert out.write("ééééé") == 5
+        # 10 bytes: the first three and the last two kept, the cut character left out.
+        assert out.discarded == 5
+        assert out.getvalue() == "é\n...[5 bytes of output discarded]...\né"
+
+    def test_rejects_bytes(self):
+        with pytest.raises(TypeError):
+            graderutil.BoundedOutput().write(b"x")
+
+
+def test_captured_stdout_is_bounded():
+    with graderutil.captured_stdout(limit=4) as stdout:
+        for _ in range(1000):
+            print("spam")
+    assert stdout.getvalue().startswith("spam\n...[4996 bytes")
+    assert sys.stdout is not stdout
+
+
+class TestSourceModules:
+    def test_import_from_memory(self, tmp_path):
+        (tmp_path / "shadowed.py").write_text("where = 'disk'\n")
+        finder = graderutil.SourceModules(
+            {"shadowed": "where = 'memory'\n", "broken": "x = 1\nraise ValueError('boom')\n"},
+            "/work",
+        )
+        sys.path.insert(0, str(tmp_path))
+        sys.meta_path.insert(0, finder)
+        try:
+            import shadowed
+            assert shadowed.where == "memory"
+            assert shadowed.__file__ == "/work/shadowed.py"
+            try:
+                import broken  # noqa: F401
+            except ValueError:
+                trace = graderutil.format_exception(main_file="broken")
+            assert 'File "/work/broken.py", line 2' in trace
+            assert "raise ValueError('boom')" in trace
+        finally:
+            sys.meta_path.remove(finder)
+            sys.path.remove(str(tmp_path))
+            sys.modules.pop("shadowed", None)
+            sys.modules.pop("broken", None)
+        assert not list(tmp_path.glob("__pycache__"))
+
+    def test_only_serves_its_own_modules(self):
+        finder = graderutil.SourceModules({"answer": ""}, "/work")
+        assert finder.find_spec("other") is None
+        assert finder.find_spec("answer", path=["/somewhere"]) is None
+        with pytest.raises(OSError):
+            finder.get_data("/elsewhere/answer.py")
@@ -0,0 +1,70 @@
+"""
+Unit tests for hedged grading Job launches.
+"""
+
+from xqueue_watcher import hedging
+from xqueue_watcher.hedging import HedgePolicy, RetryBudget, get_hedge_policy
+
+
+class TestRetryBudget:
+    def test_reserve_allows_initial_hedges(self):
+        budget = RetryBudget(ratio=0.1, reserve=2)
+        assert budget.withdraw() is True
+        assert budget.withdraw() is True
+        assert budget.withdraw() is False
+
+    def test_deposits_refill_in_proportion_to_launches(self):
+        budget = RetryBudget(ratio=0.25, reserve=1)
+        assert budget.withdraw() is True
+        for _ in range(3):
+            budget.deposit()
+        assert budget.withdraw() is False
+        budget.deposit()
+        assert budget.withdraw() is True
+
+    def test_balance_capped_at_reserve(self):
+        budget = RetryBudget(ratio=1, reserve=2)
+        for _ in range(10):
+            budget.deposit()
+        assert budget.balance == 2
+
+
+class TestHedgePolicy:
+    def test_no_delay_until_min_samples(self):
+        policy = HedgePolicy("test", min_samples=3, min_delay=0)
+        policy.record_startup(1.0)
+        policy.record_startup(2.0)
+        assert policy.delay() is None
+        policy.record_startup(3.0)
+        assert policy.delay() == 3.0
+
+    def test_delay_is_percentile_of_startups(self):
+        policy = HedgePolicy("test", percentile=90, min_samples=1, min_delay=0)
+        for seconds in range(1, 11):
+            policy.record_startup(float(seconds))
+        assert policy.delay() == 9.0
+
+    def test_delay_never_below_minimum(self):
+        policy = HedgePolicy("test", min_samples=1, min_delay=5)
+        policy.record_startup(0.5)
+        assert policy.delay() == 5
+
+    def test_try_hedge_draws_on_budget(self):
+        policy = HedgePolicy("test", budget=0)
+        policy.budget = RetryBudget(ratio=0, reserve=1)
+        assert policy.try_hedge() is True
+        assert policy.try_hedge() is False
+
+
+class TestRegistry:
+    def setup_method(self):
+        hedging._policies.clear()
+
+    teardown_method = setup_method
+
+    def test_policy_shared_per_key(self):
+        a = get_hedge_policy(("kube", None, "ns", "img"), percentile=90)
+        b = get_hedge_policy(("kube", None, "ns", "img"), percentile=50)
+        assert a is b
+        assert a.percentile == 90
+        assert a.name == "kube/ns/img"
@@ -0,0 +1,101 @@
+"""
+Unit tests for grader image pre-pull / warm-up.
+"""
+
+import threading
+from unittest import mock
+
+from xqueue_watcher.containergrader import ContainerGrader
+from xqueue_watcher.image_warmup import ImageWarmer
+
+
+def _wait_for(event):
+    assert event.wait(5), "warm-up callback was not called"
+
+
+class TestImageWarmer:
+    def test_warm_calls_pull_and_callback(self):
+        pull = mock.Mock()
+        done = threading.Event()
+        outcome = []
+        warmer = ImageWarmer("test", pull, "docker")
+        warmer.warm("img@sha256:1", on_done=lambda ref, ok: (outcome.append((ref, ok)), done.set()))
+        _wait_for(done)
+        pull.assert_called_once_with("img@sha256:1")
+        assert outcome == [("img@sha256:1", True)]
+        assert warmer.is_warm("img@sha256:1")
+
+    def test_already_warm_calls_back_immediately(self):
+        pull = mock.Mock()
+        warmer = ImageWarmer("test", pull, "docker")
+        done = threading.Event()
+        warmer.warm("img", on_done=lambda ref, ok: done.set())
+        _wait_for(done)
+        outcome = []
+        warmer.warm("img", on_done=lambda ref, ok: outcome.append(ok))
+        assert outcome == [True]
+        assert pull.call_count == 1
+
+    def test_concurrent_requests_pull_once(self):
+        release = threading.Event()
+        pull = mock.Mock(side_effect=lambda ref: release.wait(5))
+        warmer = ImageWarmer("test", pull, "docker")
+        done = [threading.Event(), threading.Event()]
+        warmer.warm("img", on_done=lambda ref, ok: done[0].set())
+        warmer.warm("img", on_done=lambda ref, ok: done[1].set())
+        release.set()
+        _wait_for(done[0])
+        _wait_for(done[1])
+        assert pull.call_count == 1
+
+    def test_failed_pull_reports_not_ok(self):
+        warmer = ImageWarmer("test", mock.Mock(side_effect=RuntimeError("no such image")), "docker")
+        done = threading.Event()
+        outcome = []
+        warmer.warm("img", on_done=lambda ref, ok: (outcome.append(ok), done.set()))
+        _wait_for(done)
+        assert outcome == [False]
+        assert not warmer.is_warm("img")
+
+
+class TestContainerGraderPrepull:
+    def test_jobs_switch_to_new_digest_only_when_warm(self):
+        with mock.patch("xqueue_watcher.containergrader.get_digest_poller") as get_poller:
+            grader = ContainerGrader(
+                grader_root="/graders", image="repo/img:latest", backend="kubernetes",
+                poll_image_digest=True, prepull_image=True,
+            )
+        on_change = get_poller.call_args.kwargs["on_change"]
+        warmer = mock.MagicMock()
+        with mock.patch.object(grader, "_image_warmer", return_value=warmer):
+            on_change("repo/img@sha256:new")
+        assert grader._effective_image() == "repo/img:latest"
+        on_done = warmer.warm.call_args.kwargs["on_done"]
+        on_done("repo/img@sha256:new", True)
+        assert grader._effective_image() == "repo/img@sha256:new"
+
+    def test_docker_prepull_uses_images_api(self):
+        grader = ContainerGrader(grader_root="/graders", image="img:v1", backend="docker")
+        client = mock.MagicMock()
+        with mock.patch.object(grader, "_get_docker_client", return_value=client):
+            grader._prepull("img:v2")
+        client.images.pull.assert_called_once_with("img:v2")
+
+    def test_k8s_prepull_daemonset_created_and_deleted(self):
+        grader = ContainerGrader(
+            grader_root="/graders", image="img@sha256:abc", backend="kubernetes",
+            namespace="grading",
+        )
+        apps_v1 = mock.MagicMock()
+        status = apps_v1.read_namespaced_daemon_set_status.return_value.status
+        status.desired_number_scheduled = 3
+        status.number_ready = 3
+        with mock.patch("xqueue_watcher.containergrader.get_k8s_api_client"), \
+             mock.patch("kubernetes.client.AppsV1Api", return_value=apps_v1):
+            grader._prepull("img@sha256:abc")
+        body = apps_v1.create_namespaced_daemon_set.call_args.kwargs["body"]
+        container = body.spec.template.spec.containers[0]
+        assert container.image == "img@sha256:abc"
+        assert container.command[0] == "python"
+        apps_v1.delete_namespaced_daemon_set.assert_called_once()
+        assert apps_v1.delete_namespaced_daemon_set.call_args.kwargs["name"] == body.metadata.name
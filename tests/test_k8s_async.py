@@ -0,0 +1,150 @@
+"""Tests for xqueue_watcher.k8s_async."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+pytest.importorskip("kubernetes_asyncio")
+
+from xqueue_watcher.containergrader import ContainerGrader  # noqa: E402
+from xqueue_watcher.k8s_async import AsyncK8sBackend  # noqa: E402
+from xqueue_watcher.lifecycle import GradingTimeout  # noqa: E402
+
+
+def _job(ready=0, succeeded=0, failed=0, conditions=None):
+    return SimpleNamespace(status=SimpleNamespace(
+        ready=ready, succeeded=succeeded, failed=failed, conditions=conditions
+    ))
+
+
+def _fake_apis(statuses, log=b'noise\n{"correct": true}\n'):
+    batch_v1 = mock.AsyncMock()
+    batch_v1.read_namespaced_job.side_effect = statuses
+    core_v1 = mock.AsyncMock()
+    core_v1.list_namespaced_pod.return_value = SimpleNamespace(
+        items=[SimpleNamespace(
+            metadata=SimpleNamespace(name="pod-1"), status=SimpleNamespace(container_statuses=None)
+        )]
+    )
+    response = mock.AsyncMock()
+    response.read.return_value = log
+    core_v1.read_namespaced_pod_log.return_value = response
+    return batch_v1, core_v1
+
+
+def _backend(apis, loop=None):
+    backend = AsyncK8sBackend(loop=loop, poll_interval=0)
+    backend._apis = apis
+    return backend
+
+
+class TestAsyncK8sBackend:
+    def test_run_job_from_caller_loop(self):
+        apis = _fake_apis([_job(), _job(ready=1), _job(succeeded=1)])
+        on_running = mock.Mock()
+
+        async def main():
+            backend = _backend(apis, loop=asyncio.get_running_loop())
+            result = await backend.run_job("ns", "job-1", {"kind": "Job"}, 10, on_running)
+            await asyncio.gather(*backend._background)
+            return result
+
+        assert asyncio.run(main()) == ("pod-1", 'noise\n{"correct": true}\n')
+        batch_v1, core_v1 = apis
+        batch_v1.create_namespaced_job.assert_awaited_once_with(namespace="ns", body={"kind": "Job"})
+        assert on_running.called
+        batch_v1.delete_namespaced_job.assert_awaited_once_with(
+            name="job-1", namespace="ns", propagation_policy="Background"
+        )
+
+    def test_run_job_hands_job_to_reap(self):
+        apis = _fake_apis([_job(succeeded=1)])
+        reap = mock.Mock()
+        backend = _backend(apis)
+        try:
+            backend.run_job_sync("ns", "job-1", {}, 10, reap=reap)
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+        reap.assert_called_once_with("job-1")
+        apis[0].delete_namespaced_job.assert_not_called()
+
+    def test_run_job_sync_uses_loop_thread(self):
+        apis = _fake_apis([_job(succeeded=1)])
+        backend = _backend(apis)
+        try:
+            assert backend.run_job_sync("ns", "job-1", {}, 10)[0] == "pod-1"
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+
+    def test_failed_job_raises(self):
+        backend = _backend(_fake_apis([_job(failed=1)]))
+        try:
+            with pytest.raises(RuntimeError, match="failed"):
+                backend.run_job_sync("ns", "job-1", {}, 10)
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+
+    def test_deadline_exceeded_is_a_timeout(self):
+        failed = SimpleNamespace(type="Failed", reason="DeadlineExceeded")
+        backend = _backend(_fake_apis([_job(failed=1, conditions=[failed])]))
+        try:
+            with pytest.raises(GradingTimeout, match="deadline exceeded"):
+                backend.run_job_sync("ns", "job-1", {}, 10)
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+
+    def test_timeout_raises(self):
+        backend = _backend(_fake_apis(lambda **kw: _job()))
+        try:
+            with pytest.raises(RuntimeError, match="exceeded timeout"):
+                backend.run_job_sync("ns", "job-1", {}, 0.05)
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+
+    def test_hung_api_call_times_out_and_is_cancelled(self, monkeypatch):
+        monkeypatch.setattr("xqueue_watcher.k8s_async.SYNC_RESULT_MARGIN", 0.1)
+        apis = _fake_apis([_job(succeeded=1)])
+        cancelled = asyncio.Event()
+
+        async def hang(**kwargs):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        apis[0].create_namespaced_job.side_effect = hang
+        reap = mock.Mock()
+        backend = _backend(apis)
+        try:
+            with pytest.raises(GradingTimeout, match="did not finish"):
+                backend.run_job_sync("ns", "job-1", {}, 0.1, reap=reap)
+            asyncio.run_coroutine_threadsafe(cancelled.wait(), backend.loop).result(timeout=5)
+        finally:
+            backend.loop.call_soon_threadsafe(backend.loop.stop)
+        reap.assert_called_once_with("job-1")
+
+
+class TestContainerGraderK8sAsync:
+    def test_requires_kubernetes_backend(self):
+        with pytest.raises(ValueError, match="k8s_async"):
+            ContainerGrader(grader_root="/graders", image="img:v1", backend="docker", k8s_async=True)
+
+    def test_run_k8s_job_goes_through_async_backend(self):
+        grader = ContainerGrader(
+            grader_root="/graders", image="img:v1", backend="kubernetes",
+            namespace="ns", k8s_async=True,
+        )
+        backend = mock.Mock()
+        backend.run_job_sync.return_value = ("pod-1", 'stderr line\n{"score": 1}\n')
+        reaper = mock.Mock()
+        with mock.patch(
+            "xqueue_watcher.containergrader.get_async_backend", return_value=backend
+        ), mock.patch.object(grader, "_get_k8s_clients", return_value=(mock.Mock(), mock.Mock())), \
+                mock.patch("xqueue_watcher.containergrader._get_job_reaper", return_value=reaper):
+            assert grader._run_k8s_job("job-1", {}, 30) == b'{"score": 1}'
+        assert backend.run_job_sync.call_args.args[:4] == ("ns", "job-1", {}, 30)
+        # Deletion goes through the namespace's batching JobReaper.
+        assert backend.run_job_sync.call_args.kwargs["reap"] == reaper.submit
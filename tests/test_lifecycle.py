@@ -0,0 +1,131 @@
+"""Tests for xqueue_watcher.lifecycle."""
+
+import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from xqueue_watcher import lifecycle
+from xqueue_watcher.lifecycle import (
+    GradingOutOfMemory,
+    GradingTimeout,
+    PhaseRecorder,
+    job_failure,
+    record_docker_phases,
+    record_k8s_phases,
+)
+
+T0 = datetime.datetime(2026, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def at(seconds):
+    return T0 + datetime.timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def histogram():
+    with mock.patch.object(lifecycle._metrics, "container_phase_histogram") as hist:
+        yield hist
+
+
+def recorded(histogram):
+    return {
+        call.args[1]["phase"]: (call.args[0], call.args[1])
+        for call in histogram.record.call_args_list
+    }
+
+
+def _pod(conditions, started, finished):
+    terminated = SimpleNamespace(started_at=started, finished_at=finished)
+    return SimpleNamespace(
+        metadata=SimpleNamespace(creation_timestamp=at(1)),
+        status=SimpleNamespace(
+            conditions=[
+                SimpleNamespace(type=type_, last_transition_time=time_)
+                for type_, time_ in conditions.items()
+            ],
+            container_statuses=[
+                SimpleNamespace(name="grader", state=SimpleNamespace(terminated=terminated))
+            ],
+        ),
+    )
+
+
+class TestPhaseRecorder:
+    def test_attributes(self, histogram):
+        PhaseRecorder("kubernetes", "img:v1", "graders").record("run", 1.5)
+        histogram.record.assert_called_once_with(
+            1.5,
+            {"backend": "kubernetes", "image": "img:v1", "namespace": "graders", "phase": "run"},
+        )
+
+    def test_no_namespace_for_docker(self, histogram):
+        PhaseRecorder("docker", "img:v1").record("run", 1.0)
+        assert "namespace" not in histogram.record.call_args.args[1]
+
+    def test_span_skips_unknown_and_negative(self, histogram):
+        recorder = PhaseRecorder("docker", "img:v1")
+        recorder.span("start", None, at(1))
+        recorder.span("start", at(2), at(1))
+        histogram.record.assert_not_called()
+
+
+class TestKubernetesPhases:
+    def test_phases_from_job_and_pod_timestamps(self, histogram):
+        job = SimpleNamespace(metadata=SimpleNamespace(creation_timestamp=at(0)))
+        pod = _pod({"PodScheduled": at(2), "Initialized": at(3)}, started=at(7), finished=at(10))
+        record_k8s_phases(PhaseRecorder("kubernetes", "img:v1", "ns"), job, pod)
+        durations = {phase: value for phase, (value, _) in recorded(histogram).items()}
+        assert durations == {
+            "job_controller": 1, "schedule": 1, "initialize": 1, "start": 4, "run": 3,
+        }
+
+
+class TestDockerPhases:
+    def test_phases_from_inspect(self, histogram):
+        attrs = {
+            "Created": "2026-01-01T12:00:00.000000000Z",
+            "State": {
+                "StartedAt": "2026-01-01T12:00:00.250000000Z",
+                "FinishedAt": "2026-01-01T12:00:02.250000000Z",
+            },
+        }
+        record_docker_phases(PhaseRecorder("docker", "img:v1"), attrs)
+        durations = {phase: value for phase, (value, _) in recorded(histogram).items()}
+        assert durations == {"start": 0.25, "run": 2.0}
+
+    def test_never_started(self, histogram):
+        attrs = {
+            "Created": "2026-01-01T12:00:00Z",
+            "State": {"StartedAt": "0001-01-01T00:00:00Z", "FinishedAt": "0001-01-01T00:00:00Z"},
+        }
+        record_docker_phases(PhaseRecorder("docker", "img:v1"), attrs)
+        histogram.record.assert_not_called()
+
+
+class TestJobFailure:
+    @staticmethod
+    def _job(*reasons):
+        conditions = [SimpleNamespace(type="Failed", reason=reason) for reason in reasons]
+        return SimpleNamespace(status=SimpleNamespace(conditions=conditions))
+
+    @staticmethod
+    def _pod(reason):
+        terminated = SimpleNamespace(reason=reason)
+        status = SimpleNamespace(
+            name="grader", state=SimpleNamespace(terminated=terminated), last_state=None
+        )
+        return SimpleNamespace(status=SimpleNamespace(container_statuses=[status]))
+
+    def test_deadline_exceeded(self):
+        assert isinstance(job_failure("j", self._job("DeadlineExceeded"), []), GradingTimeout)
+
+    def test_oom_killed(self):
+        error = job_failure("j", self._job("BackoffLimitExceeded"), [self._pod("OOMKilled")])
+        assert isinstance(error, GradingOutOfMemory)
+
+    def test_other_failure(self):
+        error = job_failure("j", self._job("BackoffLimitExceeded"), [self._pod("Error")])
+        assert type(error) is RuntimeError
+        assert str(error) == "Grading Job j failed."
@@ -0,0 +1,99 @@
+"""
+Tests for the process backend (xqueue_watcher.process_sandbox).
+
+These run the real entrypoint against the fixture grader in tests/fixtures,
+inside Linux namespaces when the machine supports them.
+"""
+
+import json
+import sys
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from xqueue_watcher import process_sandbox
+from xqueue_watcher.containergrader import ContainerGrader
+
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="process sandbox is Linux-only")
+
+GRADER = str(Path(__file__).parent / "fixtures" / "fake_grader.py")
+CORRECT = 'def foo():\n    return "hi"\n'
+INCORRECT = 'def foo():\n    return "bye"\n'
+
+
+def _grader(**kwargs):
+    return ContainerGrader(grader_root=str(Path(GRADER).parent), backend="process", **kwargs)
+
+
+def _env(code):
+    return {"SUBMISSION_CODE": code, "GRADER_LANGUAGE": "en", "HIDE_OUTPUT": "0"}
+
+
+class TestRunEntrypoint:
+    def test_correct_submission(self):
+        output = process_sandbox.run_entrypoint(GRADER, 1, _env(CORRECT), 30, 512 * 1024**2)
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        assert result["correct"] is True
+
+    def test_incorrect_submission(self):
+        output = process_sandbox.run_entrypoint(GRADER, 1, _env(INCORRECT), 30, 512 * 1024**2)
+        assert json.loads(output.decode().strip().splitlines()[-1])["correct"] is False
+
+    def test_submission_on_stdin(self):
+        env = {"GRADER_LANGUAGE": "en", "HIDE_OUTPUT": "0"}
+        output = process_sandbox.run_entrypoint(
+            GRADER, 1, env, 30, 512 * 1024**2, stdin=CORRECT.encode()
+        )
+        assert json.loads(output.decode().strip().splitlines()[-1])["correct"] is True
+
+    def test_watcher_environment_not_inherited(self, monkeypatch):
+        monkeypatch.setenv("XQUEUE_SECRET", "hunter2")
+        code = 'import os\ndef foo():\n    return os.environ.get("XQUEUE_SECRET", "hi")\n'
+        output = process_sandbox.run_entrypoint(GRADER, 1, _env(code), 30, 512 * 1024**2)
+        assert json.loads(output.decode().strip().splitlines()[-1])["correct"] is True
+
+    def test_resource_limits_applied(self):
+        code = (
+            "import resource\n"
+            "def foo():\n"
+            "    cpu = resource.getrlimit(resource.RLIMIT_CPU)[0]\n"
+            "    core = resource.getrlimit(resource.RLIMIT_CORE)[0]\n"
+            "    return 'hi' if (cpu, core) == (30, 0) else f'{cpu} {core}'\n"
+        )
+        output = process_sandbox.run_entrypoint(GRADER, 1, _env(code), 30, 512 * 1024**2)
+        assert json.loads(output.decode().strip().splitlines()[-1])["correct"] is True
+
+    def test_timeout(self):
+        code = "import time\ntime.sleep(60)\n"
+        with pytest.raises(RuntimeError, match="timed out"):
+            process_sandbox.run_entrypoint(GRADER, 1, _env(code), 2, 512 * 1024**2)
+
+    def test_on_started_called(self):
+        on_started = mock.Mock()
+        process_sandbox.run_entrypoint(GRADER, 1, _env(CORRECT), 30, 512 * 1024**2, on_started)
+        on_started.assert_called_once_with()
+
+    def test_runs_without_namespaces(self):
+        with mock.patch.object(process_sandbox, "namespaces_supported", return_value=False):
+            output = process_sandbox.run_entrypoint(GRADER, 1, _env(CORRECT), 30, 512 * 1024**2)
+        assert json.loads(output.decode().strip().splitlines()[-1])["correct"] is True
+
+
+class TestProcessBackend:
+    def test_image_optional(self):
+        assert _grader().image is None
+
+    def test_image_required_for_container_backends(self):
+        with pytest.raises(ValueError, match="image is required"):
+            ContainerGrader(grader_root="/graders", backend="docker")
+
+    def test_prepull_rejected(self):
+        with pytest.raises(ValueError, match="prepull_image"):
+            _grader(prepull_image=True)
+
+    def test_grade_end_to_end(self):
+        result = _grader(timeout=30, memory_limit="512Mi").grade(
+            grader_path=Path(GRADER), grader_config={}, submission=CORRECT
+        )
+        assert result["correct"] is True
@@ -0,0 +1,330 @@
+"""
+Tests for grader_support.run, the in-process test runner used by the entrypoint.
+"""
+
+import io
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from grader_support import run
+
+GRADER = '''
+import os
+from grader_support import gradelib
+
+grader = gradelib.Grader()
+{setup}
+
+
+def pid(submission):
+    print(submission.value, os.getpid())
+
+
+def fails(submission):
+    raise ValueError("boom")
+
+
+def ends(submission):
+    grader.end_test("stop")
+
+
+for n in range(6):
+    grader.add_test(gradelib.Test(pid, "pid %d" % n))
+grader.add_test(gradelib.Test(fails, "fails"))
+grader.add_test(gradelib.Test(ends, "ends"))
+'''
+
+
+@pytest.fixture
+def modules(tmp_path, monkeypatch):
+    """Write grader/submission modules to an importable directory."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    written = []
+
+    def write(name, source):
+        (tmp_path / f"{name}.py").write_text(textwrap.dedent(source))
+        written.append(name)
+        return name
+
+    yield write
+    for name in written:
+        sys.modules.pop(name, None)
+
+
+def _pids(output):
+    return {line.split()[1] for _, _, line in output["results"][:6]}
+
+
+class TestRun:
+    def test_sequential(self, modules):
+        grader = modules("grader_seq", GRADER.format(setup=""))
+        submission = modules("submission_seq", "value = 42\n")
+        output = run.run(grader, submission, seed=1)
+        assert output["grader"]["status"] == "ok"
+        assert output["submission"]["status"] == "ok"
+        assert [r[0] for r in output["results"]] == [f"pid {n}" for n in range(6)] + ["fails", "ends"]
+        assert len(_pids(output)) == 1
+        assert "ValueError: boom" in output["results"][6][2]
+        assert "*** Error: stop" in output["results"][7][2]
+        assert output["exceptions"] == 1
+
+    def test_parallel_declared_by_grader(self, modules):
+        grader = modules("grader_par", GRADER.format(setup="grader.run_tests_in_parallel(3)"))
+        submission = modules("submission_par", "value = 42\n")
+        output = run.run(grader, submission, seed=1)
+        # Same results, in the same order, from three worker processes.
+        assert [r[0] for r in output["results"]] == [f"pid {n}" for n in range(6)] + ["fails", "ends"]
+        assert all(r[2].startswith("42 ") for r in output["results"][:6])
+        assert len(_pids(output)) == 3
+        assert "ValueError: boom" in output["results"][6][2]
+        assert "*** Error: stop" in output["results"][7][2]
+        assert output["exceptions"] == 1
+        assert output["submission"]["status"] == "ok"
+
+    def test_workers_argument_overrides_grader(self, modules):
+        grader = modules("grader_override", GRADER.format(setup="grader.run_tests_in_parallel(3)"))
+        submission = modules("submission_override", "value = 1\n")
+        output = run.run(grader, submission, seed=1, workers=1)
+        assert len(_pids(output)) == 1
+
+    def test_uncaught_end_test_detected_in_parallel(self, modules):
+        submission = modules("submission_caught", """
+            value = 0
+            def swallow(fn):
+                try:
+                    fn()
+                except BaseException:
+                    pass
+        """)
+        grader_source = GRADER.format(setup="grader.run_tests_in_parallel(2)") + textwrap.dedent('''
+            def swallowed(submission):
+                submission.swallow(lambda: grader.end_test("stop"))
+
+            grader.add_test(gradelib.Test(swallowed, "swallowed"))
+        ''')
+        grader = modules("grader_caught", grader_source)
+        output = run.run(grader, submission, seed=1)
+        assert output["submission"]["status"] == "caught"
+
+    def test_crashed_worker_reported_per_test(self, modules):
+        submission = modules("submission_crash", "value = 0\n")
+        grader_source = GRADER.format(setup="grader.run_tests_in_parallel(2)") + textwrap.dedent('''
+            def crash(submission):
+                os._exit(3)
+
+            grader.add_test(gradelib.Test(crash, "crash"))
+        ''')
+        grader = modules("grader_crash", grader_source)
+        output = run.run(grader, submission, seed=1)
+        assert len(output["results"]) == 9
+        assert "stopped the grading process" in output["results"][8][2]
+        # The tests the crashed worker finished before keep their results.
+        assert output["results"][0][2].startswith("0 ")
+        assert "ValueError: boom" in output["results"][6][2]
+
+    def test_background_process_does_not_hold_up_results(self, modules):
+        submission = modules("submission_background", "value = 0\n")
+        grader_source = GRADER.format(setup="grader.run_tests_in_parallel(2)") + textwrap.dedent('''
+            import time
+
+            def background(submission):
+                # Keeps a copy of the worker's pipe open long after the worker exits.
+                pid = os.fork()
+                if pid == 0:
+                    time.sleep(30)
+                    os._exit(0)
+                print(pid)
+
+            grader.add_test(gradelib.Test(background, "background"))
+        ''')
+        grader = modules("grader_background", grader_source)
+        started = time.monotonic()
+        output = run.run(grader, submission, seed=1)
+        os.kill(int(output["results"][8][2]), signal.SIGKILL)
+        assert time.monotonic() - started < 10
+        assert output["results"][0][2].startswith("0 ")
+        assert output["results"][8][2].strip().isdigit()
+
+    def test_default_workers_follow_cgroup_quota(self, monkeypatch):
+        from grader_support import gradelib, graderutil
+
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(64)))
+        real_open = open
+
+        def fake_open(path, *args, **kwargs):
+            if path == "/sys/fs/cgroup/cpu.max":
+                return io.StringIO("150000 100000\n")
+            return real_open(path, *args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", fake_open)
+        assert graderutil.available_cpus() == 2
+        grader = gradelib.Grader()
+        grader.run_tests_in_parallel()
+        assert grader.test_workers == 2
+
+
+BUDGET_GRADER = '''
+from grader_support import gradelib
+
+grader = gradelib.Grader()
+grader.set_test_budget(timeout={timeout})
+
+
+def spin(submission):
+    print("started")
+    submission.spin()
+
+
+def swallowing_spin(submission):
+    submission.stubborn()
+
+
+def quick(submission):
+    print("quick", submission.value)
+
+
+grader.add_test(gradelib.Test(spin, "spin"))
+grader.add_test(gradelib.Test(swallowing_spin, "stubborn"))
+grader.add_test(gradelib.Test(quick, "cpu", cpu_time=0.3))
+grader.add_test(gradelib.Test(quick, "quick"))
+'''
+
+BUDGET_SUBMISSION = """
+value = 7
+
+def spin():
+    while True:
+        pass
+
+def stubborn():
+    try:
+        while True:
+            pass
+    except BaseException:
+        pass
+    while True:
+        pass
+"""
+
+
+class TestBudgets:
+    def test_over_budget_tests_time_out_and_grading_continues(self, modules):
+        grader = modules("grader_budget", BUDGET_GRADER.format(timeout=0.3))
+        submission = modules("submission_budget", BUDGET_SUBMISSION)
+        output = run.run(grader, submission, seed=1)
+        results = output["results"]
+        assert [r[0] for r in results] == ["spin", "stubborn", "cpu", "quick"]
+        assert results[0][2].startswith("started\n")
+        assert "took more than 0.3 seconds" in results[0][2]
+        # Swallowing the first interruption doesn't escape the budget.
+        assert "took more than 0.3 seconds" in results[1][2]
+        assert results[2][2] == "quick 7\n"
+        assert results[3][2] == "quick 7\n"
+        assert output["exceptions"] == 2
+
+    def test_cpu_budget(self, modules):
+        grader = modules("grader_cpu", '''
+            from grader_support import gradelib
+
+            grader = gradelib.Grader()
+            grader.add_test(gradelib.Test(lambda sub: sub.spin(), "spin", cpu_time=0.2))
+        ''')
+        submission = modules("submission_cpu", BUDGET_SUBMISSION)
+        output = run.run(grader, submission, seed=1)
+        assert "0.2 seconds of CPU time" in output["results"][0][2]
+
+    def test_budget_disarmed_after_test(self):
+        import signal
+        with run.time_budget(timeout=5, cpu_time=5):
+            pass
+        assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+        assert signal.getitimer(signal.ITIMER_PROF) == (0.0, 0.0)
+
+    @pytest.mark.parametrize("budget, killed_by", [
+        ("timeout=0.2", signal.SIGKILL),
+        ("cpu_time=0.2", signal.SIGXCPU),
+    ])
+    def test_code_swallowing_every_interruption_killed(self, budget, killed_by):
+        code = textwrap.dedent(f'''
+            from grader_support import run
+            run._BUDGET_BACKSTOP_GRACE = 0.5
+            with run.time_budget({budget}):
+                while True:
+                    try:
+                        while True:
+                            pass
+                    except BaseException:
+                        pass
+        ''')
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, timeout=30)
+        assert proc.returncode == -killed_by
+
+    def test_budget_restores_cpu_limit(self):
+        import resource
+        before = resource.getrlimit(resource.RLIMIT_CPU)
+        with run.time_budget(cpu_time=5):
+            assert resource.getrlimit(resource.RLIMIT_CPU)[0] != before[0]
+        assert resource.getrlimit(resource.RLIMIT_CPU) == before
+
+
+OUTPUT_GRADER = '''
+from grader_support import gradelib
+
+grader = gradelib.Grader()
+grader.set_output_limit(100, tail=10, stop={stop})
+
+
+def chatty(submission):
+    for n in range(100000):
+        print(n)
+
+
+def quiet(submission):
+    print("done")
+
+
+grader.add_test(gradelib.Test(chatty, "chatty"))
+grader.add_test(gradelib.Test(quiet, "quiet"))
+'''
+
+
+class TestOutputLimit:
+    def test_output_kept_within_limit(self, modules):
+        grader = modules("grader_chatty", OUTPUT_GRADER.format(stop=False))
+        submission = modules("submission_chatty", "")
+        output = run.run(grader, submission, seed=1)
+        chatty = output["results"][0][2]
+        assert chatty.startswith("0\n1\n2\n")
+        assert "bytes of output discarded" in chatty
+        assert chatty.endswith("99999\n")
+        assert output["results"][1][2] == "done\n"
+        assert output["exceptions"] == 0
+
+    def test_captured_output_held_to_grader_limits(self, modules):
+        grader = modules("grader_exec", '''
+            from grader_support import gradelib
+
+            grader = gradelib.Grader()
+            grader.set_output_limit(100, stop=True)
+            grader.add_test(gradelib.Test(gradelib.exec_wrapped_code(), "exec"))
+        ''')
+        submission = modules("submission_exec", '''
+            submission_code = "for n in range(100000):\\n    print(n)\\n"
+        ''')
+        output = run.run(grader, submission, seed=1)
+        assert "*** Output limit exceeded" in output["results"][0][2]
+        assert output["exceptions"] == 1
+
+    def test_stop_on_output_limit(self, modules):
+        grader = modules("grader_chatty_stop", OUTPUT_GRADER.format(stop=True))
+        submission = modules("submission_chatty_stop", "")
+        output = run.run(grader, submission, seed=1)
+        assert "*** Output limit exceeded" in output["results"][0][2]
+        assert output["results"][1][2] == "done\n"
+        assert output["exceptions"] == 1
@@ -0,0 +1,167 @@
+"""
+Adaptive admission control for grading container launches.
+
+Without a limit, the number of grading containers launched at once is bounded
+only by the number of queue connections.  During submission bursts that is
+enough to trip API server client throttling, exhaust node capacity or hit a
+namespace ResourceQuota, after which Jobs sit ``Pending`` until they time out.
+
+:class:`AdaptiveLimiter` bounds the number of in-flight grading containers
+and adjusts that bound with AIMD (additive increase, multiplicative decrease)
+from what it observes about each launch:
+
+* a launch that reaches ``Running`` within ``latency_target`` seconds grows the
+  limit by ``1 / limit`` (about +1 per limit's worth of healthy launches);
+* a launch that errors, never starts, or starts slower than the target shrinks
+  the limit by ``backoff`` -- at most once per ``latency_target`` seconds, so
+  that a burst of slow launches, all caused by the same overload, counts as
+  one congestion signal rather than collapsing the limit to ``min_limit``.
+
+Submissions over the limit wait in a bounded FIFO queue; when the queue is
+full, or a waiter times out, :class:`AdmissionRejected` is raised.
+
+Limiters are shared per backend target (see :func:`get_limiter`), so every
+``ContainerGrader`` launching into the same namespace or Docker daemon is
+governed by one limit.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from . import metrics as _metrics
+
+log = logging.getLogger(__name__)
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a launch cannot be admitted (queue full or wait timed out)."""
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter with a bounded FIFO wait queue.
+
+    Thread-safe.  Use :meth:`acquire` before launching a container and
+    :meth:`release` once it has finished, reporting how long it took to reach
+    ``Running`` (``None`` if it never did) and whether the launch failed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: int | None = None,
+        latency_target: float = 5.0,
+        backoff: float = 0.7,
+        max_queue: int = 100,
+    ) -> None:
+        if max_limit < min_limit:
+            raise ValueError(f"max_limit ({max_limit}) must be >= min_limit ({min_limit})")
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.max_queue = max_queue
+        self._limit = float(
+            initial_limit if initial_limit is not None else max(min_limit, max_limit // 2)
+        )
+        self._in_flight = 0
+        self._last_decrease: float | None = None
+        self._waiters = collections.deque()
+        self._cond = threading.Condition()
+        self._attributes = {"limiter": name}
+        _metrics.admission_limit_gauge.set(self.limit, self._attributes)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def acquire(self, timeout: float | None = None) -> None:
+        """Block until a launch slot is free, waiting in FIFO order.
+
+        Raises :class:`AdmissionRejected` if the wait queue is full or no slot
+        frees up within ``timeout`` seconds.
+        """
+        with self._cond:
+            if not self._waiters and self._in_flight < self.limit:
+                self._admit()
+                return
+            if len(self._waiters) >= self.max_queue:
+                _metrics.admission_rejected_counter.add(1, self._attributes)
+                raise AdmissionRejected(
+                    f"Admission queue for {self.name} is full ({self.max_queue} waiting)."
+                )
+            ticket = object()
+            self._waiters.append(ticket)
+            _metrics.admission_queue_depth.add(1, self._attributes)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while not (self._waiters[0] is ticket and self._in_flight < self.limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        _metrics.admission_rejected_counter.add(1, self._attributes)
+                        raise AdmissionRejected(
+                            f"Timed out after {timeout}s waiting for a launch slot on {self.name}."
+                        )
+                    self._cond.wait(remaining)
+                self._admit()
+            finally:
+                self._waiters.remove(ticket)
+                _metrics.admission_queue_depth.add(-1, self._attributes)
+                # The head of the queue changed; let the next waiter re-check.
+                self._cond.notify_all()
+
+    def release(self, launch_latency: float | None = None, error: bool = False) -> None:
+        """Return a slot and feed the outcome of the launch into the limit."""
+        with self._cond:
+            self._in_flight -= 1
+            _metrics.admission_in_flight.add(-1, self._attributes)
+            if error or launch_latency is None or launch_latency > self.latency_target:
+                now = time.monotonic()
+                if self._last_decrease is None or now - self._last_decrease >= self.latency_target:
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            _metrics.admission_limit_gauge.set(self.limit, self._attributes)
+            if launch_latency is not None:
+                _metrics.launch_latency_histogram.record(launch_latency, self._attributes)
+            self._cond.notify_all()
+
+    def _admit(self) -> None:
+        self._in_flight += 1
+        _metrics.admission_in_flight.add(1, self._attributes)
+
+
+_limiters: dict[tuple, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key: tuple, **kwargs) -> AdaptiveLimiter:
+    """Return the process-wide limiter for ``key``, creating it with ``kwargs``.
+
+    ``key`` identifies the launch target, e.g. ``("kubernetes", kubeconfig,
+    context, namespace)``.  The first caller's parameters win.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            name = "/".join(str(part) for part in key if part is not None)
+            limiter = _limiters[key] = AdaptiveLimiter(name, **kwargs)
+            log.info(
+                "Created admission limiter %s (limit=%d, max=%d, queue=%d)",
+                name, limiter.limit, limiter.max_limit, limiter.max_queue,
+            )
+        return limiter
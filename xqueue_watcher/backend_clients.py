@@ -0,0 +1,141 @@
+"""
+Process-wide registry of container backend API clients.
+
+Every ``ContainerGrader`` instance -- and there is one per queue connection,
+so ``CONNECTIONS: 30`` means thirty of them -- obtains its Kubernetes and
+Docker API clients from this module instead of building its own.  Clients are
+keyed by the target they talk to (kubeconfig path and context for Kubernetes,
+daemon URL for Docker), so graders pointed at the same cluster or daemon share
+one client and one HTTP connection pool.
+
+Pools are sized explicitly (``pool_size``, default
+``XQWATCHER_GRADER_API_POOL_SIZE`` or 32) so that a single shared client can
+serve every grading thread without urllib3 discarding connections, and
+Kubernetes connections enable TCP keep-alive so idle pooled sockets are not
+silently dropped by intermediate load balancers.
+"""
+
+import logging
+import socket
+import threading
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 32
+
+_lock = threading.Lock()
+_k8s_clients: dict[tuple, object] = {}
+_k8s_apis: dict[int, tuple] = {}
+_docker_clients: dict[str | None, object] = {}
+
+
+def _tcp_keepalive_socket_options() -> list[tuple]:
+    """Return urllib3 socket options enabling TCP keep-alive where supported."""
+    from urllib3.connection import HTTPConnection
+
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 6)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+def get_k8s_api_client(kubeconfig=None, context=None, pool_size=None):
+    """
+    Return the shared ``kubernetes.client.ApiClient`` for a cluster.
+
+    In-cluster configuration is tried first when neither ``kubeconfig`` nor
+    ``context`` is given, falling back to the default kubeconfig.  Typed API
+    objects (``BatchV1Api``, ``CoreV1Api``, ...) built on the returned client
+    all use its single connection pool.
+    """
+    key = (kubeconfig, context)
+    api_client = _k8s_clients.get(key)
+    if api_client is not None:
+        return api_client
+    with _lock:
+        api_client = _k8s_clients.get(key)
+        if api_client is None:
+            try:
+                from kubernetes import client as k8s_client, config as k8s_config
+            except ImportError:
+                raise RuntimeError(
+                    "The 'kubernetes' package is required for the kubernetes backend. "
+                    "Install it with: uv add kubernetes"
+                )
+            configuration = k8s_client.Configuration()
+            loaded = False
+            if kubeconfig is None and context is None:
+                try:
+                    k8s_config.load_incluster_config(client_configuration=configuration)
+                    loaded = True
+                except k8s_config.ConfigException:
+                    pass
+            if not loaded:
+                k8s_config.load_kube_config(
+                    config_file=kubeconfig,
+                    context=context,
+                    client_configuration=configuration,
+                )
+            configuration.connection_pool_maxsize = pool_size or DEFAULT_POOL_SIZE
+            configuration.socket_options = _tcp_keepalive_socket_options()
+            api_client = _k8s_clients[key] = k8s_client.ApiClient(configuration)
+            log.info(
+                "Created shared Kubernetes API client (kubeconfig=%s, context=%s, pool_size=%d)",
+                kubeconfig or "default",
+                context or "default",
+                configuration.connection_pool_maxsize,
+            )
+    return api_client
+
+
+def get_k8s_clients(kubeconfig=None, context=None, pool_size=None):
+    """Return ``(BatchV1Api, CoreV1Api)`` on the shared client for a cluster."""
+    api_client = get_k8s_api_client(kubeconfig, context, pool_size)
+    apis = _k8s_apis.get(id(api_client))
+    if apis is None:
+        from kubernetes import client as k8s_client
+
+        apis = _k8s_apis.setdefault(
+            id(api_client),
+            (k8s_client.BatchV1Api(api_client), k8s_client.CoreV1Api(api_client)),
+        )
+    return apis
+
+
+def get_docker_client(base_url=None, pool_size=None):
+    """
+    Return the shared ``docker.DockerClient`` for a daemon.
+
+    ``base_url`` of None means "whatever the environment says" (``DOCKER_HOST``
+    or the local socket), matching ``docker.from_env()``.
+    """
+    client = _docker_clients.get(base_url)
+    if client is not None:
+        return client
+    with _lock:
+        client = _docker_clients.get(base_url)
+        if client is None:
+            import docker as docker_sdk
+
+            size = pool_size or DEFAULT_POOL_SIZE
+            if base_url is None:
+                client = docker_sdk.from_env(max_pool_size=size)
+            else:
+                client = docker_sdk.DockerClient(base_url=base_url, max_pool_size=size)
+            _docker_clients[base_url] = client
+            log.info(
+                "Created shared Docker API client (host=%s, pool_size=%d)",
+                base_url or "from environment",
+                size,
+            )
+    return client
+
+
+def _reset() -> None:
+    """Forget all cached clients.  Intended for tests."""
+    with _lock:
+        _k8s_clients.clear()
+        _k8s_apis.clear()
+        _docker_clients.clear()
@@ -0,0 +1,148 @@
+"""
+Micro-batching of grading submissions into multi-submission container runs.
+
+Around assignment deadlines hundreds of submissions for the same grader image
+arrive within seconds, and each one pays full Job and pod start-up.
+:class:`MicroBatcher` collects submissions for a short window (or until a
+size / byte cap is reached) and hands them to a single ``run_batch`` call --
+one grading pod -- whose per-submission results are demultiplexed back to the
+threads waiting on them.
+
+There is no dispatcher thread: the first submission to open a batch becomes
+its *leader*.  The leader waits out the window, closes the batch, runs it on
+its own thread and publishes the results; every other submitter simply blocks
+until its slot in the results is filled.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItem:
+    """One submission within a batch."""
+
+    grader_path: str
+    code: str
+    seed: str
+    grader_config: dict = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.code.encode("utf-8"))
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.items: list[BatchItem] = []
+        self.size = 0
+        self.results: list | None = None
+        self.closed = threading.Event()
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects submissions and runs them together through ``run_batch``.
+
+    ``run_batch(items)`` must return a list with one entry per item, in
+    order: the raw grade output bytes for that submission, or an exception
+    instance to raise in that submitter's thread.
+
+    ``timeout``, if given, bounds how long a non-leader waits for a batch
+    after its window closes: the longest ``run_batch`` may legitimately take.
+    A submitter still waiting then gives up with a ``RuntimeError`` rather
+    than hanging on a stuck leader.
+    """
+
+    def __init__(
+        self, run_batch, window: float, max_size: int, max_bytes: int,
+        timeout: float | None = None,
+    ) -> None:
+        self._run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._open: _Batch | None = None
+
+    def submit(self, item: BatchItem) -> bytes:
+        """Add ``item`` to the open batch and block until its result is ready."""
+        with self._lock:
+            batch = self._open
+            if batch is not None and batch.size + item.size > self.max_bytes:
+                # Would overflow the payload cap: close it and start a new one.
+                self._close(batch)
+                batch = None
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            batch.size += item.size
+            if len(batch.items) >= self.max_size:
+                self._close(batch)
+
+        if leader:
+            batch.closed.wait(self.window)
+            with self._lock:
+                self._close(batch)
+            self._execute(batch)
+        else:
+            wait = None if self.timeout is None else self.window + self.timeout
+            if not batch.done.wait(wait):
+                raise RuntimeError(
+                    f"Batch of {len(batch.items)} submissions did not finish within {wait:g}s."
+                )
+
+        result = batch.results[index]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def _close(self, batch: _Batch) -> None:
+        # Caller holds self._lock.
+        if self._open is batch:
+            self._open = None
+        batch.closed.set()
+
+    def _execute(self, batch: _Batch) -> None:
+        count = len(batch.items)
+        try:
+            results = list(self._run_batch(batch.items))
+            if len(results) != count:
+                raise RuntimeError(
+                    f"Batch runner returned {len(results)} results for {count} submissions."
+                )
+        except Exception as exc:
+            log.warning("Grading batch of %d submissions failed", count, exc_info=True)
+            results = [exc] * count
+        batch.results = results
+        batch.done.set()
+
+
+_batchers: dict[tuple, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(
+    key: tuple, run_batch, window: float, max_size: int, max_bytes: int,
+    timeout: float | None = None,
+) -> MicroBatcher:
+    """Return the process-wide batcher for ``key``, creating it on first use.
+
+    ``key`` must capture everything that determines how a batch is run
+    (image, namespace, limits, ...) so that only interchangeable grader
+    instances share a batcher.
+    """
+    with _batchers_lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            batcher = _batchers[key] = MicroBatcher(
+                run_batch, window, max_size, max_bytes, timeout
+            )
+        return batcher
@@ -1,9 +1,11 @@
 """
 A grader implementation that executes student code inside an isolated container.
 
-Supports two backends:
+Supports three backends:
   - "kubernetes": creates a batch/v1 Job per submission (production)
   - "docker": runs a local Docker container (local dev / CI)
+  - "process": runs the entrypoint as a sandboxed local subprocess
+    (small deployments / CI without a container runtime; see ``process_sandbox``)
 
 This is the recommended replacement for JailedGrader on Kubernetes deployments.
 The Kubernetes backend applies a defence-in-depth security posture:
@@ -20,10 +22,30 @@ Operators should also ensure:
   - A NetworkPolicy is applied to prevent egress from grading pods (see deploy/)
   - Grader images are signed and scanned; use digest-pinned references in production
   - The TTL controller is enabled so orphaned Jobs are reaped automatically
+
+Finished grading Jobs are deleted off the grading path by a shared background
+``JobReaper`` rather than synchronously after each submission; the Job's
+``ttlSecondsAfterFinished`` remains the backstop for anything it misses.
+
+Job request bodies are rendered from a pre-serialized template cached per
+grader configuration; only the Job name, image, args and env are patched per
+submission (see ``load_test/bench_job_manifest.py`` for the CPU saved).
+
+The docker backend labels its containers and learns of their exit from one
+shared Docker events stream per daemon (``docker_events``) instead of holding
+a blocking ``container.wait()`` connection per in-flight grade.
+
+Student code reaches the entrypoint by the configured ``submission_transport``:
+plain in the ``SUBMISSION_CODE`` env var (the default), gzip-compressed and
+base64-encoded in ``SUBMISSION_CODE_GZ``, or on the container's (or process')
+standard input, which keeps it off API objects entirely.
 """
 
+import base64
+import gzip
 import json
 import logging
+import math
 import os
 import random
 import threading
@@ -31,13 +53,33 @@ import time
 import uuid
 from pathlib import Path
 
+from . import metrics as _metrics, process_sandbox
+from .admission import AdmissionRejected, get_limiter
+from .batching import BatchItem, get_batcher
 from .grader import Grader
+from .backend_clients import get_docker_client, get_k8s_api_client, get_k8s_clients
+from .docker_events import MANAGED_LABEL, get_container_events
 from .env_settings import get_container_grader_defaults
+from .image_warmup import get_warmer
+from .k8s_async import get_async_backend
+from .hedging import get_hedge_policy
+from .grader_profiles import (
+    DEFAULT_MIN_SAMPLES, ProfileBounds, get_profile_store, recommend,
+)
+from .lifecycle import (
+    GradingOutOfMemory,
+    GradingTimeout,
+    PhaseRecorder,
+    job_failure,
+    record_docker_phases,
+    record_k8s_phases,
+)
 
 
 _BACKEND_KUBERNETES = "kubernetes"
 _BACKEND_DOCKER = "docker"
-_SUPPORTED_BACKENDS = (_BACKEND_KUBERNETES, _BACKEND_DOCKER)
+_BACKEND_PROCESS = "process"
+_SUPPORTED_BACKENDS = (_BACKEND_KUBERNETES, _BACKEND_DOCKER, _BACKEND_PROCESS)
 
 # Maximum submission size (bytes). Submissions larger than this are rejected
 # before a container is launched to prevent etcd object-size overflows (K8s
@@ -46,6 +88,38 @@ _SUBMISSION_SIZE_WARN_BYTES = 32 * 1024   # 32 KB
 _SUBMISSION_SIZE_LIMIT_BYTES = int(
     os.environ.get("XQWATCHER_SUBMISSION_SIZE_LIMIT", str(1024 * 1024))  # 1 MB default
 )
+# With the compressed transport the size limit applies to the encoded payload;
+# the raw code, decompressed in the grading container, gets this larger cap.
+_COMPRESSED_RAW_SIZE_LIMIT_BYTES = int(
+    os.environ.get(
+        "XQWATCHER_COMPRESSED_SUBMISSION_RAW_LIMIT", str(8 * _SUBMISSION_SIZE_LIMIT_BYTES)
+    )
+)
+
+_TRANSPORT_ENV = "env"
+_TRANSPORT_COMPRESSED = "compressed"
+_TRANSPORT_STDIN = "stdin"
+_SUPPORTED_TRANSPORTS = (_TRANSPORT_ENV, _TRANSPORT_COMPRESSED, _TRANSPORT_STDIN)
+
+# GRADER_ISOLATION values understood by grader_support.entrypoint.
+_GRADER_ISOLATION_MODES = ("import", "fork", "fork-parallel")
+
+# Cap on the combined submission code carried by one micro-batch Job, which
+# travels in a single SUBMISSION_BATCH env var on the Pod object.
+_BATCH_MAX_BYTES = 512 * 1024
+
+# Resource requests of grading containers unless a learned profile sets them.
+_DEFAULT_CPU_REQUEST = "100m"
+_DEFAULT_MEMORY_REQUEST = "64Mi"
+
+# Upper bound on cached serialized Job templates per grader (see _render_k8s_job).
+_JOB_TEMPLATE_CACHE_SIZE = 64
+
+# Label carried by every grading Job whose value is the Job's own name, so that
+# finished Jobs can be deleted in batches with a set-based label selector.
+_JOB_NAME_LABEL = "xqueue-watcher/job-name"
+# Set on a hedged copy of a grading Job, naming the Job it duplicates.
+_HEDGE_OF_LABEL = "xqueue-watcher/hedge-of"
 
 log = logging.getLogger(__name__)
 
@@ -56,18 +130,32 @@ class ImageDigestPoller:
 
     Resolves ``repo:tag`` → ``repo@sha256:…`` by querying the Docker registry
     via the Docker SDK's ``inspect_distribution`` API (no image pull required).
-    The resolved reference is cached and refreshed every ``poll_interval`` seconds.
+    The resolved reference is cached and refreshed roughly every
+    ``poll_interval`` seconds; each sleep is jittered by ±10% so pollers for
+    different images (and different watcher replicas) do not hit the registry
+    in lock-step.  All pollers share the process-wide pooled Docker client
+    from ``backend_clients``.
+
+    Pollers are shared: use :func:`get_digest_poller` to obtain the single
+    poller for an image reference rather than constructing one per grader.
 
     Thread-safe: ``resolved_image`` may be read from any thread at any time.
 
     If the initial resolution fails, ``resolved_image`` returns the original
     unresolved reference so that grading can proceed with ``imagePullPolicy:
     Always`` as a safe fallback.
+
+    Listeners registered with ``on_change`` / :meth:`add_listener` are called
+    from the polling thread with the new ``repo@sha256:…`` reference whenever
+    the resolved digest changes, including the first successful resolution.
     """
 
-    def __init__(self, image: str, poll_interval: int = 300) -> None:
+    _JITTER = 0.1
+
+    def __init__(self, image: str, poll_interval: int = 300, on_change=None) -> None:
         self._image = image
-        self._poll_interval = poll_interval
+        self.poll_interval = poll_interval
+        self._listeners = [on_change] if on_change is not None else []
         self._resolved: str | None = None
         self._lock = threading.Lock()
         self._thread = threading.Thread(
@@ -80,17 +168,24 @@ class ImageDigestPoller:
         with self._lock:
             return self._resolved if self._resolved is not None else self._image
 
+    def add_listener(self, on_change) -> None:
+        """Register ``on_change``; it is called at once if a digest is already known."""
+        with self._lock:
+            self._listeners.append(on_change)
+            resolved = self._resolved
+        if resolved is not None:
+            on_change(resolved)
+
     def _poll_loop(self) -> None:
         while True:
             self._refresh()
-            time.sleep(self._poll_interval)
+            time.sleep(
+                self.poll_interval * random.uniform(1 - self._JITTER, 1 + self._JITTER)
+            )
 
     def _refresh(self) -> None:
         try:
-            import docker as docker_sdk
-
-            client = docker_sdk.APIClient()
-            info = client.inspect_distribution(self._image)
+            info = get_docker_client().api.inspect_distribution(self._image)
             digest = info["Descriptor"]["digest"]
             # Strip digest ref (image@sha256:...) then strip tag if present.
             # A tag is the last colon-separated segment that appears after the
@@ -101,21 +196,265 @@ class ImageDigestPoller:
             repo = base[:last_colon] if last_colon > last_slash else base
             resolved = f"{repo}@{digest}"
             with self._lock:
-                if self._resolved != resolved:
+                changed = self._resolved != resolved
+                if changed:
                     log.info(
                         "Resolved grader image %s → %s", self._image, resolved
                     )
                     self._resolved = resolved
+                listeners = list(self._listeners)
+            if changed:
+                for listener in listeners:
+                    try:
+                        listener(resolved)
+                    except Exception:
+                        log.exception("Digest change listener failed for %s", self._image)
         except Exception:
             log.warning(
                 "Failed to resolve digest for grader image %s; "
                 "will retry in %ds",
                 self._image,
-                self._poll_interval,
+                self.poll_interval,
                 exc_info=True,
             )
 
 
+_digest_pollers: dict[str, ImageDigestPoller] = {}
+_digest_pollers_lock = threading.Lock()
+
+
+def get_digest_poller(image: str, poll_interval: int = 300, on_change=None) -> ImageDigestPoller:
+    """Return the process-wide poller for ``image``, starting it on first use.
+
+    Every grader polling the same reference shares one thread and one stream
+    of registry requests.  The shortest requested ``poll_interval`` wins.
+    """
+    with _digest_pollers_lock:
+        poller = _digest_pollers.get(image)
+        if poller is None:
+            poller = _digest_pollers[image] = ImageDigestPoller(
+                image, poll_interval=poll_interval, on_change=on_change
+            )
+            log.info(
+                "Started digest poller for grader image %s (interval=%ds)",
+                image,
+                poll_interval,
+            )
+            return poller
+        poller.poll_interval = min(poller.poll_interval, poll_interval)
+    if on_change is not None:
+        poller.add_listener(on_change)
+    return poller
+
+
+class JobReaper:
+    """
+    Background thread that deletes finished grading Jobs in batches.
+
+    Grading threads hand over the name of each Job once its output has been
+    collected and return immediately; the reaper accumulates names and issues a
+    single ``deletecollection`` call per batch using a set-based selector on
+    ``_JOB_NAME_LABEL`` and ``Background`` propagation, so the API server and
+    garbage collector remove the Job and its pod asynchronously.
+
+    Delete calls are rate limited to ``max_calls_per_second``.  A failed batch
+    is logged and dropped: ``ttl_seconds_after_finished`` on the Job spec is
+    the backstop that eventually reaps anything the reaper misses (including
+    Jobs still pending when the process exits).
+    """
+
+    def __init__(
+        self,
+        batch_v1,
+        namespace: str,
+        interval: float = 2.0,
+        batch_size: int = 50,
+        max_calls_per_second: float = 2.0,
+    ) -> None:
+        self._batch_v1 = batch_v1
+        self._namespace = namespace
+        self._interval = interval
+        self._batch_size = batch_size
+        self._min_call_gap = 1.0 / max_calls_per_second if max_calls_per_second else 0.0
+        self._last_call = 0.0
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(
+            target=self._reap_loop, name=f"job-reaper-{namespace}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, job_name: str) -> None:
+        """Queue ``job_name`` for deletion.  Never blocks on the API server."""
+        with self._lock:
+            self._pending.append(job_name)
+            full = len(self._pending) >= self._batch_size
+        if full:
+            self._wake.set()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _reap_loop(self) -> None:
+        while True:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            while self.reap_once():
+                pass
+
+    def reap_once(self) -> bool:
+        """Delete one batch of pending Jobs.  Returns False if nothing was pending."""
+        with self._lock:
+            batch = self._pending[:self._batch_size]
+            del self._pending[:self._batch_size]
+        if not batch:
+            return False
+
+        wait = self._last_call + self._min_call_gap - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+
+        try:
+            from kubernetes import client as k8s_client
+
+            self._batch_v1.delete_collection_namespaced_job(
+                namespace=self._namespace,
+                label_selector=f"{_JOB_NAME_LABEL} in ({','.join(batch)})",
+                body=k8s_client.V1DeleteOptions(propagation_policy="Background"),
+            )
+            log.debug("Deleted %d grading Jobs in %s", len(batch), self._namespace)
+        except Exception:
+            log.warning(
+                "Failed to delete %d grading Jobs in %s; leaving them to the "
+                "TTL controller",
+                len(batch),
+                self._namespace,
+                exc_info=True,
+            )
+        return True
+
+
+_job_reapers: dict[tuple, JobReaper] = {}
+_job_reapers_lock = threading.Lock()
+
+
+def _get_job_reaper(batch_v1, namespace: str) -> JobReaper:
+    """Return the process-wide ``JobReaper`` for a cluster client and namespace.
+
+    ``batch_v1`` comes from the shared ``backend_clients`` registry, so its
+    identity stands for the cluster it talks to.
+    """
+    key = (id(batch_v1), namespace)
+    with _job_reapers_lock:
+        reaper = _job_reapers.get(key)
+        if reaper is None:
+            reaper = _job_reapers[key] = JobReaper(batch_v1, namespace)
+        return reaper
+
+
+def _last_output_line(output, pod_name):
+    """Return the last non-empty line of a grading pod's log (the JSON result)."""
+    # Scan backwards: earlier lines may be stderr interleaved by the
+    # Kubernetes log API.
+    for line in reversed(output.splitlines()):
+        stripped = line.strip()
+        if stripped:
+            return stripped.encode("utf-8")
+    raise RuntimeError(f"No output from grading pod {pod_name}.")
+
+
+_k8s_serializer = None
+
+
+def _send_stdin(sock, data):
+    """Write ``data`` to an attached container's stdin and close it."""
+    # attach_socket returns a SocketIO wrapper around the raw socket.
+    raw = getattr(sock, "_sock", sock)
+    try:
+        raw.sendall(data)
+    finally:
+        raw.close()
+
+
+def _serialize_k8s(obj):
+    """Convert a kubernetes model object to the plain dict sent on the wire."""
+    global _k8s_serializer
+    if _k8s_serializer is None:
+        from kubernetes import client as k8s_client
+
+        _k8s_serializer = k8s_client.ApiClient()
+    return _k8s_serializer.sanitize_for_serialization(obj)
+
+
+class _Launch:
+    """Timing of a single container launch, reported to the admission limiter."""
+
+    def __init__(self) -> None:
+        self.requested = time.monotonic()
+        self.running_at: float | None = None
+
+    def mark_running(self) -> None:
+        if self.running_at is None:
+            self.running_at = time.monotonic()
+
+    @property
+    def latency(self) -> float | None:
+        """Seconds from launch request to running, or None if it never ran."""
+        if self.running_at is None:
+            return None
+        return self.running_at - self.requested
+
+
+class _K8sHedge:
+    """Hedging state of one grading Job launch (see ``hedging``)."""
+
+    def __init__(self, policy, job_manifest) -> None:
+        self.policy = policy
+        self.job_manifest = job_manifest
+        delay = policy.delay()
+        # None: no hedge for this launch (too little history, or already started).
+        self.launch_at = None if delay is None else time.monotonic() + delay
+        self.job_name: str | None = None
+
+    def due(self) -> bool:
+        return self.launch_at is not None and time.monotonic() >= self.launch_at
+
+    def manifest(self, job_name: str, original: str) -> dict:
+        """
+        Return a copy of the Job that prefers a node other than ``original``'s
+        pod's.  Only preferred: on a single schedulable node the hedge still
+        runs, rather than staying Pending with a budget token spent on it.
+        """
+        metadata = dict(self.job_manifest["metadata"])
+        metadata["name"] = job_name
+        metadata["labels"] = {
+            **metadata["labels"], _JOB_NAME_LABEL: job_name, _HEDGE_OF_LABEL: original,
+        }
+        pod_template = dict(self.job_manifest["spec"]["template"])
+        pod_spec = dict(pod_template["spec"])
+        pod_spec["affinity"] = {
+            "podAntiAffinity": {
+                "preferredDuringSchedulingIgnoredDuringExecution": [{
+                    "weight": 100,
+                    "podAffinityTerm": {
+                        # The Job controller labels its pods with job-name.
+                        "labelSelector": {"matchLabels": {"job-name": original}},
+                        "topologyKey": "kubernetes.io/hostname",
+                    },
+                }],
+            },
+        }
+        pod_template["spec"] = pod_spec
+        job = dict(self.job_manifest)
+        job["metadata"] = metadata
+        job["spec"] = {**self.job_manifest["spec"], "template": pod_template}
+        return job
+
+
 class ContainerGrader(Grader):
     """
     Grades student submissions by running them inside an isolated container.
@@ -132,8 +471,13 @@ class ContainerGrader(Grader):
                            for Kubernetes the scripts are baked into the image.
       image              - Docker image to run. Should extend grader-base and include
                            all course-specific grader scripts and dependencies.
-      backend            - "kubernetes" or "docker". Defaults to
-                           XQWATCHER_GRADER_BACKEND env var, or "kubernetes".
+                           Not used (and optional) with the process backend.
+      backend            - "kubernetes", "docker" or "process". Defaults to
+                           XQWATCHER_GRADER_BACKEND env var, or "kubernetes".  The
+                           process backend runs grader_support.entrypoint from this
+                           installation against grader files under grader_root,
+                           isolated with Linux namespaces where available and
+                           rlimits derived from timeout and memory_limit.
       namespace          - Kubernetes namespace to create Jobs in. Defaults to
                            XQWATCHER_GRADER_NAMESPACE env var, or "default".
       cpu_limit          - CPU limit for the grading container. Defaults to
@@ -157,8 +501,9 @@ class ContainerGrader(Grader):
                            is inferred from the image reference: "IfNotPresent" for
                            digest-pinned refs (``repo@sha256:…``), "Always" for
                            tag-based refs (no digest present).
-      poll_image_digest  - When True and ``image`` is a tag-based reference, start
-                           a background ``ImageDigestPoller`` that periodically
+      poll_image_digest  - When True and ``image`` is a tag-based reference, use
+                           the process-wide ``ImageDigestPoller`` for the image (one
+                           per image reference, shared by every grader) that periodically
                            resolves the tag to its current digest.  Grading Jobs will
                            use the most recently resolved ``repo@digest`` reference,
                            which ensures Kubernetes nodes always pull the latest
@@ -166,12 +511,92 @@ class ContainerGrader(Grader):
                            for every pod. Default: False.
       digest_poll_interval - Seconds between digest resolution polls when
                            ``poll_image_digest`` is True. Default: 300.
+      kubeconfig         - Path to a kubeconfig file for the kubernetes backend.
+                           Default: None (in-cluster config, then ~/.kube/config).
+      kube_context       - kubeconfig context to use. Default: None (current context).
+      docker_host        - Docker daemon URL for the docker backend, e.g.
+                           ``unix:///var/run/docker.sock``. Default: None (DOCKER_HOST
+                           / local socket, as ``docker.from_env()``).
+      api_pool_size      - HTTP connection pool size of the shared backend API client.
+                           Clients are shared process-wide by every grader talking to
+                           the same cluster or daemon (see ``backend_clients``), so
+                           this should cover the total number of connections.
+                           Defaults to XQWATCHER_GRADER_API_POOL_SIZE env var, or 32.
+      max_concurrency    - Enable adaptive admission control: the upper bound on
+                           grading containers in flight at once for this backend
+                           target (namespace or Docker daemon), shared by every
+                           grader launching there.  The actual limit moves between 1
+                           and this value with AIMD based on launch-to-running
+                           latency and launch failures (see ``admission``).
+                           Default: None (no admission control).
+      launch_latency_target - Seconds within which a container should reach Running;
+                           slower launches shrink the admission limit. Default: 5.
+      admission_queue_size - Maximum submissions waiting for a launch slot before new
+                           ones are rejected with a grading error. Default: 100.
+      batch_window       - Enable micro-batching (kubernetes backend only): seconds to
+                           collect submissions for the same image before running them
+                           together in one grading pod, each in a fresh process (see
+                           ``batching``).  Default: 0 (every submission gets its own Job).
+      batch_max_size     - Maximum submissions per batch; a full batch launches
+                           immediately. Default: 16.
+      batch_parallelism  - Submissions a batch pod grades concurrently.  CPU and memory
+                           limits of batch pods are multiplied by this value so each
+                           submission keeps the configured budget.  Concurrent
+                           submissions share a UID inside the pod; keep the default
+                           of 1 where submissions must not observe each other. Default: 1.
+      prepull_image      - Pre-pull the grader image at startup and, with
+                           ``poll_image_digest``, on every digest change: via the Docker
+                           API for the docker backend, via a short-lived DaemonSet of
+                           pre-pull pods for Kubernetes.  Grading Jobs switch to a newly
+                           resolved digest only once its pre-pull has finished, so the
+                           first grades after a push do not pay for the pull.
+                           Default: False.
+      prepull_timeout    - Seconds to wait for a pre-pull to reach every node before
+                           giving up and switching anyway. Default: 600.
+      k8s_async          - Drive the kubernetes backend through ``kubernetes_asyncio`` on
+                           a shared event loop thread (see ``k8s_async``) instead of
+                           blocking API calls in each grading thread.  Requires the
+                           ``kubernetes-async`` extra. Default: False.
+      hedge_percentile   - Launch a second copy of a grading Job, kept off the first
+                           Job's node, when the Job has not reached Running within
+                           this percentile of recent start-up times; the first copy
+                           to finish wins and the other is deleted (see ``hedging``).
+                           Kubernetes backend only, not with k8s_async.
+                           Default: None (no hedging).
+      hedge_min_delay    - Never hedge a Job earlier than this many seconds. Default: 5.
+      hedge_min_samples  - Start-up times to observe before hedging. Default: 20.
+      hedge_budget       - Fraction of launches that may be hedged. Default: 0.05.
+      submission_transport - How student code reaches the entrypoint: "env"
+                           (SUBMISSION_CODE), "compressed" (gzip + base64 in
+                           SUBMISSION_CODE_GZ, so the size limit applies to the
+                           encoded payload) or "stdin" (docker and process backends;
+                           nothing on the container config).  Default: "env".
+      grader_isolation   - How the entrypoint separates the staff and student runs
+                           (GRADER_ISOLATION): "import" re-imports the grader for
+                           each run, "fork" imports it once and forks a child per
+                           run, "fork-parallel" also runs both at once.
+                           Default: None (the entrypoint's default, "import").
+      profile_mode       - Learn per-grader runtime and resource profiles (see
+                           ``grader_profiles``): "report" only logs the deadline,
+                           requests and limits each grader would get; "apply" also
+                           sets them on that grader's Kubernetes Jobs (kubernetes
+                           backend only; batch Jobs keep the configured values).
+                           Default: None (off).
+      profile_store      - JSON file to persist learned profiles in across restarts.
+                           Default: None (in memory only).
+      profile_bounds     - Limits on learned values: any of min_timeout, max_timeout,
+                           min_cpu_millis, max_cpu_millis, min_memory_bytes and
+                           max_memory_bytes.  The maxima default to the configured
+                           timeout, cpu_limit and memory_limit; raise them to let
+                           heavy graders get more than the queue-wide settings.
+      profile_min_samples - Observations of a grader before its profile is used.
+                           Default: 20.
     """
 
     def __init__(
         self,
         grader_root,
-        image,
+        image=None,
         backend=None,
         namespace=None,
         cpu_limit=None,
@@ -181,6 +606,29 @@ class ContainerGrader(Grader):
         poll_image_digest=False,
         digest_poll_interval=300,
         docker_host_grader_root=None,
+        kubeconfig=None,
+        kube_context=None,
+        docker_host=None,
+        api_pool_size=None,
+        max_concurrency=None,
+        launch_latency_target=5,
+        admission_queue_size=100,
+        batch_window=0,
+        batch_max_size=16,
+        batch_parallelism=1,
+        prepull_image=False,
+        prepull_timeout=600,
+        k8s_async=False,
+        profile_mode=None,
+        profile_store=None,
+        profile_bounds=None,
+        profile_min_samples=DEFAULT_MIN_SAMPLES,
+        hedge_percentile=None,
+        hedge_min_delay=5,
+        hedge_min_samples=20,
+        hedge_budget=0.05,
+        submission_transport=_TRANSPORT_ENV,
+        grader_isolation=None,
         **kwargs,
     ):
         env_defaults = get_container_grader_defaults()
@@ -189,6 +637,10 @@ class ContainerGrader(Grader):
             raise ValueError(
                 f"Unsupported backend {resolved_backend!r}. Choose from {_SUPPORTED_BACKENDS}."
             )
+        if not image and resolved_backend != _BACKEND_PROCESS:
+            raise ValueError(f"An image is required for the {resolved_backend} backend.")
+        if prepull_image and resolved_backend == _BACKEND_PROCESS:
+            raise ValueError("prepull_image is not supported by the process backend.")
         super().__init__(grader_root=grader_root, fork_per_item=False, **kwargs)
         self.image = image
         self.backend = resolved_backend
@@ -201,6 +653,64 @@ class ContainerGrader(Grader):
             if docker_host_grader_root is not None
             else env_defaults["docker_host_grader_root"]
         )
+        self.kubeconfig = kubeconfig
+        self.kube_context = kube_context
+        self.docker_host = docker_host
+        self.api_pool_size = (
+            api_pool_size if api_pool_size is not None else env_defaults["api_pool_size"]
+        )
+        self.max_concurrency = max_concurrency
+        self.launch_latency_target = launch_latency_target
+        self.admission_queue_size = admission_queue_size
+        if batch_window and resolved_backend != _BACKEND_KUBERNETES:
+            raise ValueError("Micro-batching (batch_window) requires the kubernetes backend.")
+        self.batch_window = batch_window
+        if k8s_async and resolved_backend != _BACKEND_KUBERNETES:
+            raise ValueError("k8s_async requires the kubernetes backend.")
+        self.k8s_async = k8s_async
+        if profile_mode not in (None, "report", "apply"):
+            raise ValueError(f"profile_mode must be 'report' or 'apply', not {profile_mode!r}.")
+        if profile_mode == "apply" and resolved_backend != _BACKEND_KUBERNETES:
+            raise ValueError("profile_mode 'apply' requires the kubernetes backend.")
+        self.profile_mode = profile_mode
+        self.profile_min_samples = profile_min_samples
+        self._profiles = get_profile_store(profile_store) if profile_mode else None
+        self._profile_bounds = ProfileBounds(**{
+            "max_timeout": self.timeout,
+            "max_cpu_millis": int(_parse_cpu_millis(self.cpu_limit)),
+            "max_memory_bytes": _parse_memory_bytes(self.memory_limit),
+            **(profile_bounds or {}),
+        })
+        self._reported_profiles: dict[str, tuple] = {}
+        # Per grading thread: seconds the last launch took, set by _launch().
+        self._launch_timing = threading.local()
+        if hedge_percentile is not None:
+            if resolved_backend != _BACKEND_KUBERNETES or k8s_async:
+                raise ValueError(
+                    "hedge_percentile requires the kubernetes backend without k8s_async."
+                )
+            if not 0 < hedge_percentile <= 100:
+                raise ValueError("hedge_percentile must be in (0, 100].")
+        if submission_transport not in _SUPPORTED_TRANSPORTS:
+            raise ValueError(
+                f"Unsupported submission_transport {submission_transport!r}. "
+                f"Choose from {_SUPPORTED_TRANSPORTS}."
+            )
+        if submission_transport == _TRANSPORT_STDIN and resolved_backend == _BACKEND_KUBERNETES:
+            raise ValueError("submission_transport 'stdin' is not supported by the kubernetes backend.")
+        self.submission_transport = submission_transport
+        if grader_isolation not in (None, *_GRADER_ISOLATION_MODES):
+            raise ValueError(
+                f"Unsupported grader_isolation {grader_isolation!r}. "
+                f"Choose from {_GRADER_ISOLATION_MODES}."
+            )
+        self.grader_isolation = grader_isolation
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_budget = hedge_budget
+        self.batch_max_size = batch_max_size
+        self.batch_parallelism = max(1, int(batch_parallelism))
 
         # image_pull_policy: explicit override or auto-detect from image ref.
         # Normalise to title-case ("Always", "IfNotPresent", "Never") regardless
@@ -211,28 +721,31 @@ class ContainerGrader(Grader):
             self.image_pull_policy = _policy_map.get(
                 image_pull_policy.strip().lower(), image_pull_policy.strip()
             )
-        elif "@sha256:" in image:
+        elif image and "@sha256:" in image:
             self.image_pull_policy = "IfNotPresent"
         else:
             self.image_pull_policy = "Always"
 
+        # Serialized Job templates keyed by (deadline, cpu_limit, memory_limit);
+        # see _render_k8s_job.
+        self._job_templates: dict[tuple, dict] = {}
+
+        self.prepull_image = prepull_image
+        self.prepull_timeout = prepull_timeout
+        # With pre-pull enabled, the image reference grading Jobs use; only
+        # advanced once the new reference is warm.
+        self._active_image: str | None = None
+
         # Optional background digest polling for tag-based image references.
         self._digest_poller: ImageDigestPoller | None = None
-        if poll_image_digest and "@sha256:" not in image:
-            self._digest_poller = ImageDigestPoller(
-                image=image, poll_interval=digest_poll_interval
-            )
-            log.info(
-                "Started digest poller for grader image %s (interval=%ds)",
+        if poll_image_digest and image and "@sha256:" not in image:
+            self._digest_poller = get_digest_poller(
                 image,
-                digest_poll_interval,
+                poll_interval=digest_poll_interval,
+                on_change=self._on_digest_change if prepull_image else None,
             )
-
-        # Lazily-initialised Kubernetes API clients (created once per instance
-        # on first use to avoid per-submission config-load overhead).
-        self._k8s_lock = threading.Lock()
-        self._k8s_batch_v1 = None
-        self._k8s_core_v1 = None
+        elif prepull_image:
+            self._image_warmer().warm(image)
 
     def _effective_image(self) -> str:
         """Return the image reference to use for container execution.
@@ -242,38 +755,197 @@ class ContainerGrader(Grader):
         reference otherwise.
         """
         if self._digest_poller is not None:
+            if self.prepull_image:
+                # Stay on the last warm reference until a new digest is pulled.
+                return self._active_image or self.image
             return self._digest_poller.resolved_image
         return self.image
 
+    # ------------------------------------------------------------------
+    # Internal: image pre-pull
+    # ------------------------------------------------------------------
+
+    def _image_warmer(self):
+        """Return the shared image warmer for this grader's backend target."""
+        if self.backend == _BACKEND_KUBERNETES:
+            key = (self.backend, self.kubeconfig, self.kube_context, self.namespace)
+        else:
+            key = (self.backend, self.docker_host)
+        return get_warmer(key, pull=self._prepull, backend=self.backend)
+
+    def _on_digest_change(self, resolved):
+        self._image_warmer().warm(resolved, on_done=self._on_image_warm)
+
+    def _on_image_warm(self, ref, ok):
+        if not ok:
+            self.log.warning(
+                "Pre-pull of %s did not complete; switching grading Jobs to it anyway", ref
+            )
+        self._active_image = ref
+
+    def _prepull(self, ref):
+        """Block until ``ref`` has been pulled where grading containers run."""
+        if self.backend == _BACKEND_KUBERNETES:
+            self._prepull_k8s(ref)
+        else:
+            self._get_docker_client().images.pull(ref)
+
+    def _prepull_k8s(self, ref):
+        """Pull ``ref`` onto every schedulable node with a throwaway DaemonSet.
+
+        Each pre-pull pod runs the grader image with an idle command; once all
+        of them are ready the image is cached on every node and the DaemonSet
+        is deleted.
+        """
+        from kubernetes import client as k8s_client
+
+        apps_v1 = k8s_client.AppsV1Api(
+            get_k8s_api_client(self.kubeconfig, self.kube_context, self.api_pool_size)
+        )
+        name = f"xqueue-prepull-{uuid.uuid4().hex[:12]}"
+        labels = {
+            "app.kubernetes.io/component": "xqueue-grader-prepull",
+            "app.kubernetes.io/managed-by": "xqueue-watcher",
+            "xqueue-watcher/prepull": name,
+        }
+        daemon_set = k8s_client.V1DaemonSet(
+            api_version="apps/v1",
+            kind="DaemonSet",
+            metadata=k8s_client.V1ObjectMeta(name=name, labels=labels),
+            spec=k8s_client.V1DaemonSetSpec(
+                selector=k8s_client.V1LabelSelector(match_labels={"xqueue-watcher/prepull": name}),
+                template=k8s_client.V1PodTemplateSpec(
+                    metadata=k8s_client.V1ObjectMeta(labels=labels),
+                    spec=k8s_client.V1PodSpec(
+                        automount_service_account_token=False,
+                        termination_grace_period_seconds=0,
+                        security_context=k8s_client.V1PodSecurityContext(
+                            run_as_non_root=True,
+                            run_as_user=1000,
+                            seccomp_profile=k8s_client.V1SeccompProfile(type="RuntimeDefault"),
+                        ),
+                        containers=[
+                            k8s_client.V1Container(
+                                name="prepull",
+                                image=ref,
+                                image_pull_policy=self.image_pull_policy,
+                                command=["python", "-c", "import signal; signal.pause()"],
+                                resources=k8s_client.V1ResourceRequirements(
+                                    limits={"cpu": "10m", "memory": "32Mi"},
+                                    requests={"cpu": "1m", "memory": "16Mi"},
+                                ),
+                                security_context=k8s_client.V1SecurityContext(
+                                    allow_privilege_escalation=False,
+                                    read_only_root_filesystem=True,
+                                    capabilities=k8s_client.V1Capabilities(drop=["ALL"]),
+                                ),
+                            )
+                        ],
+                    ),
+                ),
+            ),
+        )
+        apps_v1.create_namespaced_daemon_set(namespace=self.namespace, body=daemon_set)
+        try:
+            deadline = time.monotonic() + self.prepull_timeout
+            while time.monotonic() < deadline:
+                status = apps_v1.read_namespaced_daemon_set_status(
+                    name=name, namespace=self.namespace
+                ).status
+                desired = status.desired_number_scheduled or 0
+                if desired and (status.number_ready or 0) >= desired:
+                    return
+                time.sleep(2)
+            raise RuntimeError(
+                f"Pre-pull of {ref} did not reach every node within {self.prepull_timeout}s."
+            )
+        finally:
+            try:
+                apps_v1.delete_namespaced_daemon_set(
+                    name=name,
+                    namespace=self.namespace,
+                    body=k8s_client.V1DeleteOptions(propagation_policy="Background"),
+                )
+            except Exception:
+                self.log.warning("Failed to delete pre-pull DaemonSet %s", name, exc_info=True)
+
     # ------------------------------------------------------------------
     # Internal: container execution
     # ------------------------------------------------------------------
 
     def _get_k8s_clients(self):
-        """Return cached (batch_v1, core_v1) Kubernetes API clients.
+        """Return the shared (batch_v1, core_v1) Kubernetes API clients.
 
-        Config is loaded and clients are constructed once per instance the
-        first time this method is called.  Subsequent calls return the cached
-        objects, avoiding repeated kubeconfig reads on every submission.
+        Clients come from the process-wide ``backend_clients`` registry, so
+        every grader instance targeting the same kubeconfig/context shares
+        one connection pool instead of building its own.
         """
-        if self._k8s_batch_v1 is not None:
-            return self._k8s_batch_v1, self._k8s_core_v1
-        with self._k8s_lock:
-            if self._k8s_batch_v1 is None:
-                try:
-                    from kubernetes import client as k8s_client, config as k8s_config
-                except ImportError:
-                    raise RuntimeError(
-                        "The 'kubernetes' package is required for the kubernetes backend. "
-                        "Install it with: uv add kubernetes"
-                    )
-                try:
-                    k8s_config.load_incluster_config()
-                except k8s_config.ConfigException:
-                    k8s_config.load_kube_config()
-                self._k8s_batch_v1 = k8s_client.BatchV1Api()
-                self._k8s_core_v1 = k8s_client.CoreV1Api()
-        return self._k8s_batch_v1, self._k8s_core_v1
+        return get_k8s_clients(self.kubeconfig, self.kube_context, self.api_pool_size)
+
+    def _get_docker_client(self):
+        """Return the shared Docker client for ``docker_host``."""
+        return get_docker_client(self.docker_host, self.api_pool_size)
+
+    def _phase_recorder(self):
+        """Return a lifecycle phase recorder tagged for this grader's backend."""
+        namespace = self.namespace if self.backend == _BACKEND_KUBERNETES else None
+        return PhaseRecorder(self.backend, self._effective_image(), namespace)
+
+    def _admission_limiter(self):
+        """Return the shared limiter for this grader's backend target, if enabled."""
+        if not self.max_concurrency:
+            return None
+        if self.backend == _BACKEND_KUBERNETES:
+            key = (self.backend, self.kubeconfig, self.kube_context, self.namespace)
+        else:
+            key = (self.backend, self.docker_host)
+        return get_limiter(
+            key,
+            max_limit=self.max_concurrency,
+            latency_target=self.launch_latency_target,
+            max_queue=self.admission_queue_size,
+        )
+
+    def _submission_env(self, code):
+        """Return the env vars carrying ``code`` for the configured transport."""
+        if self.submission_transport == _TRANSPORT_STDIN:
+            return {}
+        if self.submission_transport == _TRANSPORT_COMPRESSED:
+            encoded = base64.b64encode(gzip.compress(code.encode("utf-8"), mtime=0)).decode("ascii")
+            if len(encoded) > _SUBMISSION_SIZE_LIMIT_BYTES:
+                raise ValueError(
+                    f"Compressed submission too large ({len(encoded)} bytes). "
+                    f"Maximum allowed size is {_SUBMISSION_SIZE_LIMIT_BYTES} bytes."
+                )
+            return {"SUBMISSION_CODE_GZ": encoded}
+        return {"SUBMISSION_CODE": code}
+
+    def _entrypoint_env(self, code, grader_config):
+        """Return the entrypoint's environment variables for one submission."""
+        env = {
+            **self._submission_env(code),
+            "GRADER_LANGUAGE": grader_config.get("lang", "en"),
+            "HIDE_OUTPUT": "1" if grader_config.get("hide_output") else "0",
+        }
+        if self.grader_isolation is not None:
+            env["GRADER_ISOLATION"] = self.grader_isolation
+        if grader_config.get("test_workers"):
+            env["GRADER_TEST_WORKERS"] = str(int(grader_config["test_workers"]))
+        if grader_config.get("fail_fast") is not None:
+            env["GRADER_FAIL_FAST"] = "1" if grader_config["fail_fast"] else "0"
+        return env
+
+    def _hedge_policy(self):
+        """Return the shared hedge policy for this grader's launch target, if enabled."""
+        if self.hedge_percentile is None:
+            return None
+        return get_hedge_policy(
+            (self.kubeconfig, self.kube_context, self.namespace, self.image),
+            percentile=self.hedge_percentile,
+            min_delay=self.hedge_min_delay,
+            min_samples=self.hedge_min_samples,
+            budget=self.hedge_budget,
+        )
 
     def _run(self, grader_path, code, seed, grader_config=None):
         """
@@ -292,12 +964,17 @@ class ContainerGrader(Grader):
         # vars contribute to the Pod object stored in etcd (~1.5 MB limit), and
         # can be used for resource-exhaustion attacks.
         code_bytes = len(code.encode("utf-8"))
-        if code_bytes > _SUBMISSION_SIZE_LIMIT_BYTES:
+        limit = _SUBMISSION_SIZE_LIMIT_BYTES
+        if self.submission_transport == _TRANSPORT_COMPRESSED and not self.batch_window:
+            # The encoded payload is checked against the size limit in
+            # _submission_env.
+            limit = _COMPRESSED_RAW_SIZE_LIMIT_BYTES
+        if code_bytes > limit:
             raise ValueError(
                 f"Submission too large ({code_bytes} bytes). "
-                f"Maximum allowed size is {_SUBMISSION_SIZE_LIMIT_BYTES} bytes."
+                f"Maximum allowed size is {limit} bytes."
             )
-        if code_bytes > _SUBMISSION_SIZE_WARN_BYTES:
+        if code_bytes > _SUBMISSION_SIZE_WARN_BYTES and self.submission_transport == _TRANSPORT_ENV:
             self.log.warning(
                 "Submission code is large (%d bytes). Very large submissions may "
                 "exceed Kubernetes API object size limits when passed via env var.",
@@ -305,51 +982,276 @@ class ContainerGrader(Grader):
             )
         if grader_config is None:
             grader_config = {}
+
+        if self.batch_window:
+            return self._get_batcher().submit(
+                BatchItem(str(grader_path), code, seed, grader_config)
+            )
+
         if self.backend == _BACKEND_KUBERNETES:
-            return self._run_kubernetes(grader_path, code, seed, grader_config)
-        return self._run_docker(grader_path, code, seed, grader_config)
+            run_backend = self._run_kubernetes
+        elif self.backend == _BACKEND_PROCESS:
+            run_backend = self._run_process
+        else:
+            run_backend = self._run_docker
+        return self._launch(run_backend, grader_path, code, seed, grader_config)
 
-    def _run_kubernetes(self, grader_path, code, seed, grader_config):
-        """Create a Kubernetes Job, wait for it, collect stdout, delete it."""
-        from kubernetes import client as k8s_client  # noqa: F401 — needed for V1DeleteOptions
+    def _launch(self, run_backend, *args):
+        """Call ``run_backend(*args)`` under admission control, if enabled.
 
-        batch_v1, core_v1 = self._get_k8s_clients()
+        How long the backend took, excluding the admission wait, is left in
+        ``self._launch_timing.seconds`` for this thread.
+        """
+        limiter = self._admission_limiter()
+        if limiter is None:
+            started = time.monotonic()
+            try:
+                return run_backend(*args)
+            finally:
+                self._launch_timing.seconds = time.monotonic() - started
+
+        # Wait no longer than a grade may take; AdmissionRejected surfaces to
+        # grade() as an ordinary grading failure.
+        limiter.acquire(timeout=self.timeout)
+        launch = _Launch()
+        try:
+            return run_backend(*args, launch=launch)
+        finally:
+            self._launch_timing.seconds = time.monotonic() - launch.requested
+            # Only a launch that never got running (API, quota, scheduling or
+            # image pull errors) signals congestion.  Timeouts, OOM kills and
+            # crashes after that are the submission's doing.
+            limiter.release(launch.latency, error=launch.running_at is None)
+
+    def _get_batcher(self):
+        """Return the micro-batcher shared by graders with this configuration."""
+        key = (
+            self.kubeconfig, self.kube_context, self.namespace, self.image,
+            self.cpu_limit, self.memory_limit, self.timeout, self.batch_parallelism,
+        )
+        return get_batcher(
+            key,
+            run_batch=self._run_batch,
+            window=self.batch_window,
+            max_size=self.batch_max_size,
+            max_bytes=_BATCH_MAX_BYTES,
+            # Admission wait plus the deadline of a full batch.
+            timeout=self.timeout + self._batch_deadline(self.batch_max_size),
+        )
 
+    def _batch_deadline(self, count):
+        """Return the Job deadline, in seconds, for a batch of ``count`` submissions."""
+        rounds = math.ceil(count / self.batch_parallelism)
+        # One timeout per sequential round, plus one for pod start-up.
+        return self.timeout * (rounds + 1)
+
+    def _run_batch(self, items):
+        """Grade ``items`` in one Kubernetes Job; return per-item output bytes or exceptions."""
+        return self._launch(self._run_kubernetes_batch, items)
+
+    def _run_kubernetes(self, grader_path, code, seed, grader_config, launch=None):
+        """Create a Kubernetes Job for one submission and return its stdout."""
         job_name = f"xqueue-grader-{uuid.uuid4().hex[:12]}"
+        fields = self._k8s_job_fields(grader_path, code, seed, grader_config)
+        job_manifest = self._render_k8s_job(job_name, **fields)
+        return self._run_k8s_job(
+            job_name, job_manifest, fields["active_deadline_seconds"], launch
+        )
 
-        job_manifest = self._build_k8s_job(job_name, grader_path, code, seed, grader_config)
+    def _run_kubernetes_batch(self, items, launch=None):
+        """Create one Job grading every item and demultiplex its results.
 
+        The batch entrypoint prints a single JSON line ``{"batch": [...]}``
+        holding, per submission id, either the grade ``result`` or an
+        ``error`` string.
+        """
+        job_name = f"xqueue-grader-{uuid.uuid4().hex[:12]}"
+        deadline = self._batch_deadline(len(items))
+        job_manifest = self._render_k8s_job(
+            job_name, **self._k8s_batch_job_fields(items, deadline)
+        )
+        output = self._run_k8s_job(job_name, job_manifest, deadline, launch)
+
+        entries = {entry.get("id"): entry for entry in json.loads(output)["batch"]}
+        results = []
+        for index in range(len(items)):
+            entry = entries.get(index)
+            if entry is None:
+                results.append(RuntimeError(f"No result for submission {index} of batch Job {job_name}."))
+            elif "error" in entry:
+                results.append(RuntimeError(f"Batch Job {job_name}: {entry['error']}"))
+            else:
+                results.append(json.dumps(entry["result"]).encode("utf-8"))
+        return results
+
+    def _run_k8s_job(self, job_name, job_manifest, timeout, launch=None):
+        """Create a Job, wait for it and return the last line of its output.
+
+        The Job is handed to the namespace's ``JobReaper`` for deletion once
+        this method returns, so cleanup never delays the grade.  With
+        ``k8s_async`` the whole run happens on the async backend's loop; only
+        the reaper uses the blocking client.
+        """
+        phases = self._phase_recorder()
+        if self.k8s_async:
+            reaper = _get_job_reaper(self._get_k8s_clients()[0], self.namespace)
+            pod_name, output = get_async_backend(
+                self.kubeconfig, self.kube_context, self.api_pool_size
+            ).run_job_sync(
+                self.namespace,
+                job_name,
+                job_manifest,
+                timeout,
+                on_running=launch.mark_running if launch is not None else None,
+                phases=phases,
+                reap=reaper.submit,
+            )
+            return _last_output_line(output, pod_name)
+
+        batch_v1, core_v1 = self._get_k8s_clients()
+        policy = self._hedge_policy()
+        hedge = None
         try:
-            batch_v1.create_namespaced_job(namespace=self.namespace, body=job_manifest)
+            with phases.timed("api_create"):
+                batch_v1.create_namespaced_job(namespace=self.namespace, body=job_manifest)
             self.log.debug("Created Job %s", job_name)
+            if policy is not None:
+                policy.record_launch()
+                hedge = _K8sHedge(policy, job_manifest)
 
             stdout = self._wait_and_collect_k8s(
-                batch_v1, core_v1, job_name, timeout=self.timeout
+                batch_v1, core_v1, job_name, timeout=timeout, launch=launch, phases=phases,
+                hedge=hedge,
             )
             return stdout
         finally:
-            try:
-                batch_v1.delete_namespaced_job(
-                    name=job_name,
-                    namespace=self.namespace,
-                    body=k8s_client.V1DeleteOptions(propagation_policy="Foreground"),
-                )
-            except Exception:
-                self.log.warning("Failed to delete Job %s", job_name, exc_info=True)
+            # Deleting the losing copy of a hedged Job cancels it.
+            reaper = _get_job_reaper(batch_v1, self.namespace)
+            reaper.submit(job_name)
+            if hedge is not None and hedge.job_name is not None:
+                reaper.submit(hedge.job_name)
 
     def _build_k8s_job(self, job_name, grader_path, code, seed, grader_config=None):
         """Return a kubernetes Job manifest for the given grading run."""
-        from kubernetes import client as k8s_client
+        return self._k8s_job_manifest(
+            job_name, **self._k8s_job_fields(grader_path, code, seed, grader_config)
+        )
+
+    def _build_k8s_batch_job(self, job_name, items, active_deadline_seconds):
+        """Return a Job manifest that grades every item of a micro-batch."""
+        return self._k8s_job_manifest(
+            job_name, **self._k8s_batch_job_fields(items, active_deadline_seconds)
+        )
 
+    def _k8s_job_fields(self, grader_path, code, seed, grader_config=None):
+        """Return the ``_k8s_job_manifest`` arguments for one grading run."""
         if grader_config is None:
             grader_config = {}
 
         # The entrypoint takes: GRADER_FILE SEED
         # The grader scripts are baked into the course-specific image at grader_path.
-        # working_dir must stay at /grader (the WORKDIR of the base image) so that
-        # `python -m grader_support.entrypoint` can locate the grader_support package.
         grader_abs = str(grader_path)
 
+        fields = {
+            "args": [grader_abs, str(seed)],
+            "env": self._entrypoint_env(code, grader_config),
+            "active_deadline_seconds": self.timeout,
+            "cpu_limit": self.cpu_limit,
+            "memory_limit": self.memory_limit,
+        }
+        if self.profile_mode == "apply":
+            learned = self._grader_recommendation(grader_path)
+            if learned is not None:
+                fields.update(
+                    active_deadline_seconds=learned.timeout,
+                    cpu_limit=learned.cpu_limit,
+                    memory_limit=learned.memory_limit,
+                    cpu_request=learned.cpu_request,
+                    memory_request=learned.memory_request,
+                )
+        return fields
+
+    def _k8s_batch_job_fields(self, items, active_deadline_seconds):
+        """Return the ``_k8s_job_manifest`` arguments for a micro-batch."""
+        batch = [
+            {
+                "id": index,
+                "grader": item.grader_path,
+                "seed": str(item.seed),
+                "code": item.code,
+                "lang": item.grader_config.get("lang", "en"),
+                "hide_output": bool(item.grader_config.get("hide_output")),
+                "test_workers": int(item.grader_config.get("test_workers") or 0),
+                "fail_fast": item.grader_config.get("fail_fast"),
+            }
+            for index, item in enumerate(items)
+        ]
+        p = self.batch_parallelism
+        env = {
+            "SUBMISSION_BATCH": json.dumps(batch),
+            "BATCH_PARALLELISM": str(p),
+            "BATCH_ITEM_TIMEOUT": str(self.timeout),
+        }
+        if self.grader_isolation is not None:
+            # Inherited by the per-submission entrypoint processes.
+            env["GRADER_ISOLATION"] = self.grader_isolation
+        return {
+            "args": ["--batch"],
+            "env": env,
+            "active_deadline_seconds": active_deadline_seconds,
+            "cpu_limit": f"{int(_parse_cpu_millis(self.cpu_limit) * p)}m",
+            "memory_limit": str(_parse_memory_bytes(self.memory_limit) * p),
+        }
+
+    def _render_k8s_job(self, job_name, args, env, active_deadline_seconds, cpu_limit, memory_limit,
+                        cpu_request=_DEFAULT_CPU_REQUEST, memory_request=_DEFAULT_MEMORY_REQUEST):
+        """Return the Job for one run as a plain dict ready to send to the API.
+
+        Everything except the Job name, image, args and env is identical for
+        every run with the same deadline and limits, so that part is built and
+        serialized once per configuration and cached on the instance.  Each
+        run copies only the dicts on the path to the fields it patches; the
+        rest of the template is shared and must never be mutated.
+        """
+        key = (active_deadline_seconds, cpu_limit, memory_limit, cpu_request, memory_request)
+        template = self._job_templates.get(key)
+        if template is None:
+            template = _serialize_k8s(
+                self._k8s_job_manifest(
+                    "", [], {}, active_deadline_seconds, cpu_limit, memory_limit,
+                    cpu_request, memory_request,
+                )
+            )
+            if len(self._job_templates) >= _JOB_TEMPLATE_CACHE_SIZE:
+                # Learned profiles shift over time; drop the oldest template.
+                self._job_templates.pop(next(iter(self._job_templates)), None)
+            self._job_templates[key] = template
+
+        metadata = dict(template["metadata"])
+        metadata["name"] = job_name
+        metadata["labels"] = {**metadata["labels"], _JOB_NAME_LABEL: job_name}
+
+        pod_template = dict(template["spec"]["template"])
+        pod_spec = dict(pod_template["spec"])
+        container = dict(pod_spec["containers"][0])
+        container["image"] = self._effective_image()
+        container["args"] = list(args)
+        container["env"] = [{"name": name, "value": value} for name, value in env.items()]
+        pod_spec["containers"] = [container]
+        pod_template["spec"] = pod_spec
+
+        job = dict(template)
+        job["metadata"] = metadata
+        job["spec"] = {**template["spec"], "template": pod_template}
+        return job
+
+    def _k8s_job_manifest(self, job_name, args, env, active_deadline_seconds, cpu_limit, memory_limit,
+                          cpu_request=_DEFAULT_CPU_REQUEST, memory_request=_DEFAULT_MEMORY_REQUEST):
+        """Build the grading Job object shared by single and batch runs."""
+        from kubernetes import client as k8s_client
+
+        # working_dir must stay at /grader (the WORKDIR of the base image) so that
+        # `python -m grader_support.entrypoint` can locate the grader_support package.
         return k8s_client.V1Job(
             api_version="batch/v1",
             kind="Job",
@@ -358,11 +1260,12 @@ class ContainerGrader(Grader):
                 labels={
                     "app.kubernetes.io/component": "xqueue-grader",
                     "app.kubernetes.io/managed-by": "xqueue-watcher",
+                    _JOB_NAME_LABEL: job_name,
                 },
             ),
             spec=k8s_client.V1JobSpec(
                 backoff_limit=0,
-                active_deadline_seconds=self.timeout,
+                active_deadline_seconds=active_deadline_seconds,
                 ttl_seconds_after_finished=300,
                 template=k8s_client.V1PodTemplateSpec(
                     metadata=k8s_client.V1ObjectMeta(
@@ -384,37 +1287,26 @@ class ContainerGrader(Grader):
                         # Grader scripts are baked into the course-specific image
                         # (no volume mount required).  The image extends
                         # grader_support/Dockerfile.base and includes the grader
-                        # files at the path referenced by grader_abs.
+                        # files at the paths passed in args.
                         containers=[
                             k8s_client.V1Container(
                                 name="grader",
                                 image=self._effective_image(),
                                 image_pull_policy=self.image_pull_policy,
-                                # entrypoint signature: GRADER_FILE SEED
-                                args=[grader_abs, str(seed)],
+                                args=args,
                                 working_dir="/grader",
                                 env=[
-                                    k8s_client.V1EnvVar(
-                                        name="SUBMISSION_CODE",
-                                        value=code,
-                                    ),
-                                    k8s_client.V1EnvVar(
-                                        name="GRADER_LANGUAGE",
-                                        value=grader_config.get("lang", "en"),
-                                    ),
-                                    k8s_client.V1EnvVar(
-                                        name="HIDE_OUTPUT",
-                                        value="1" if grader_config.get("hide_output") else "0",
-                                    ),
+                                    k8s_client.V1EnvVar(name=name, value=value)
+                                    for name, value in env.items()
                                 ],
                                 resources=k8s_client.V1ResourceRequirements(
                                     limits={
-                                        "cpu": self.cpu_limit,
-                                        "memory": self.memory_limit,
+                                        "cpu": cpu_limit,
+                                        "memory": memory_limit,
                                     },
                                     requests={
-                                        "cpu": "100m",
-                                        "memory": "64Mi",
+                                        "cpu": cpu_request,
+                                        "memory": memory_request,
                                     },
                                 ),
                                 security_context=k8s_client.V1SecurityContext(
@@ -435,8 +1327,9 @@ class ContainerGrader(Grader):
                         ],
                         volumes=[
                             # emptyDir at /tmp is required because read_only_root_filesystem=True
-                            # prevents writes to the root FS; the entrypoint writes the student
-                            # submission to /tmp/submission.py before executing it.
+                            # prevents writes to the root FS.  The entrypoint imports the
+                            # submission from memory, but grader code, student code and
+                            # GRADER_SOURCE_FILES=1 may still write there.
                             k8s_client.V1Volume(
                                 name="tmp",
                                 empty_dir=k8s_client.V1EmptyDirVolumeSource(
@@ -449,27 +1342,78 @@ class ContainerGrader(Grader):
             ),
         )
 
-    def _wait_and_collect_k8s(self, batch_v1, core_v1, job_name, timeout):
-        """Poll until the Job completes, then return its pod's stdout bytes."""
+    def _k8s_job_failure(self, core_v1, job_name, job):
+        """Return the exception for a failed grading Job, telling timeouts and OOM kills apart."""
+        try:
+            pods = core_v1.list_namespaced_pod(
+                namespace=self.namespace, label_selector=f"job-name={job_name}"
+            ).items
+        except Exception:
+            self.log.debug("Could not list the pods of failed Job %s", job_name, exc_info=True)
+            pods = []
+        return job_failure(job_name, job, pods)
+
+    def _wait_and_collect_k8s(self, batch_v1, core_v1, job_name, timeout, launch=None,
+                              phases=None, hedge=None):
+        """Poll until the Job completes, then return its pod's stdout bytes.
+
+        If ``launch`` is given it is marked running the first time the Job
+        reports a ready (running) or succeeded pod.  If ``phases`` is given,
+        the Job's lifecycle phases are recorded on it.  With a ``_K8sHedge``,
+        a copy of the Job is launched if it has not started by the hedge's
+        deadline, and the output of whichever copy succeeds first is returned.
+        """
         deadline = time.monotonic() + timeout
+        # Job name -> when it was created, for every copy still in the running.
+        candidates = {job_name: time.monotonic()}
+        failed = {}
+        started = False
+        winner = None
         while time.monotonic() < deadline:
-            job = batch_v1.read_namespaced_job(name=job_name, namespace=self.namespace)
-            if job.status.succeeded:
+            for name, created in list(candidates.items()):
+                job = batch_v1.read_namespaced_job(name=name, namespace=self.namespace)
+                if job.status.ready or job.status.succeeded:
+                    if launch is not None:
+                        launch.mark_running()
+                    if not started and hedge is not None:
+                        hedge.policy.record_startup(time.monotonic() - created)
+                    started = True
+                if job.status.succeeded:
+                    winner = name
+                    break
+                if job.status.failed:
+                    del candidates[name]
+                    failed[name] = job
+            if winner is not None:
                 break
-            if job.status.failed:
-                raise RuntimeError(f"Grading Job {job_name} failed.")
+            if not candidates:
+                raise self._k8s_job_failure(core_v1, job_name, failed[job_name])
+            if hedge is not None and hedge.due():
+                hedge.launch_at = None
+                if not started and hedge.policy.try_hedge():
+                    hedge.job_name = f"{job_name}-h"
+                    batch_v1.create_namespaced_job(
+                        namespace=self.namespace, body=hedge.manifest(hedge.job_name, job_name)
+                    )
+                    candidates[hedge.job_name] = time.monotonic()
+                    self.log.info(
+                        "Grading Job %s has not started; launched hedge %s", job_name, hedge.job_name
+                    )
             time.sleep(1)
         else:
-            raise RuntimeError(
+            raise GradingTimeout(
                 f"Grading Job {job_name} exceeded timeout of {timeout}s."
             )
+        if hedge is not None and hedge.job_name is not None:
+            hedge.policy.record_winner(hedged=winner == hedge.job_name)
+        finished_seen = time.monotonic()
 
         pods = core_v1.list_namespaced_pod(
             namespace=self.namespace,
-            label_selector=f"job-name={job_name}",
+            label_selector=f"job-name={winner}",
         )
         if not pods.items:
-            raise RuntimeError(f"No pods found for Job {job_name}.")
+            raise RuntimeError(f"No pods found for Job {winner}.")
 
         pod_name = pods.items[0].metadata.name
         # The Kubernetes Python client deserializes the log response body via
@@ -483,23 +1427,16 @@ class ContainerGrader(Grader):
             container="grader",
             _preload_content=False,
         )
-        log = raw.data.decode("utf-8")
-        # Scan backwards to find the last non-empty line (the JSON result).
-        # Earlier lines may be stderr interleaved by the Kubernetes log API.
-        json_line = None
-        for line in reversed(log.splitlines()):
-            stripped = line.strip()
-            if stripped:
-                json_line = stripped
-                break
-        if not json_line:
-            raise RuntimeError(f"No output from grading pod {pod_name}.")
-        return json_line.encode("utf-8")
+        output = raw.data.decode("utf-8")
+        if phases is not None:
+            phases.record("collect", time.monotonic() - finished_seen)
+            record_k8s_phases(phases, job, pods.items[0])
+        return _last_output_line(output, pod_name)
 
-    def _run_docker(self, grader_path, code, seed, grader_config=None):
+    def _run_docker(self, grader_path, code, seed, grader_config=None, launch=None):
         """Run a local Docker container and return stdout bytes."""
         try:
-            import docker as docker_sdk
+            import docker
         except ImportError:
             raise RuntimeError(
                 "The 'docker' package is required for the docker backend. "
@@ -528,59 +1465,98 @@ class ContainerGrader(Grader):
         else:
             host_grader_dir = grader_dir
 
-        env = {
-            "SUBMISSION_CODE": code,
-            "GRADER_LANGUAGE": grader_config.get("lang", "en"),
-            "HIDE_OUTPUT": "1" if grader_config.get("hide_output") else "0",
-        }
-
-        client = docker_sdk.from_env()
+        env = self._entrypoint_env(code, grader_config)
+        stdin = self.submission_transport == _TRANSPORT_STDIN
+
+        client = self._get_docker_client()
+        events = get_container_events(self.docker_host, client)
+        phases = self._phase_recorder()
+        image = self._effective_image()
+        create_kwargs = dict(
+            image=image,
+            # entrypoint signature: GRADER_FILE SEED
+            command=[container_grader_path, str(seed)],
+            working_dir="/grader",
+            environment=env,
+            labels={MANAGED_LABEL: "true"},
+            volumes={host_grader_dir: {"bind": "/graders", "mode": "ro"}},
+            mem_limit=_parse_memory_bytes(self.memory_limit),
+            nano_cpus=int(_parse_cpu_millis(self.cpu_limit) * 1_000_000),
+            network_disabled=True,
+            read_only=True,
+            # Without detach, stdin_open also sets StdinOnce: the container's
+            # stdin closes once the attached socket below is closed.
+            stdin_open=stdin,
+        )
+        # Create first and register with the shared events stream before
+        # starting, so the container's exit cannot be missed.
         try:
-            # Run detached so we can enforce a wall-clock timeout via container.wait().
-            # containers.run() does not accept a timeout argument; using detach=True
-            # lets us call container.wait(timeout=...) to cap execution time.
-            container = client.containers.run(
-                image=self._effective_image(),
-                # entrypoint signature: GRADER_FILE SEED
-                command=[container_grader_path, str(seed)],
-                working_dir="/grader",
-                environment=env,
-                volumes={host_grader_dir: {"bind": "/graders", "mode": "ro"}},
-                mem_limit=_parse_memory_bytes(self.memory_limit),
-                nano_cpus=int(_parse_cpu_millis(self.cpu_limit) * 1_000_000),
-                network_disabled=True,
-                read_only=True,
-                detach=True,
-                stdout=True,
-                stderr=False,
-            )
+            with phases.timed("api_create"):
+                container = client.containers.create(**create_kwargs)
+        except docker.errors.ImageNotFound:
+            # Unlike containers.run, create does not pull a missing image.
+            self.log.info("Image %s not found locally; pulling it", image)
+            with phases.timed("pull"):
+                client.images.pull(image)
+            with phases.timed("api_create"):
+                container = client.containers.create(**create_kwargs)
+        events.expect(container.id)
+        sock = None
+        try:
+            if stdin:
+                # Attach before starting so the entrypoint sees all of the code.
+                sock = client.api.attach_socket(container.id, params={"stdin": 1, "stream": 1})
+            container.start()
+            if stdin:
+                _send_stdin(sock, code.encode("utf-8"))
+            if launch is not None:
+                launch.mark_running()
             try:
-                exit_info = container.wait(timeout=self.timeout)
-                if exit_info.get("StatusCode", 0) != 0:
-                    stderr = container.logs(stdout=False, stderr=True)
-                    raise RuntimeError(
-                        f"Grading container exited with non-zero status: {exit_info}. "
-                        f"stderr: {stderr[:2000] if stderr else ''}"
-                    )
+                exit_info = events.wait(container.id, timeout=self.timeout)
+            except TimeoutError as exc:
+                raise GradingTimeout(
+                    f"Grading container timed out after {self.timeout}s."
+                ) from exc
+            # Inspect once for the Created/StartedAt/FinishedAt phase timestamps.
+            try:
+                container.reload()
+                record_docker_phases(phases, container.attrs)
+            except Exception:
+                self.log.debug("Could not inspect container %s", container.id, exc_info=True)
+            # One logs call per grade: stdout on success, stderr otherwise.
+            if exit_info["StatusCode"] != 0:
+                stderr = container.logs(stdout=False, stderr=True)
+                oom = exit_info["OOMKilled"]
+                reason = " (killed: out of memory)" if oom else ""
+                raise (GradingOutOfMemory if oom else RuntimeError)(
+                    f"Grading container exited with non-zero status: {exit_info}{reason}. "
+                    f"stderr: {stderr[:2000] if stderr else ''}"
+                )
+            with phases.timed("collect"):
                 result = container.logs(stdout=True, stderr=False)
-            except Exception as exc:
-                # Catch ReadTimeout (requests.exceptions.ReadTimeout) from container.wait()
-                # and any other unexpected error, converting to a clear RuntimeError.
-                exc_name = type(exc).__name__
-                if "Timeout" in exc_name or "timeout" in str(exc).lower():
-                    raise RuntimeError(
-                        f"Grading container timed out after {self.timeout}s."
-                    ) from exc
-                raise
-            finally:
+        finally:
+            if sock is not None:
+                sock.close()
+            events.discard(container.id)
+            with phases.timed("cleanup"):
                 container.remove(force=True)
-        except docker_sdk.errors.ContainerError as exc:
-            raise RuntimeError(
-                f"Grading container exited with error: {exc}"
-            ) from exc
 
         return result if isinstance(result, bytes) else result.encode("utf-8")
 
+    def _run_process(self, grader_path, code, seed, grader_config=None, launch=None):
+        """Run the entrypoint in a local sandboxed subprocess and return stdout bytes."""
+        if grader_config is None:
+            grader_config = {}
+        return process_sandbox.run_entrypoint(
+            grader_path,
+            seed,
+            env=self._entrypoint_env(code, grader_config),
+            timeout=self.timeout,
+            memory_bytes=_parse_memory_bytes(self.memory_limit),
+            on_started=launch.mark_running if launch is not None else None,
+            stdin=code.encode("utf-8") if self.submission_transport == _TRANSPORT_STDIN else None,
+        )
+
     # ------------------------------------------------------------------
     # Public grading interface
     # ------------------------------------------------------------------
@@ -616,8 +1592,26 @@ class ContainerGrader(Grader):
 
         seed = str(random.randint(0, 20000))
 
+        self._launch_timing.seconds = None
         try:
-            output = self._run(grader_path, submission, seed, grader_config)
+            try:
+                output = self._run(grader_path, submission, seed, grader_config)
+            except AdmissionRejected:
+                # Never launched: nothing to learn.
+                raise
+            except GradingTimeout:
+                # Count the run against the deadline it hit, pushing it up.
+                self._record_profile(grader_path, self._applied_limits(grader_path)[0], None)
+                raise
+            except GradingOutOfMemory:
+                self._record_profile(
+                    grader_path, self._run_seconds(None), None,
+                    rss=self._applied_limits(grader_path)[1],
+                )
+                raise
+            except RuntimeError:
+                self._record_profile(grader_path, self._run_seconds(None), None)
+                raise
             self.log.debug(
                 "Raw container output (%d bytes) for grader %s: %r",
                 len(output),
@@ -625,6 +1619,9 @@ class ContainerGrader(Grader):
                 output[:4096],
             )
             grade_result = json.loads(output.decode("utf-8"))
+            diagnostics = grade_result.pop("diagnostics", None)
+            self._record_diagnostics(grader_path, diagnostics)
+            self._record_profile(grader_path, self._run_seconds(diagnostics), diagnostics)
             return grade_result
         except json.JSONDecodeError:
             self.log.error(
@@ -646,6 +1643,88 @@ class ContainerGrader(Grader):
             return results
 
 
+    def _grader_recommendation(self, grader_path):
+        """Return the learned settings for ``grader_path``, or None if not yet known."""
+        return recommend(
+            self._profiles.samples(grader_path), self._profile_bounds, self.profile_min_samples
+        )
+
+    def _run_seconds(self, diagnostics):
+        """Return how long this thread's grading run took, or None if unknown.
+
+        A run is timed by ``_launch``, without the admission wait.  A
+        micro-batched submission shares its Job with others, so only its own
+        runs' diagnostics count.
+        """
+        if not self.batch_window:
+            return self._launch_timing.seconds
+        if isinstance(diagnostics, dict):
+            walls = [
+                usage.get("wall_seconds", 0) for usage in diagnostics.values()
+                if isinstance(usage, dict)
+            ]
+            if walls:
+                return sum(walls)
+        return None
+
+    def _applied_limits(self, grader_path):
+        """Return the (timeout seconds, memory bytes) a run of ``grader_path`` gets."""
+        if self.profile_mode == "apply" and not self.batch_window:
+            learned = self._grader_recommendation(grader_path)
+            if learned is not None:
+                return learned.timeout, _parse_memory_bytes(learned.memory_limit)
+        return self.timeout, _parse_memory_bytes(self.memory_limit)
+
+    def _record_profile(self, grader_path, elapsed, diagnostics, rss=None):
+        """Add a grading run to the grader's profile and report changed recommendations."""
+        if self._profiles is None or elapsed is None:
+            return
+        self._profiles.record(grader_path, elapsed, diagnostics, rss)
+        learned = self._grader_recommendation(grader_path)
+        if learned is None:
+            return
+        settings = (
+            learned.timeout, learned.cpu_request, learned.cpu_limit,
+            learned.memory_request, learned.memory_limit,
+        )
+        # Only log when the settings change, not on every new sample.
+        if self._reported_profiles.get(str(grader_path)) == settings:
+            return
+        self._reported_profiles[str(grader_path)] = settings
+        self.log.info(
+            "Grader profile for %s (%d runs): %s timeout=%ss cpu=%s/%s memory=%s/%s "
+            "(configured timeout=%ss cpu=%s/%s memory=%s/%s)",
+            grader_path,
+            learned.samples,
+            "applying" if self.profile_mode == "apply" else "would apply",
+            learned.timeout,
+            learned.cpu_request,
+            learned.cpu_limit,
+            learned.memory_request,
+            learned.memory_limit,
+            self.timeout,
+            _DEFAULT_CPU_REQUEST,
+            self.cpu_limit,
+            _DEFAULT_MEMORY_REQUEST,
+            self.memory_limit,
+        )
+
+    def _record_diagnostics(self, grader_path, diagnostics):
+        """Export the entrypoint's per-run resource usage as per-grader metrics."""
+        if not isinstance(diagnostics, dict):
+            return
+        for run, usage in diagnostics.items():
+            if not isinstance(usage, dict):
+                continue
+            attributes = {"grader": str(grader_path), "run": run, "backend": self.backend}
+            for key, histogram in (
+                ("wall_seconds", _metrics.grader_wall_time_histogram),
+                ("cpu_seconds", _metrics.grader_cpu_time_histogram),
+                ("peak_rss_bytes", _metrics.grader_peak_rss_histogram),
+            ):
+                if isinstance(usage.get(key), (int, float)):
+                    histogram.record(usage[key], attributes)
+
 
 def _parse_cpu_millis(cpu_str):
     """Convert a Kubernetes CPU string like '500m' or '1' to a float of millicores."""
@@ -0,0 +1,177 @@
+"""
+Container completion notifications from a shared Docker events stream.
+
+Waiting on a grading container with ``container.wait()`` holds one blocking
+HTTP connection to the Docker daemon per in-flight grade.  Instead, every
+container the docker backend launches carries the :data:`MANAGED_LABEL`
+label, and one :class:`ContainerEvents` per daemon follows the daemon's
+``/events`` stream filtered to that label.  ``die`` and ``oom`` events are
+dispatched to whichever grading thread registered interest in the container,
+so any number of in-flight grades share a single long-lived connection.
+
+The stream is first opened from the daemon's own clock at start-up (its
+``/info`` ``SystemTime``), so exits are not lost when the watcher's clock
+differs from the daemon's.  If the stream drops it is re-opened from the time
+of the last event seen, so exits that happen while reconnecting are replayed
+rather than lost.
+"""
+
+import datetime
+import logging
+import re
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Label set on every grading container started by the docker backend.
+MANAGED_LABEL = "xqueue-watcher.managed"
+
+_RECONNECT_DELAY = 1.0
+_MAX_RECONNECT_DELAY = 30.0
+
+# RFC 3339 with up to nanoseconds, as the daemon reports SystemTime.
+_SYSTEM_TIME = re.compile(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:\d\d)")
+
+
+def _daemon_time(client) -> float | None:
+    """Return the daemon's current time as a Unix timestamp, or None."""
+    try:
+        match = _SYSTEM_TIME.fullmatch(client.info()["SystemTime"])
+    except Exception:
+        log.warning("Could not read the Docker daemon's time", exc_info=True)
+        return None
+    if match is None:
+        return None
+    seconds, fraction, offset = match.groups()
+    moment = datetime.datetime.fromisoformat(seconds + ("+00:00" if offset == "Z" else offset))
+    return moment.timestamp() + float(fraction or 0)
+
+
+class _Waiter:
+    def __init__(self) -> None:
+        self.oom_killed = False
+        self.exit_code: int | None = None
+        self.done = threading.Event()
+
+
+class ContainerEvents:
+    """
+    Follows one daemon's container events and reports container exits.
+
+    Call :meth:`expect` with a container ID *before* starting the container,
+    then :meth:`wait` for its exit; :meth:`discard` drops interest in it.
+    """
+
+    def __init__(self, name: str, client) -> None:
+        self.name = name
+        self._client = client
+        self._lock = threading.Lock()
+        self._waiters: dict[str, _Waiter] = {}
+        # Events are requested from construction time onwards, so a container
+        # that exits before the stream is first opened is still reported.  The
+        # daemon's clock, not ours, dates its events; without it the stream
+        # starts whenever it is opened.
+        self._since = _daemon_time(client)
+        self._stream = None
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._follow, name=f"docker-events-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def expect(self, container_id: str) -> None:
+        """Start collecting events for ``container_id``."""
+        with self._lock:
+            self._waiters.setdefault(container_id, _Waiter())
+
+    def discard(self, container_id: str) -> None:
+        with self._lock:
+            self._waiters.pop(container_id, None)
+
+    def wait(self, container_id: str, timeout: float) -> dict:
+        """Block until ``container_id`` exits and return its exit status.
+
+        Returns ``{"StatusCode": int, "OOMKilled": bool}``, the same shape as
+        the relevant parts of ``container.wait()``.  Raises ``TimeoutError``
+        if the container has not exited within ``timeout`` seconds.
+        """
+        with self._lock:
+            waiter = self._waiters.get(container_id)
+        if waiter is None:
+            raise KeyError(f"Container {container_id} was not registered with expect().")
+        if not waiter.done.wait(timeout):
+            raise TimeoutError(f"Container {container_id} did not exit within {timeout}s.")
+        return {"StatusCode": waiter.exit_code, "OOMKilled": waiter.oom_killed}
+
+    def close(self) -> None:
+        """Stop following events.  Intended for tests and shutdown."""
+        self._closed = True
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+
+    def _follow(self) -> None:
+        delay = _RECONNECT_DELAY
+        while not self._closed:
+            try:
+                self._stream = self._client.api.events(
+                    since=self._since,
+                    decode=True,
+                    filters={
+                        "type": "container",
+                        "event": ["die", "oom"],
+                        "label": [f"{MANAGED_LABEL}=true"],
+                    },
+                )
+                delay = _RECONNECT_DELAY
+                for event in self._stream:
+                    self._dispatch(event)
+                if not self._closed:
+                    log.warning("Docker events stream for %s ended; reconnecting", self.name)
+            except Exception:
+                if self._closed:
+                    break
+                log.warning(
+                    "Docker events stream for %s failed; reconnecting in %.0fs",
+                    self.name, delay, exc_info=True,
+                )
+            if not self._closed:
+                time.sleep(delay)
+                delay = min(delay * 2, _MAX_RECONNECT_DELAY)
+
+    def _dispatch(self, event: dict) -> None:
+        if "timeNano" in event:
+            self._since = event["timeNano"] / 1e9
+        elif "time" in event:
+            self._since = float(event["time"])
+        actor = event.get("Actor") or {}
+        container_id = actor.get("ID") or event.get("id")
+        action = event.get("Action") or event.get("status")
+        with self._lock:
+            waiter = self._waiters.get(container_id)
+        if waiter is None:
+            return
+        if action == "oom":
+            waiter.oom_killed = True
+        elif action == "die":
+            try:
+                waiter.exit_code = int((actor.get("Attributes") or {}).get("exitCode", 0))
+            except ValueError:
+                waiter.exit_code = -1
+            waiter.done.set()
+
+
+_watchers: dict[str | None, ContainerEvents] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_container_events(base_url, client) -> ContainerEvents:
+    """Return the process-wide events follower for the daemon at ``base_url``."""
+    with _watchers_lock:
+        watcher = _watchers.get(base_url)
+        if watcher is None:
+            watcher = _watchers[base_url] = ContainerEvents(
+                base_url or "default", client
+            )
+        return watcher
@@ -41,6 +41,10 @@ XQWATCHER_SUBMISSION_SIZE_LIMIT
     Submissions larger than this value are rejected before a grading container
     is launched.  Prevents etcd object-size overflows and resource-exhaustion
     attacks via very large environment variables.
+XQWATCHER_COMPRESSED_SUBMISSION_RAW_LIMIT
+    Maximum uncompressed submission size in bytes with the ``compressed``
+    submission transport, whose encoded payload is held to
+    ``XQWATCHER_SUBMISSION_SIZE_LIMIT`` (integer, default 8 times that limit).
 
 Named XQueue server references (Kubernetes)
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -89,7 +93,7 @@ them in every conf.d queue JSON file.  Individual queue configs may still
 override any of these values in their ``KWARGS`` block.
 
 XQWATCHER_GRADER_BACKEND
-    Container backend: ``kubernetes`` (default) or ``docker``.
+    Container backend: ``kubernetes`` (default), ``docker`` or ``process``.
 XQWATCHER_GRADER_NAMESPACE
     Kubernetes namespace in which grading Jobs are created (default:
     ``default``).  Ignored by the Docker backend.
@@ -110,6 +114,10 @@ XQWATCHER_DOCKER_HOST_GRADER_ROOT
     watcher container, set this to the absolute host path of ``./data``
     (e.g. ``/home/user/project/data``).  Unset by default (watcher runs
     directly on the host).
+XQWATCHER_GRADER_API_POOL_SIZE
+    HTTP connection pool size of the Kubernetes / Docker API client shared by
+    every ContainerGrader in the process (integer, default 32).  Size it to at
+    least the total number of queue ``CONNECTIONS`` using container graders.
 """
 
 import logging
@@ -253,4 +261,5 @@ def get_container_grader_defaults() -> dict:
         "memory_limit": _get_str(f"{_PREFIX}GRADER_MEMORY_LIMIT", "256Mi"),
         "timeout": _get_int(f"{_PREFIX}GRADER_TIMEOUT", 20),
         "docker_host_grader_root": _get_str(f"{_PREFIX}DOCKER_HOST_GRADER_ROOT", None),
+        "api_pool_size": _get_int(f"{_PREFIX}GRADER_API_POOL_SIZE", 32),
     }
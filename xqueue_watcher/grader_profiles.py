@@ -0,0 +1,266 @@
+"""
+Learned per-grader resource profiles.
+
+A queue's ``ContainerGrader`` applies one ``timeout``, ``cpu_limit`` and
+``memory_limit`` to every grader it serves, with fixed resource requests, so
+heavy graders time out while light ones reserve far more than they use.
+:class:`ProfileStore` keeps a rolling window of observations per grader path:
+
+* ``wall``: seconds the grading run took from launch (after any admission
+  wait) to its output, as seen by the watcher -- or, for a micro-batched
+  submission, the staff and student runs' own wall time;
+* ``cpu``: average cores used by the staff and student runs (CPU seconds
+  over wall seconds, from the entrypoint's diagnostics);
+* ``rss``: peak resident set size of the grading process, in bytes.
+
+:func:`recommend` turns a profile's p95/p99 into a Job deadline, CPU and
+memory requests and limits, each clamped to operator-defined
+:class:`ProfileBounds`.  ``ContainerGrader`` either only logs what it would
+apply (``profile_mode="report"``) or applies it to Kubernetes grading Jobs
+(``profile_mode="apply"``).  Until a grader has ``min_samples`` observations
+the configured values are used unchanged.
+
+A store can be persisted to a JSON file so that profiles survive restarts;
+``python -m xqueue_watcher.grader_profiles PROFILE_FILE`` prints the learned
+percentiles in that file.
+"""
+
+import argparse
+import collections
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 256
+DEFAULT_MIN_SAMPLES = 20
+# Multiplier applied to p99 observations when deriving deadlines and limits.
+HEADROOM = 1.5
+
+_METRICS = ("wall", "cpu", "rss")
+
+
+def percentile(values, pct):
+    """Return the ``pct`` percentile of ``values`` (nearest-rank), or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class ProfileBounds:
+    """Operator limits on what a learned profile may set."""
+
+    min_timeout: int = 5
+    max_timeout: int | None = None
+    min_cpu_millis: int = 10
+    max_cpu_millis: int | None = None
+    min_memory_bytes: int = 32 * 1024 * 1024
+    max_memory_bytes: int | None = None
+
+
+@dataclass
+class Recommendation:
+    """Job settings derived from a grader's profile."""
+
+    timeout: int
+    cpu_request: str
+    cpu_limit: str
+    memory_request: str
+    memory_limit: str
+    samples: int
+
+
+def _clamp(value, low, high):
+    if high is not None:
+        value = min(value, high)
+    return max(value, low)
+
+
+def recommend(samples: dict, bounds: ProfileBounds, min_samples: int = DEFAULT_MIN_SAMPLES):
+    """Return a :class:`Recommendation` for a grader's samples, or None if too few.
+
+    Deadlines and limits use ``HEADROOM`` times the p99; requests use the p95.
+    """
+    count = len(samples.get("wall", ()))
+    if count < min_samples:
+        return None
+    wall_p99 = percentile(samples["wall"], 99)
+    timeout = _clamp(math.ceil(wall_p99 * HEADROOM), bounds.min_timeout, bounds.max_timeout)
+
+    cpu = samples.get("cpu") or [0.0]
+    cpu_request = _clamp(math.ceil(percentile(cpu, 95) * 1000), bounds.min_cpu_millis, bounds.max_cpu_millis)
+    cpu_limit = _clamp(
+        math.ceil(percentile(cpu, 99) * 1000 * HEADROOM), cpu_request, bounds.max_cpu_millis
+    )
+
+    rss = samples.get("rss") or [0]
+    memory_request = _clamp(int(percentile(rss, 95)), bounds.min_memory_bytes, bounds.max_memory_bytes)
+    memory_limit = _clamp(
+        int(percentile(rss, 99) * HEADROOM), memory_request, bounds.max_memory_bytes
+    )
+    return Recommendation(
+        timeout=timeout,
+        cpu_request=f"{cpu_request}m",
+        cpu_limit=f"{cpu_limit}m",
+        memory_request=str(memory_request),
+        memory_limit=str(memory_limit),
+        samples=count,
+    )
+
+
+class ProfileStore:
+    """
+    Thread-safe rolling windows of per-grader observations.
+
+    With a ``path``, profiles are loaded from that JSON file on creation and
+    written back (atomically) at most every ``save_interval`` seconds.
+    """
+
+    def __init__(self, path=None, window: int = DEFAULT_WINDOW, save_interval: float = 60.0) -> None:
+        self.path = path
+        self.window = window
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._profiles: dict[str, dict[str, collections.deque]] = {}
+        self._last_save = time.monotonic()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _profile(self, grader: str) -> dict:
+        profile = self._profiles.get(grader)
+        if profile is None:
+            profile = self._profiles[grader] = {
+                name: collections.deque(maxlen=self.window) for name in _METRICS
+            }
+        return profile
+
+    def record(self, grader, wall: float, diagnostics: dict | None = None,
+               rss: int | None = None) -> None:
+        """Add one grading run of ``grader``.
+
+        ``diagnostics`` is the entrypoint's per-run usage (see
+        ``grader_support.entrypoint``); without it only ``wall`` is recorded,
+        plus ``rss`` if given (the memory limit of a run killed for exceeding it).
+        """
+        cpu = None
+        if isinstance(diagnostics, dict):
+            runs = [usage for usage in diagnostics.values() if isinstance(usage, dict)]
+            run_wall = sum(usage.get("wall_seconds", 0) for usage in runs)
+            run_cpu = sum(usage.get("cpu_seconds", 0) for usage in runs)
+            if run_wall > 0:
+                cpu = run_cpu / run_wall
+            peaks = [usage["peak_rss_bytes"] for usage in runs if "peak_rss_bytes" in usage]
+            if peaks:
+                rss = max(peaks)
+        with self._lock:
+            profile = self._profile(str(grader))
+            profile["wall"].append(float(wall))
+            if cpu is not None:
+                profile["cpu"].append(cpu)
+            if rss is not None:
+                profile["rss"].append(rss)
+            save = self.path and time.monotonic() - self._last_save >= self.save_interval
+            if save:
+                self._last_save = time.monotonic()
+                snapshot = self._snapshot()
+        if save:
+            self._save(snapshot)
+
+    def samples(self, grader) -> dict:
+        """Return a copy of ``grader``'s observations as lists."""
+        with self._lock:
+            profile = self._profiles.get(str(grader))
+            if profile is None:
+                return {name: [] for name in _METRICS}
+            return {name: list(values) for name, values in profile.items()}
+
+    def graders(self) -> list[str]:
+        with self._lock:
+            return sorted(self._profiles)
+
+    def save(self) -> None:
+        """Write the store to ``path`` now."""
+        if self.path:
+            with self._lock:
+                snapshot = self._snapshot()
+            self._save(snapshot)
+
+    def _snapshot(self) -> dict:
+        # Caller holds self._lock.
+        return {
+            grader: {name: list(values) for name, values in profile.items()}
+            for grader, profile in self._profiles.items()
+        }
+
+    def _save(self, snapshot: dict) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".grader-profiles-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            log.warning("Could not save grader profiles to %s", self.path, exc_info=True)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            log.warning("Could not load grader profiles from %s", self.path, exc_info=True)
+            return
+        for grader, metrics in data.items():
+            profile = self._profile(grader)
+            for name in _METRICS:
+                profile[name].extend(metrics.get(name, []))
+
+
+_stores: dict[str | None, ProfileStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_profile_store(path=None) -> ProfileStore:
+    """Return the process-wide profile store for ``path`` (None: in memory only)."""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ProfileStore(path)
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print the learned per-grader percentiles in a profile file."
+    )
+    parser.add_argument("profile_file")
+    args = parser.parse_args(argv)
+
+    store = ProfileStore(args.profile_file)
+    print(f"{'grader':<60} {'n':>5} {'wall p95':>9} {'wall p99':>9} "
+          f"{'cpu p95':>8} {'rss p95 MiB':>12} {'rss p99 MiB':>12}")
+    for grader in store.graders():
+        samples = store.samples(grader)
+        rss95 = percentile(samples["rss"], 95)
+        rss99 = percentile(samples["rss"], 99)
+        cpu95 = percentile(samples["cpu"], 95)
+        print(
+            f"{grader:<60} {len(samples['wall']):>5} "
+            f"{percentile(samples['wall'], 95) or 0:>9.2f} {percentile(samples['wall'], 99) or 0:>9.2f} "
+            f"{cpu95 or 0:>8.2f} "
+            f"{(rss95 or 0) / 2**20:>12.1f} {(rss99 or 0) / 2**20:>12.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Hedged launches for grading Jobs that are slow to start.
+
+A grading pod occasionally sits in ``Pending`` or ``ContainerCreating`` far
+longer than usual -- a slow or unhealthy node, a stuck image pull -- and the
+grade then fails with a timeout although the code itself would have run in
+seconds.  :class:`HedgePolicy` lets the kubernetes backend launch a second
+copy of such a Job, kept off the first Job's node by pod anti-affinity, and
+take whichever finishes first:
+
+* every launch reports how long its Job took to reach Running; the hedge delay
+  is the ``percentile`` of the recent start-up times, never less than
+  ``min_delay`` seconds, and hedging stays off until ``min_samples`` launches
+  have been seen;
+* hedges draw on a :class:`RetryBudget`, so that at most about ``budget`` of
+  all launches are duplicated -- when a whole cluster is slow, hedging would
+  only add load.
+
+Policies are shared per launch target (see :func:`get_hedge_policy`).
+"""
+
+import collections
+import logging
+import threading
+
+from . import metrics as _metrics
+from .grader_profiles import percentile as _percentile
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 200
+
+
+class RetryBudget:
+    """
+    Token bucket limiting extra launches to a fraction of all launches.
+
+    Each launch deposits ``ratio`` tokens and each hedge withdraws one.  Up
+    to ``reserve`` tokens can accumulate, which also is the initial balance,
+    so a few hedges are possible before many launches have been seen.
+    """
+
+    def __init__(self, ratio: float, reserve: float = 3.0) -> None:
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = reserve
+        self._lock = threading.Lock()
+
+    @property
+    def balance(self) -> float:
+        return self._balance
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one token; return False (and take nothing) if none is left."""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class HedgePolicy:
+    """Decides when a launch that has not started yet should be hedged."""
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = 95,
+        min_delay: float = 5.0,
+        min_samples: int = 20,
+        budget: float = 0.05,
+        window: int = DEFAULT_WINDOW,
+    ) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = RetryBudget(budget)
+        self._startups = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._attributes = {"target": name}
+
+    def record_launch(self) -> None:
+        """Count a primary launch towards the retry budget."""
+        self.budget.deposit()
+
+    def record_startup(self, seconds: float) -> None:
+        """Add how long a launch took to reach Running."""
+        with self._lock:
+            self._startups.append(seconds)
+
+    def delay(self) -> float | None:
+        """Seconds after which a launch that is not yet running is hedged.
+
+        None while fewer than ``min_samples`` start-up times are known.
+        """
+        with self._lock:
+            if len(self._startups) < self.min_samples:
+                return None
+            threshold = _percentile(list(self._startups), self.percentile)
+        return max(self.min_delay, threshold)
+
+    def try_hedge(self) -> bool:
+        """Return whether the budget allows hedging one more launch."""
+        if self.budget.withdraw():
+            _metrics.hedged_launch_counter.add(1, {**self._attributes, "outcome": "launched"})
+            return True
+        _metrics.hedged_launch_counter.add(1, {**self._attributes, "outcome": "budget_exhausted"})
+        log.debug("Hedge budget for %s exhausted", self.name)
+        return False
+
+    def record_winner(self, hedged: bool) -> None:
+        """Record whether a hedged launch was won by the hedge or the original."""
+        outcome = "hedge_won" if hedged else "original_won"
+        _metrics.hedged_launch_counter.add(1, {**self._attributes, "outcome": outcome})
+
+
+_policies: dict[tuple, HedgePolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_hedge_policy(key: tuple, **kwargs) -> HedgePolicy:
+    """Return the process-wide hedge policy for ``key``, creating it with ``kwargs``.
+
+    ``key`` identifies the launch target, e.g. ``(kubeconfig, context,
+    namespace, image)``.  The first caller's parameters win.
+    """
+    with _policies_lock:
+        policy = _policies.get(key)
+        if policy is None:
+            name = "/".join(str(part) for part in key if part is not None)
+            policy = _policies[key] = HedgePolicy(name, **kwargs)
+        return policy
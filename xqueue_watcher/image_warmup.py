@@ -0,0 +1,108 @@
+"""
+Pre-pulling ("warming") of grader images before submissions need them.
+
+When a course team pushes a new grader image, the first real submission that
+uses it would otherwise pay the full image pull inside the grading Job's
+``activeDeadlineSeconds`` -- which frequently times out.  :class:`ImageWarmer`
+pulls an image reference ahead of time, in a background thread, and tells the
+caller once it is warm so that grading only switches over to it afterwards.
+
+The warmer is backend-agnostic: it is constructed with a blocking ``pull``
+callable supplied by ``ContainerGrader`` (a Docker API pull for the docker
+backend, a short-lived pre-pull DaemonSet for Kubernetes).  Warmers are shared
+per backend target through :func:`get_warmer`, so each reference is pulled
+once no matter how many grader instances ask for it.
+"""
+
+import logging
+import threading
+import time
+
+from . import metrics as _metrics
+
+log = logging.getLogger(__name__)
+
+
+class ImageWarmer:
+    """
+    Pulls image references in the background and reports when they are warm.
+
+    ``pull(ref)`` must block until ``ref`` is available wherever grading
+    containers will run, raising on failure.
+    """
+
+    def __init__(self, name: str, pull, backend: str) -> None:
+        self.name = name
+        self._pull = pull
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._warm: set[str] = set()
+        self._pending: dict[str, list] = {}
+
+    def is_warm(self, ref: str) -> bool:
+        with self._lock:
+            return ref in self._warm
+
+    def warm(self, ref: str, on_done=None) -> None:
+        """Start warming ``ref`` unless it is already warm or in progress.
+
+        ``on_done(ref, ok)`` is called (from the warming thread, or
+        immediately if ``ref`` is already warm) once the pull has finished;
+        ``ok`` is False if the pull failed.
+        """
+        with self._lock:
+            if ref in self._warm:
+                start = False
+            elif ref in self._pending:
+                if on_done is not None:
+                    self._pending[ref].append(on_done)
+                return
+            else:
+                self._pending[ref] = [on_done] if on_done is not None else []
+                start = True
+        if not start:
+            if on_done is not None:
+                on_done(ref, True)
+            return
+        threading.Thread(
+            target=self._warm_one, args=(ref,), name=f"image-warmup-{ref}", daemon=True
+        ).start()
+
+    def _warm_one(self, ref: str) -> None:
+        start = time.monotonic()
+        try:
+            self._pull(ref)
+            ok = True
+        except Exception:
+            log.warning("Failed to pre-pull grader image %s on %s", ref, self.name, exc_info=True)
+            ok = False
+        elapsed = time.monotonic() - start
+        _metrics.image_pull_time_histogram.record(
+            elapsed,
+            {"backend": self._backend, "image": ref, "outcome": "ok" if ok else "error"},
+        )
+        if ok:
+            log.info("Pre-pulled grader image %s on %s in %.1fs", ref, self.name, elapsed)
+        with self._lock:
+            if ok:
+                self._warm.add(ref)
+            callbacks = self._pending.pop(ref, [])
+        for callback in callbacks:
+            try:
+                callback(ref, ok)
+            except Exception:
+                log.exception("Image warm-up callback failed for %s", ref)
+
+
+_warmers: dict[tuple, ImageWarmer] = {}
+_warmers_lock = threading.Lock()
+
+
+def get_warmer(key: tuple, pull, backend: str) -> ImageWarmer:
+    """Return the process-wide warmer for backend target ``key``."""
+    with _warmers_lock:
+        warmer = _warmers.get(key)
+        if warmer is None:
+            name = "/".join(str(part) for part in key if part is not None)
+            warmer = _warmers[key] = ImageWarmer(name, pull, backend)
+        return warmer
@@ -0,0 +1,225 @@
+"""
+Asyncio implementation of the kubernetes grading backend.
+
+The blocking backend keeps a grading thread inside the Kubernetes client for
+the whole life of a Job -- create, status polling, pod lookup, log read -- so
+concurrency costs one thread and one pooled connection per in-flight grade.
+:class:`AsyncK8sBackend` runs those calls as coroutines on the
+``kubernetes_asyncio`` client instead: hundreds of Jobs in flight share one
+event loop and a small aiohttp connection pool.
+
+The backend can be driven two ways:
+
+* from an existing event loop, by awaiting :meth:`AsyncK8sBackend.run_job`
+  (pass that ``loop`` when constructing the backend);
+* from the watcher's grading threads, through :meth:`AsyncK8sBackend.run_job_sync`,
+  which schedules the coroutine on a dedicated loop thread owned by the
+  backend and blocks only on its result.
+
+``kubernetes_asyncio`` is an optional dependency (the ``kubernetes-async``
+extra).  Backends are shared per cluster through :func:`get_async_backend`.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+
+from .lifecycle import GradingTimeout, job_failure, record_k8s_phases
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+# How long (seconds) run_job_sync() waits past the Job deadline, for creating
+# the Job and collecting its log, before giving up on the coroutine.
+SYNC_RESULT_MARGIN = 30.0
+
+
+class AsyncK8sBackend:
+    """
+    Creates grading Jobs, waits for them and reads their output, asynchronously.
+
+    ``kubeconfig`` and ``context`` select the cluster exactly as for the
+    blocking backend (in-cluster configuration first when both are None).
+    """
+
+    def __init__(self, kubeconfig=None, context=None, pool_size=None, loop=None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        try:
+            import kubernetes_asyncio  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "The 'kubernetes_asyncio' package is required for k8s_async. "
+                "Install it with: uv sync --extra kubernetes-async"
+            )
+        self.kubeconfig = kubeconfig
+        self.context = context
+        self.pool_size = pool_size
+        self.poll_interval = poll_interval
+        self._apis = None
+        self._apis_lock: asyncio.Lock | None = None
+        # Strong references to fire-and-forget cleanup tasks.
+        self._background: set[asyncio.Task] = set()
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=loop.run_forever, name="k8s-async-loop", daemon=True
+            )
+            self._thread.start()
+        else:
+            self._thread = None
+        self.loop = loop
+
+    async def _get_apis(self):
+        # The aiohttp session behind the ApiClient must be created on the loop.
+        if self._apis is None:
+            if self._apis_lock is None:
+                self._apis_lock = asyncio.Lock()
+            async with self._apis_lock:
+                if self._apis is None:
+                    self._apis = await self._create_apis()
+        return self._apis
+
+    async def _create_apis(self):
+        from kubernetes_asyncio import client as k8s_client, config as k8s_config
+
+        from .backend_clients import DEFAULT_POOL_SIZE
+
+        configuration = k8s_client.Configuration()
+        loaded = False
+        if self.kubeconfig is None and self.context is None:
+            try:
+                k8s_config.load_incluster_config(client_configuration=configuration)
+                loaded = True
+            except k8s_config.ConfigException:
+                pass
+        if not loaded:
+            await k8s_config.load_kube_config(
+                config_file=self.kubeconfig,
+                context=self.context,
+                client_configuration=configuration,
+            )
+        configuration.connection_pool_maxsize = self.pool_size or DEFAULT_POOL_SIZE
+        api_client = k8s_client.ApiClient(configuration)
+        log.info(
+            "Created async Kubernetes API client (kubeconfig=%s, context=%s, pool_size=%d)",
+            self.kubeconfig or "default",
+            self.context or "default",
+            configuration.connection_pool_maxsize,
+        )
+        return k8s_client.BatchV1Api(api_client), k8s_client.CoreV1Api(api_client)
+
+    async def run_job(self, namespace, job_name, body, timeout, on_running=None, phases=None,
+                      reap=None):
+        """Create a Job, wait for it to succeed and return ``(pod_name, log)``.
+
+        ``on_running()`` is called the first time the Job reports a ready or
+        succeeded pod, and lifecycle phases are recorded on the
+        ``lifecycle.PhaseRecorder`` ``phases`` if given.  Afterwards the Job
+        is handed to ``reap(job_name)`` (e.g. ``JobReaper.submit``) if given,
+        and otherwise deleted in the background, so cleanup never delays the
+        caller; its ``ttlSecondsAfterFinished`` remains the backstop.
+        """
+        batch_v1, core_v1 = await self._get_apis()
+        try:
+            created = time.monotonic()
+            await batch_v1.create_namespaced_job(namespace=namespace, body=body)
+            if phases is not None:
+                phases.record("api_create", time.monotonic() - created)
+            log.debug("Created Job %s", job_name)
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                job = await batch_v1.read_namespaced_job(name=job_name, namespace=namespace)
+                if on_running is not None and (job.status.ready or job.status.succeeded):
+                    on_running()
+                if job.status.succeeded:
+                    break
+                if job.status.failed:
+                    raise await self._job_failure(core_v1, namespace, job_name, job)
+                await asyncio.sleep(self.poll_interval)
+            else:
+                raise GradingTimeout(
+                    f"Grading Job {job_name} exceeded timeout of {timeout}s."
+                )
+            finished_seen = time.monotonic()
+
+            pods = await core_v1.list_namespaced_pod(
+                namespace=namespace, label_selector=f"job-name={job_name}"
+            )
+            if not pods.items:
+                raise RuntimeError(f"No pods found for Job {job_name}.")
+            pod_name = pods.items[0].metadata.name
+            # Read the raw body: the client would otherwise json-decode the log.
+            response = await core_v1.read_namespaced_pod_log(
+                name=pod_name,
+                namespace=namespace,
+                container="grader",
+                _preload_content=False,
+            )
+            output = (await response.read()).decode("utf-8")
+            if phases is not None:
+                phases.record("collect", time.monotonic() - finished_seen)
+                record_k8s_phases(phases, job, pods.items[0])
+            return pod_name, output
+        finally:
+            if reap is not None:
+                reap(job_name)
+            else:
+                task = asyncio.ensure_future(self._delete_job(batch_v1, namespace, job_name))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+
+    async def _job_failure(self, core_v1, namespace, job_name, job):
+        try:
+            pods = (await core_v1.list_namespaced_pod(
+                namespace=namespace, label_selector=f"job-name={job_name}"
+            )).items
+        except Exception:
+            log.debug("Could not list the pods of failed Job %s", job_name, exc_info=True)
+            pods = []
+        return job_failure(job_name, job, pods)
+
+    async def _delete_job(self, batch_v1, namespace, job_name):
+        try:
+            await batch_v1.delete_namespaced_job(
+                name=job_name, namespace=namespace, propagation_policy="Background"
+            )
+        except Exception:
+            log.warning("Failed to delete grading Job %s", job_name, exc_info=True)
+
+    def run_job_sync(self, namespace, job_name, body, timeout, on_running=None, phases=None,
+                     reap=None):
+        """
+        Run :meth:`run_job` on the backend's loop from a non-loop thread.
+
+        Waits at most ``timeout`` plus :data:`SYNC_RESULT_MARGIN` seconds, so an
+        API call that hangs can't hold the grading thread forever; the
+        coroutine is then cancelled, which still hands the Job to cleanup.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self.run_job(namespace, job_name, body, timeout, on_running, phases, reap), self.loop
+        )
+        try:
+            return future.result(timeout=timeout + SYNC_RESULT_MARGIN)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise GradingTimeout(
+                f"Grading Job {job_name} did not finish within {timeout + SYNC_RESULT_MARGIN}s."
+            ) from None
+
+
+_backends: dict[tuple, AsyncK8sBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_async_backend(kubeconfig=None, context=None, pool_size=None) -> AsyncK8sBackend:
+    """Return the process-wide async backend (and loop thread) for a cluster."""
+    key = (kubeconfig, context)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _backends[key] = AsyncK8sBackend(kubeconfig, context, pool_size)
+        return backend
@@ -0,0 +1,142 @@
+"""
+Per-phase timing of grading container lifecycles.
+
+``xqueuewatcher.grading_time`` only says how long a grade took in total.  To
+tell whether a slow grade was spent in the API server, waiting for a node,
+pulling the image, starting the container, running student code or reading
+the result, ``ContainerGrader`` records each phase separately in the
+``xqueuewatcher.container.phase_time`` histogram, tagged with ``phase``,
+``backend``, ``image`` and (Kubernetes only) ``namespace``.
+
+Phases are taken from the backend's own timestamps where it has them and
+measured locally otherwise:
+
+=================  ==========================================  ===========================
+phase              Kubernetes                                  Docker
+=================  ==========================================  ===========================
+``pull``           --                                          pull call, if the image was
+                                                               missing at create (local)
+``api_create``     create Job call (local)                     create container call (local)
+``job_controller`` Job created -> Pod created                  --
+``schedule``       Pod created -> ``PodScheduled``             --
+``initialize``     ``PodScheduled`` -> ``Initialized``         --
+``start``          ``Initialized`` -> container ``startedAt``  ``Created`` -> ``StartedAt``
+``run``            ``startedAt`` -> ``finishedAt``             ``StartedAt`` -> ``FinishedAt``
+``collect``        Job seen finished -> log read (local)       logs call (local)
+``cleanup``        -- (deleted later by the ``JobReaper``)     remove call (local)
+=================  ==========================================  ===========================
+
+Kubernetes condition and container timestamps have one-second resolution, so
+the Kubernetes server-side phases are only meaningful in aggregate.
+
+Backends raise :class:`GradingTimeout` and :class:`GradingOutOfMemory` when
+a run ends by hitting its deadline or memory limit, so that learned grader
+profiles can count those runs against the limits.
+"""
+
+import contextlib
+import datetime
+import time
+
+from . import metrics as _metrics
+
+
+class GradingTimeout(RuntimeError):
+    """The grading run exceeded its deadline."""
+
+
+class GradingOutOfMemory(RuntimeError):
+    """The grading run was killed for exceeding its memory limit."""
+
+
+def oom_killed(pod) -> bool:
+    """Return whether the grader container of ``pod`` was killed for running out of memory."""
+    for status in pod.status.container_statuses or []:
+        if status.name != "grader":
+            continue
+        for state in (status.state, status.last_state):
+            terminated = state.terminated if state else None
+            if terminated is not None and terminated.reason == "OOMKilled":
+                return True
+    return False
+
+
+def job_failure(job_name: str, job, pods) -> RuntimeError:
+    """Return the exception describing why grading Job ``job_name`` failed."""
+    reasons = {
+        condition.reason
+        for condition in (job.status.conditions or [])
+        if condition.type == "Failed"
+    }
+    if "DeadlineExceeded" in reasons:
+        return GradingTimeout(f"Grading Job {job_name} failed: deadline exceeded.")
+    if any(oom_killed(pod) for pod in pods):
+        return GradingOutOfMemory(f"Grading Job {job_name} failed: out of memory.")
+    return RuntimeError(f"Grading Job {job_name} failed.")
+
+
+class PhaseRecorder:
+    """Records phase durations for one grading run under fixed attributes."""
+
+    def __init__(self, backend: str, image: str, namespace: str | None = None) -> None:
+        self.attributes = {"backend": backend, "image": image}
+        if namespace is not None:
+            self.attributes["namespace"] = namespace
+
+    def record(self, phase: str, seconds: float) -> None:
+        _metrics.container_phase_histogram.record(seconds, {**self.attributes, "phase": phase})
+
+    def span(self, phase: str, start, end) -> None:
+        """Record ``end - start`` (datetimes) unless either is unknown or out of order."""
+        if start is None or end is None:
+            return
+        seconds = (end - start).total_seconds()
+        if seconds >= 0:
+            self.record(phase, seconds)
+
+    @contextlib.contextmanager
+    def timed(self, phase: str):
+        """Record the local wall time of the ``with`` block as ``phase``."""
+        start = time.monotonic()
+        yield
+        self.record(phase, time.monotonic() - start)
+
+
+def record_k8s_phases(recorder: PhaseRecorder, job, pod) -> None:
+    """Record the server-side phases of a finished grading Job and its Pod."""
+    conditions = {
+        condition.type: condition.last_transition_time
+        for condition in (pod.status.conditions or [])
+    }
+    started = finished = None
+    for status in pod.status.container_statuses or []:
+        terminated = status.state.terminated if status.state else None
+        if status.name == "grader" and terminated is not None:
+            started, finished = terminated.started_at, terminated.finished_at
+
+    recorder.span("job_controller", job.metadata.creation_timestamp, pod.metadata.creation_timestamp)
+    recorder.span("schedule", pod.metadata.creation_timestamp, conditions.get("PodScheduled"))
+    recorder.span("initialize", conditions.get("PodScheduled"), conditions.get("Initialized"))
+    recorder.span("start", conditions.get("Initialized"), started)
+    recorder.span("run", started, finished)
+
+
+def _parse_docker_time(value):
+    # Docker reports RFC 3339 with nanoseconds, and the zero time for
+    # "never happened".
+    if not value or value.startswith("0001-"):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def record_docker_phases(recorder: PhaseRecorder, attrs: dict) -> None:
+    """Record the phases found in ``docker inspect`` data of an exited container."""
+    state = attrs.get("State") or {}
+    created = _parse_docker_time(attrs.get("Created"))
+    started = _parse_docker_time(state.get("StartedAt"))
+    finished = _parse_docker_time(state.get("FinishedAt"))
+    recorder.span("start", created, started)
+    recorder.span("run", started, finished)
@@ -76,3 +76,72 @@ replies_counter = _meter.create_counter(
     "xqueuewatcher.replies",
     description="Number of successful (non-exception) grading replies sent.",
 )
+
+# Container launch admission control (see xqueue_watcher.admission).  All
+# admission instruments carry a ``limiter`` attribute naming the backend target.
+
+admission_limit_gauge = _meter.create_gauge(
+    "xqueuewatcher.admission.limit",
+    description="Current adaptive concurrency limit for grading container launches.",
+)
+
+admission_in_flight = _meter.create_up_down_counter(
+    "xqueuewatcher.admission.in_flight",
+    description="Grading containers currently admitted and running.",
+)
+
+admission_queue_depth = _meter.create_up_down_counter(
+    "xqueuewatcher.admission.queue_depth",
+    description="Submissions waiting for a grading container launch slot.",
+)
+
+admission_rejected_counter = _meter.create_counter(
+    "xqueuewatcher.admission.rejected",
+    description="Submissions rejected because the admission queue was full or the wait timed out.",
+)
+
+launch_latency_histogram = _meter.create_histogram(
+    "xqueuewatcher.launch_latency",
+    unit="s",
+    description="Seconds from requesting a grading container to observing it running.",
+)
+
+image_pull_time_histogram = _meter.create_histogram(
+    "xqueuewatcher.image_pull_time",
+    unit="s",
+    description="Seconds taken to pre-pull a grader image, by backend, image and outcome.",
+)
+
+hedged_launch_counter = _meter.create_counter(
+    "xqueuewatcher.hedged_launches",
+    description="Hedged grading Job launches, by target and outcome "
+    "(launched, budget_exhausted, hedge_won, original_won).",
+)
+
+container_phase_histogram = _meter.create_histogram(
+    "xqueuewatcher.container.phase_time",
+    unit="s",
+    description="Seconds spent in each grading container lifecycle phase (see xqueue_watcher.lifecycle).",
+)
+
+# Resource usage reported by grader_support.entrypoint for the staff and the
+# student run of each grade.  Attributes: ``grader`` (grader path), ``run``
+# (``staff`` or ``student``) and ``backend``.
+
+grader_wall_time_histogram = _meter.create_histogram(
+    "xqueuewatcher.grader.wall_time",
+    unit="s",
+    description="Wall-clock seconds of a staff or student grading run inside the sandbox.",
+)
+
+grader_cpu_time_histogram = _meter.create_histogram(
+    "xqueuewatcher.grader.cpu_time",
+    unit="s",
+    description="CPU seconds (user + system) of a staff or student grading run.",
+)
+
+grader_peak_rss_histogram = _meter.create_histogram(
+    "xqueuewatcher.grader.peak_rss",
+    unit="By",
+    description="Peak resident set size of the grading process after a staff or student run.",
+)
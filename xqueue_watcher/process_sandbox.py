@@ -0,0 +1,190 @@
+"""
+Local process sandbox used by ContainerGrader's ``process`` backend.
+
+Runs ``python -m grader_support.entrypoint GRADER_FILE SEED`` directly as a
+subprocess of the watcher -- no Docker daemon, no Kubernetes -- using the same
+environment-variable protocol as the container backends (``SUBMISSION_CODE``,
+``GRADER_LANGUAGE``, ``HIDE_OUTPUT``, ``GRADER_WORK_DIR``).
+
+Isolation is best-effort and layered:
+
+* When unprivileged user namespaces are available (probed once, see
+  :func:`namespaces_supported`), the entrypoint runs in new user, mount,
+  network, and PID namespaces.  There it has no network, cannot see other
+  processes, and gets a private size-capped tmpfs at ``/tmp``.  It then
+  drops into a further, unmapped user namespace so that it cannot undo
+  those mounts.
+* Resource limits are always applied: CPU seconds (the grading timeout),
+  address space (the memory limit), file size, no core dumps and, inside
+  namespaces, a process count.  A small Python wrapper sets them and execs
+  the command, since ``preexec_fn`` is unsafe in the multithreaded watcher.
+* The child gets a minimal environment, so the watcher's own environment and
+  credentials are not inherited, and its own temporary work directory.
+
+The rest of the filesystem stays readable either way -- including the
+grader's directory with its ``answer.py`` -- and without namespaces there is
+no network or filesystem isolation at all; use the kubernetes or docker
+backend when grading untrusted code on shared machines.
+The fractional CPU limit is not enforced either, because that needs cgroups.
+"""
+
+import logging
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+from .lifecycle import GradingTimeout
+
+log = logging.getLogger(__name__)
+
+# Size of the private /tmp, matching the grading Pod's /tmp emptyDir.
+TMPFS_SIZE_BYTES = 50 * 1024 * 1024
+
+# Process/thread cap inside the namespaces.  Not applied without namespaces,
+# where RLIMIT_NPROC would also count the watcher's own threads.
+MAX_PROCESSES = 64
+
+_UNSHARE = [
+    "unshare", "--user", "--map-root-user", "--mount", "--net",
+    "--pid", "--fork", "--mount-proc",
+]
+# Mount the private tmpfs at $0, then exec the command in a nested user
+# namespace with no mapped IDs, which holds no capabilities over that mount.
+_MOUNT_AND_EXEC = (
+    'mount -t tmpfs -o size={size},mode=1777 tmpfs "$0" && exec unshare --user "$@"'
+)
+
+# Apply the resource limits given as arguments, then exec the command after
+# them.  Run with -I -S, so that nothing but the standard library is loaded.
+_LIMIT_AND_EXEC = """\
+import os, resource, sys
+cpu, memory, fsize, nproc = (int(arg) for arg in sys.argv[1:5])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+resource.setrlimit(resource.RLIMIT_FSIZE, (fsize, fsize))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+if nproc:
+    resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))
+os.execvp(sys.argv[5], sys.argv[5:])
+"""
+
+_GRADER_SUPPORT_PARENT = str(Path(__file__).resolve().parent.parent)
+
+_namespaces_supported: bool | None = None
+_probe_lock = threading.Lock()
+
+
+def namespaces_supported() -> bool:
+    """Return whether unprivileged namespaces work here (probed once per process)."""
+    global _namespaces_supported
+    with _probe_lock:
+        if _namespaces_supported is None:
+            if shutil.which("unshare") is None:
+                _namespaces_supported = False
+            else:
+                try:
+                    probe = subprocess.run(
+                        _UNSHARE + ["sh", "-c", _MOUNT_AND_EXEC.format(size="1m"), "/tmp", "true"],
+                        capture_output=True,
+                        timeout=10,
+                    )
+                    _namespaces_supported = probe.returncode == 0
+                except (OSError, subprocess.SubprocessError):
+                    _namespaces_supported = False
+            log.info(
+                "Process grading sandbox: Linux namespaces %s",
+                "available" if _namespaces_supported else "unavailable; using rlimits only",
+            )
+        return _namespaces_supported
+
+
+def _with_limits(command, cpu_seconds, memory_bytes, max_processes):
+    """Return ``command`` prefixed with the wrapper applying resource limits."""
+    return [
+        sys.executable, "-I", "-S", "-c", _LIMIT_AND_EXEC,
+        str(cpu_seconds), str(memory_bytes), str(TMPFS_SIZE_BYTES), str(max_processes or 0),
+        *command,
+    ]
+
+
+def _is_under(path, directory):
+    try:
+        Path(path).resolve().relative_to(Path(directory).resolve())
+        return True
+    except ValueError:
+        return False
+
+
+def run_entrypoint(grader_path, seed, env, timeout, memory_bytes, on_started=None, stdin=None):
+    """Run the grading entrypoint in the sandbox and return its stdout bytes.
+
+    ``env`` carries the protocol variables (``SUBMISSION_CODE`` etc.), and
+    ``stdin`` the submission when it is passed on standard input.
+    ``on_started()`` is called once the child process has been spawned.
+    Raises ``RuntimeError`` on timeout or a non-zero exit.
+    """
+    grader_path = Path(grader_path).resolve()
+    grader_dir = str(grader_path.parent)
+    work_dir = tempfile.mkdtemp(prefix="xqueue-grader-")
+    isolated = namespaces_supported()
+
+    command = [sys.executable, "-m", "grader_support.entrypoint", str(grader_path), str(seed)]
+    if isolated:
+        # The tmpfs normally replaces /tmp, unless that would hide the grader
+        # or the Python installation; then it covers just the work directory.
+        hides_code = any(
+            _is_under(path, "/tmp") for path in (grader_dir, sys.prefix, _GRADER_SUPPORT_PARENT)
+        )
+        tmp_dir = work_dir if hides_code else "/tmp"
+        command = _UNSHARE + [
+            "sh", "-c", _MOUNT_AND_EXEC.format(size=TMPFS_SIZE_BYTES), tmp_dir, *command,
+        ]
+    else:
+        tmp_dir = work_dir
+
+    child_env = {
+        "PATH": os.environ.get("PATH", os.defpath),
+        "LANG": "C.UTF-8",
+        "HOME": tmp_dir,
+        "TMPDIR": tmp_dir,
+        "PYTHONPATH": _GRADER_SUPPORT_PARENT,
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "GRADER_WORK_DIR": tmp_dir,
+        **env,
+    }
+    cpu_seconds = max(1, math.ceil(timeout))
+    command = _with_limits(command, cpu_seconds, memory_bytes, MAX_PROCESSES if isolated else None)
+    try:
+        proc = subprocess.Popen(
+            command,
+            cwd=grader_dir,
+            env=child_env,
+            stdin=subprocess.DEVNULL if stdin is None else subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        if on_started is not None:
+            on_started()
+        try:
+            stdout, stderr = proc.communicate(input=stdin, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # With namespaces the entrypoint is PID 1 of its own PID namespace,
+            # so killing the session takes every descendant with it.
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.communicate()
+            raise GradingTimeout(f"Grading process timed out after {timeout}s.")
+        if proc.returncode != 0:
+            raise RuntimeError(
+                f"Grading process exited with non-zero status: {proc.returncode}. "
+                f"stderr: {stderr[:2000].decode('utf-8', 'replace') if stderr else ''}"
+            )
+        return stdout
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)